@@ -1,19 +1,116 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import Post, User, Tag
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from . import jobs, moderation
+from .models import AccountDeletion, Job, Like, Post, User, Tag
+from .paginations import EstimatedCountPaginator
 
-class AppUserAdmin(UserAdmin):
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelists that never run a full `COUNT(*)`: estimated page counts and no "N total" link."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class AppUserAdmin(UserAdmin, LargeTableAdmin):
     """Object representation of the Admin Dashboard for all models"""
-    
-    list_display = ('email', 'username', 'first_name', 'last_name', 'phone', 'is_staff', 'is_superuser', 'is_active')
-    search_field = ('email', 'username', 'first_name', 'last_name', 'phone')
+
+    list_display = ('email', 'username', 'first_name', 'last_name', 'phone', 'follower_count', 'is_staff', 'is_superuser', 'is_active')
+    # Prefix searches, served by the `UPPER(col) text_pattern_ops` indexes.
+    search_fields = ('^email', '^username')
+    raw_id_fields = ('followers', 'followed_tags')
     filter_horizontal = ()
     list_filter = ()
     fieldsets = ()
     ordering = ('email',)
+    actions = ('deactivate', 'delete_posts', 'delete_accounts')
+
+    def get_actions(self, request):
+        # The stock action deletes everything a user owns in one transaction; `delete_accounts` replaces it.
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(description='Deactivate selected users')
+    def deactivate(self, request, queryset):
+        count = queryset.update(is_active=False)
+        self.message_user(request, f'{count} user(s) deactivated.')
+
+    @admin.action(description="Delete all posts of selected users")
+    def delete_posts(self, request, queryset):
+        count = moderation.soft_delete_posts(Post.objects.filter(author__in=queryset.values('id')))
+        self.message_user(request, f'{count} post(s) deleted, purging in the background.')
+
+    @admin.action(description='Delete selected accounts')
+    def delete_accounts(self, request, queryset):
+        users = list(queryset)
+        for user in users:
+            moderation.soft_delete_account(user)
+        self.message_user(request, f'{len(users)} account(s) deleted, purging in the background.')
+
+
+class PostAdmin(LargeTableAdmin):
+    # Explicit columns: `Post.__str__` falls back to `content`, which the changelist does not load.
+    list_display = ('title', 'author', 'like_count', 'created_at')
+    list_select_related = ('author',)
+    search_fields = ('^author__username', '^author__email')
+    raw_id_fields = ('author',)
+    ordering = ('-created_at',)
+    actions = ('delete_posts',)
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if request.resolver_match and request.resolver_match.url_name == 'api_post_changelist':
+            # A correlated subquery is only evaluated for the rows on the page.
+            likes = Like.objects.filter(post=OuterRef('pk')).values('post').annotate(total=Count('id')).values('total')
+            queryset = queryset.defer('content', 'short_description', 'thumbnail').annotate(
+                like_count=Coalesce(Subquery(likes, output_field=IntegerField()), 0),
+            )
+        return queryset
+
+    def get_actions(self, request):
+        # The stock action collects and signals per post; `delete_posts` replaces it.
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.display(description='likes', ordering='like_count')
+    def like_count(self, obj):
+        return obj.like_count
+
+    @admin.action(description='Delete selected posts')
+    def delete_posts(self, request, queryset):
+        count = moderation.soft_delete_posts(queryset)
+        self.message_user(request, f'{count} post(s) deleted, purging in the background.')
+
+
+class TagAdmin(LargeTableAdmin):
+    list_display = ('name', 'post_count', 'created_at')
+    search_fields = ('^name',)
+    ordering = ('-post_count',)
 
 
 admin.site.register(User, AppUserAdmin)
-admin.site.register(Post)
-admin.site.register(Tag)
+admin.site.register(Post, PostAdmin)
+admin.site.register(Tag, TagAdmin)
+
+
+@admin.register(AccountDeletion)
+class AccountDeletionAdmin(admin.ModelAdmin):
+    list_display = ('user_id', 'stage', 'progress', 'requested_at', 'finished_at')
+    readonly_fields = ('user_id', 'stage', 'progress', 'requested_at', 'finished_at')
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'max_attempts', 'run_at', 'locked_by', 'created_at')
+    list_filter = ('status', 'name')
+    search_fields = ('idempotency_key',)
+    actions = ('requeue',)
+
+    @admin.action(description='Requeue selected dead jobs')
+    def requeue(self, request, queryset):
+        count = jobs.requeue_dead(queryset)
+        self.message_user(request, f'{count} job(s) requeued.')
 admin.site.site_header = 'Culinara Administration'
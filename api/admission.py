@@ -0,0 +1,315 @@
+"""
+Admission control: shed load early instead of slowing every request down together.
+
+Under overload daphne keeps accepting requests, so everything in flight queues for the same
+threads and database connections. Past capacity, a search or a `for-me` page slows
+`CurrentUserView` as much as itself, and once requests take longer than clients wait, nothing useful
+gets done. `ASGIAdmissionControl` (around the app in `src/asgi.py`; `WSGIAdmissionControl` in
+`src/wsgi.py`) caps how many requests of each cost class run at once (`ADMISSION_LIMITS`, classes
+per route in `ADMISSION_ROUTE_CLASSES`):
+
+* A request beyond its class's limit waits in that class's queue. Authenticated writes (likes, new
+  posts) go first, then other authenticated requests, then anonymous browsing.
+* Queueing is bounded CoDel-style, after "Fail at Scale": while the queue has drained within the
+  last `ADMISSION_CODEL_INTERVAL`, a request waits up to that long; once it has been standing for
+  longer, new arrivals wait only `ADMISSION_CODEL_TARGET` and are served newest first (the oldest
+  are the likeliest to have given up already). At most `ADMISSION_MAX_QUEUE` wait per class.
+* A request that is not admitted gets an immediate 503 with `Retry-After`.
+
+Limits are per process. `stats()` reports, per class, how many requests were admitted and shed and
+how long they queued; the same goes to `api.metrics`.
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.urls import Resolver404, resolve
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from api import metrics
+from api.constants import (
+    ADMISSION_CODEL_INTERVAL, ADMISSION_CODEL_TARGET, ADMISSION_LIMITS, ADMISSION_MAX_QUEUE, ADMISSION_RETRY_AFTER,
+    ADMISSION_ROUTE_CLASSES,
+)
+
+CHEAP = 'cheap'
+DEFAULT = 'default'
+EXPENSIVE = 'expensive'
+HASHING = 'hashing'
+
+# Queue priorities, lowest first.
+AUTHENTICATED_WRITE = 0
+AUTHENTICATED = 1
+ANONYMOUS = 2
+
+ADMITTED = 'admitted'
+QUEUED = 'queued'
+SHED_QUEUE_FULL = 'shed_queue_full'
+SHED_TIMEOUT = 'shed_timeout'
+
+_jwt = JWTAuthentication()
+
+
+class _Waiter:
+    __slots__ = ('wake', 'granted')
+
+    def __init__(self, wake):
+        self.wake = wake
+        self.granted = False
+
+
+class Gate:
+    """At most `limit` holders at once; the rest wait by priority, CoDel-bounded."""
+
+    def __init__(self, name, limit, max_queue=ADMISSION_MAX_QUEUE, target=ADMISSION_CODEL_TARGET, interval=ADMISSION_CODEL_INTERVAL):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.target = target
+        self.interval = interval
+        self.active = 0
+        self._lock = threading.Lock()
+        self._queues = {priority: deque() for priority in (AUTHENTICATED_WRITE, AUTHENTICATED, ANONYMOUS)}
+        self._queued = 0
+        self._last_empty = time.monotonic()
+        self.counts = Counter()
+        self.queue_seconds = 0.0
+        self.max_queue_seconds = 0.0
+
+    def overloaded(self, now):
+        """Whether the queue has been standing for longer than `interval`."""
+        return self._queued > 0 and now - self._last_empty > self.interval
+
+    def try_acquire(self):
+        """Take a slot if one is free and nobody is waiting for it."""
+        with self._lock:
+            if self.active < self.limit and not self._queued:
+                self.active += 1
+                self._count(ADMITTED)
+                return True
+            return False
+
+    def acquire(self, priority):
+        """Wait for a slot on this thread. Returns the seconds waited, or None if shed."""
+        event = threading.Event()
+        queued = self._enqueue(priority, event.set)
+        if not isinstance(queued, tuple):
+            return queued
+        waiter, timeout, since = queued
+        event.wait(timeout)
+        return self._settle(priority, waiter, since)
+
+    async def acquire_async(self, priority):
+        """`acquire` for the event loop: waiting holds no thread."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queued = self._enqueue(priority, lambda: loop.call_soon_threadsafe(_resolve, future))
+        if not isinstance(queued, tuple):
+            return queued
+        waiter, timeout, since = queued
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._settle(priority, waiter, since)
+
+    def _enqueue(self, priority, wake):
+        """0.0 if admitted at once, None if shed, else `(waiter, timeout, now)` for a queued request."""
+        now = time.monotonic()
+        with self._lock:
+            if self.active < self.limit and not self._queued:
+                self.active += 1
+                self._count(ADMITTED)
+                return 0.0
+            if self._queued >= self.max_queue:
+                self._count(SHED_QUEUE_FULL)
+                return None
+            timeout = self.target if self.overloaded(now) else self.interval
+            if not self._queued:
+                self._last_empty = now
+            waiter = _Waiter(wake)
+            self._queues[priority].append(waiter)
+            self._queued += 1
+            self._count(QUEUED)
+        return waiter, timeout, now
+
+    def _settle(self, priority, waiter, since):
+        waited = time.monotonic() - since
+        with self._lock:
+            if not waiter.granted:
+                # Not handed a slot in time. `release` only hands slots to waiters still queued.
+                self._queues[priority].remove(waiter)
+                self._dequeued()
+                self._count(SHED_TIMEOUT)
+                return None
+            self._count(ADMITTED)
+            self.queue_seconds += waited
+            self.max_queue_seconds = max(self.max_queue_seconds, waited)
+        metrics.ADMISSION_QUEUE.labels(self.name).observe(waited)
+        return waited
+
+    def _count(self, outcome):
+        self.counts[outcome] += 1
+        metrics.ADMISSION.labels(self.name, outcome).inc()
+
+    def release(self):
+        with self._lock:
+            overloaded = self.overloaded(time.monotonic())
+            for queue in self._queues.values():
+                if queue:
+                    # The slot passes straight to the waiter, so `active` stays the same.
+                    waiter = queue.pop() if overloaded else queue.popleft()
+                    waiter.granted = True
+                    self._dequeued()
+                    waiter.wake()
+                    return
+            self.active -= 1
+
+    def _dequeued(self):
+        self._queued -= 1
+        if not self._queued:
+            self._last_empty = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.counts,
+                'limit': self.limit,
+                'active': self.active,
+                'waiting': self._queued,
+                'queue_seconds': self.queue_seconds,
+                'max_queue_seconds': self.max_queue_seconds,
+            }
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+_gates = {cost: Gate(cost, limit) for cost, limit in ADMISSION_LIMITS.items()}
+_gates[HASHING] = Gate(HASHING, max(settings.PASSWORD_HASHING_WORKERS, ADMISSION_LIMITS[DEFAULT]))
+_static_prefix = '/' + settings.STATIC_URL.lstrip('/')
+
+
+def cost_class(path, query_string=''):
+    """The cost class of the route at `path`, None for static files (WhiteNoise serves them)."""
+    if path.startswith(_static_prefix):
+        return None
+    try:
+        url_name = resolve(path).url_name
+    except Resolver404:
+        return DEFAULT
+    if url_name == 'posts-explore' and parse_qs(query_string).get('tab', [''])[0].lower() == 'for-me':
+        return EXPENSIVE
+    return ADMISSION_ROUTE_CLASSES.get(url_name, DEFAULT)
+
+
+def priority(method, authorization):
+    """
+    Queue priority from the method and the `Authorization` header (bytes). Checks the access
+    token's signature and expiry, not the user behind it.
+    """
+    try:
+        raw_token = _jwt.get_raw_token(authorization) if authorization else None
+        authenticated = raw_token is not None and _jwt.get_validated_token(raw_token) is not None
+    except AuthenticationFailed:
+        authenticated = False
+    if not authenticated:
+        return ANONYMOUS
+    return AUTHENTICATED if method in ('GET', 'HEAD', 'OPTIONS') else AUTHENTICATED_WRITE
+
+
+def gate_for(path, query_string):
+    """The gate a request has to pass, None if it is let through."""
+    if not getattr(settings, 'ADMISSION_CONTROL_ENABLED', True):
+        return None
+    cost = cost_class(path, query_string)
+    return _gates[cost] if cost is not None else None
+
+
+def stats():
+    """`{cost class: {outcome: requests, 'limit', 'active', 'waiting', 'queue_seconds', 'max_queue_seconds'}}`."""
+    return {cost: gate.stats() for cost, gate in _gates.items()}
+
+
+def reset_stats():
+    for gate in _gates.values():
+        with gate._lock:
+            gate.counts.clear()
+            gate.queue_seconds = gate.max_queue_seconds = 0.0
+
+
+def overloaded_response():
+    """`(headers, body)` of the 503 for a shed request."""
+    # Spread the retries out so they do not come back as one wave.
+    retry_after = ADMISSION_RETRY_AFTER + random.randint(0, ADMISSION_RETRY_AFTER)
+    headers = [('Content-Type', 'application/json'), ('Retry-After', str(retry_after))]
+    return headers, json.dumps({'detail': 'The server is busy, please retry shortly.'}).encode()
+
+
+class ASGIAdmissionControl:
+    """
+    Admission control for `src.asgi`. Requests are admitted or shed on the event loop before they
+    reach Django, whose ASGI handler takes a thread per request, so waiting holds no thread and a
+    503 costs next to nothing.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        path = scope['path'][len(scope.get('root_path', '')):] or '/'
+        gate = gate_for(path, scope['query_string'].decode('latin-1'))
+        if gate is None:
+            return await self.app(scope, receive, send)
+
+        # Working out the priority costs a token check, so only queued requests pay for it.
+        if not gate.try_acquire():
+            authorization = dict(scope['headers']).get(b'authorization')
+            if await gate.acquire_async(priority(scope['method'], authorization)) is None:
+                headers, body = overloaded_response()
+                await send({
+                    'type': 'http.response.start',
+                    'status': 503,
+                    'headers': [(name.lower().encode(), value.encode()) for name, value in headers],
+                })
+                await send({'type': 'http.response.body', 'body': body})
+                return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
+
+
+class WSGIAdmissionControl:
+    """Admission control for `src.wsgi`: the same gates, waited on by the worker thread."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        gate = gate_for(environ.get('PATH_INFO') or '/', environ.get('QUERY_STRING', ''))
+        if gate is None:
+            return self.app(environ, start_response)
+
+        if not gate.try_acquire():
+            authorization = environ.get('HTTP_AUTHORIZATION', '').encode('latin-1')
+            if gate.acquire(priority(environ['REQUEST_METHOD'], authorization)) is None:
+                headers, body = overloaded_response()
+                start_response('503 Service Unavailable', headers)
+                return [body]
+        try:
+            # Django's responses are rendered by the time it returns, streaming ones aside.
+            return self.app(environ, start_response)
+        finally:
+            gate.release()
@@ -5,3 +5,7 @@ class ApiConfig(AppConfig):
     """App configuration of for the application config."""
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Connect the signal receivers.
+        from api import graph, objects, sync, tags  # noqa: F401
@@ -0,0 +1,37 @@
+"""
+`ModelBackend` checking passwords in the hashing pool (`api.auth.hashing`).
+
+Everything that authenticates (simplejwt's serializer in `LoginView`, the admin) goes through
+`AUTHENTICATION_BACKENDS`, so the pool and the re-encoding of out-of-date hashes apply to all of them.
+The pool's result is waited for on the calling thread: async callers run `authenticate` off the
+shared sync thread (`LoginView`).
+"""
+
+from django.contrib.auth import backends, get_user_model
+
+from api.auth import hashing
+
+UserModel = get_user_model()
+
+
+class ModelBackend(backends.ModelBackend):
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway so unknown users take as long as wrong passwords.
+            hashing.make_password(password)
+            return None
+
+        is_correct, must_update = hashing.verify_password(password, user.password)
+        if not is_correct or not self.user_can_authenticate(user):
+            return None
+        if must_update:
+            user.password = hashing.make_password(password)
+            user.save(update_fields=['password'])
+        return user
@@ -0,0 +1,99 @@
+"""
+Password hashing off the request thread.
+
+PBKDF2 is deliberately slow, and under daphne a sync view runs on the one shared sync thread, so every
+login or registration used to stall every other sync request for the length of a hash. Hashing and
+verification run in a small process pool instead; async views await it and sync callers block only
+their own thread.
+
+* `PASSWORD_HASHING_WORKERS` bounds the pool. It defaults to 0, which hashes inline, for development
+  and tests; production sets it to the CPUs hashing may use.
+* `PBKDF2PasswordHasher` takes its work factor from `PASSWORD_HASHING_ITERATIONS`. The format stays
+  `pbkdf2_sha256`, so existing hashes keep working and are re-encoded with the configured iterations
+  the next time their owner logs in (`api.auth.backends`).
+
+This module must not import models: the pool's workers import it before Django is set up.
+"""
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+_executor = None
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """`pbkdf2_sha256` with tunable iterations. Hashes with any other count report `must_update`."""
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASHING_ITERATIONS', None) or hashers.PBKDF2PasswordHasher.iterations
+
+
+def _setup_worker():
+    import django
+    django.setup()
+
+
+def get_executor():
+    """The shared hashing pool, started on first use. `None` when hashing inline."""
+    global _executor
+    workers = getattr(settings, 'PASSWORD_HASHING_WORKERS', 0)
+    if not workers:
+        return None
+    if _executor is None:
+        # Spawned rather than forked: the server process runs threads (and an event loop).
+        _executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=_setup_worker,
+        )
+    return _executor
+
+
+def _check_password(password, encoded):
+    return hashers.verify_password(password, encoded)[0]
+
+
+def must_update(encoded):
+    """Whether `encoded` should be re-encoded with the preferred hasher and its current parameters."""
+    preferred = hashers.get_hasher('default')
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def make_password(password):
+    executor = get_executor()
+    if executor is None:
+        return hashers.make_password(password)
+    return executor.submit(hashers.make_password, password).result()
+
+
+def verify_password(password, encoded):
+    """Return `(is_correct, must_update)` like `django.contrib.auth.hashers.verify_password`."""
+    executor = get_executor()
+    if executor is None:
+        is_correct = _check_password(password, encoded)
+    else:
+        is_correct = executor.submit(_check_password, password, encoded).result()
+    return is_correct, is_correct and must_update(encoded)
+
+
+async def amake_password(password):
+    executor = get_executor()
+    if executor is None:
+        return hashers.make_password(password)
+    return await asyncio.get_running_loop().run_in_executor(executor, hashers.make_password, password)
+
+
+async def averify_password(password, encoded):
+    executor = get_executor()
+    if executor is None:
+        is_correct = _check_password(password, encoded)
+    else:
+        is_correct = await asyncio.get_running_loop().run_in_executor(executor, _check_password, password, encoded)
+    return is_correct, is_correct and must_update(encoded)
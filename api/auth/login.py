@@ -0,0 +1,59 @@
+"""
+Async login. Credentials are checked by simplejwt's serializer and so by `AUTHENTICATION_BACKENDS`
+(`api.auth.backends`, which verifies in the hashing pool). That runs in a worker thread rather than
+the shared sync thread, so the event loop and other sync views keep serving while a login burst is
+being verified.
+"""
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from api.serializers import TokenObtainPairSerializer
+
+
+def request_data(request):
+    """The body of a JSON or form `request` as a dict."""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+    return request.POST.dict()
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class LoginView(View):
+    """
+    `POST {"email": ..., "password": ...}` returns `{"refresh": ..., "access": ...}`, with the same
+    claims and errors as simplejwt's `TokenObtainPairView`.
+    """
+
+    async def post(self, request):
+        serializer = TokenObtainPairSerializer(data=request_data(request), context={'request': request})
+        try:
+            # Not thread sensitive: the password check blocks its own thread, not the shared one.
+            await sync_to_async(validate, thread_sensitive=False)(serializer)
+        except ValidationError as error:
+            return JsonResponse(error.detail, status=error.status_code)
+        except (AuthenticationFailed, InvalidToken) as error:
+            return JsonResponse({'detail': error.detail}, status=error.status_code)
+        return JsonResponse(serializer.validated_data)
+
+
+def validate(serializer):
+    try:
+        serializer.is_valid(raise_exception=True)
+    except TokenError as error:
+        raise InvalidToken(error.args[0])
+    finally:
+        # Worker threads are not covered by the request's own connection cleanup.
+        close_old_connections()
@@ -1,93 +1,81 @@
-from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
-from rest_framework.generics import CreateAPIView
 
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.contrib.sites.shortcuts import get_current_site
-from django.urls import reverse
-from django.conf import settings
-from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 
 from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework.exceptions import ValidationError
 
+from api import jobs
+from api.auth import hashing
+from api.auth.login import request_data
 from api.models import User
-from api.serializers import RegisterSerializer, UserSerializer
+from api.serializers import RegisterSerializer
 
-class RegisterView(CreateAPIView):
-    queryset = User.objects.all()
-    serializer_class = RegisterSerializer
-    permission_classes = (AllowAny,)
-    authentication_classes = ()
-
-    def create(self, request, *args, **kwargs):
-        try:
-            serializer = self.get_serializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
-            user = self.perform_create(serializer)
-            headers = self.get_success_headers(serializer.data)
-
-            # Generate and send OTP
-            user.generate_otp()
-            self.send_otp_email(user)
+@method_decorator(csrf_exempt, name='dispatch')
+class RegisterView(View):
+    """
+    Async registration. Validation and the writes run in the sync thread, the password is hashed in
+    the hashing pool (`api.auth.hashing`) in between, so a signup burst does not stall other requests.
+    """
 
-            refresh = RefreshToken.for_user(user)
-            access_token = str(refresh.access_token)
-            refresh_token = str(refresh)
+    async def post(self, request, *args, **kwargs):
+        serializer = RegisterSerializer(data=request_data(request))
+        if not await sync_to_async(serializer.is_valid)():
+            return self.failed(serializer.errors)
 
-            response = dict(
-                message="Registration successful. Please check your email for the OTP.",
-                status="success",
-                code=status.HTTP_201_CREATED,
-                data=dict(
-                    user=serializer.data,
-                    access_token=access_token,
-                    refresh_token=refresh_token,
-                )
+        password_hash = await hashing.amake_password(serializer.validated_data['password'])
+        try:
+            response = await sync_to_async(self.create)(serializer, password_hash)
+        except Exception:
+            await sync_to_async(self.discard_inactive)(serializer.validated_data['email'])
+            return self.failed([{}])
+        return JsonResponse(response, status=status.HTTP_201_CREATED)
+
+    def create(self, serializer, password_hash):
+        user = serializer.save(password_hash=password_hash)
+
+        # Generate and send OTP
+        user.generate_otp()
+        self.send_otp_email(user)
+
+        refresh = RefreshToken.for_user(user)
+        access_token = str(refresh.access_token)
+        refresh_token = str(refresh)
+
+        return dict(
+            message="Registration successful. Please check your email for the OTP.",
+            status="success",
+            code=status.HTTP_201_CREATED,
+            data=dict(
+                user=serializer.data,
+                access_token=access_token,
+                refresh_token=refresh_token,
             )
-            return Response(response, status=status.HTTP_201_CREATED, headers=headers)
+        )
 
-        except ValidationError as e:
-            response = dict(
-                status="Bad request",
-                message='Registration failed',
-                code=status.HTTP_400_BAD_REQUEST,
-                errors=e.detail,
-                data=None
-            )
-            return Response(response, status=status.HTTP_400_BAD_REQUEST)
-        
-        except:
-            user = User.objects.filter(email=request.data.get('email')).first()
-            if user and not user.is_active:
-                user.delete()
-            response = dict(
-                status="Bad request",
-                message='Registration failed',
-                code=status.HTTP_400_BAD_REQUEST,
-                errors=[{}],
-                data=None
-            )
-            return Response(response, status=status.HTTP_400_BAD_REQUEST)
-        
-    def perform_create(self, serializer):
-        user = serializer.save()
-        return user
+    def discard_inactive(self, email):
+        user = User.objects.filter(email=email).first()
+        if user and not user.is_active:
+            user.delete()
+
+    def failed(self, errors):
+        response = dict(
+            status="Bad request",
+            message='Registration failed',
+            code=status.HTTP_400_BAD_REQUEST,
+            errors=errors,
+            data=None
+        )
+        return JsonResponse(response, status=status.HTTP_400_BAD_REQUEST)
 
     def send_otp_email(self, user):
-        mail_subject = 'Culinara - Your OTP for account verification'
-        message = f"Hello {user.username},\n\nYour OTP for account verification is: {user.otp}\n\nThis OTP is valid for 15 minutes.\n\nThanks for choosing Culinara."
-        send_mail(
-            mail_subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            fail_silently=False,
-        )
+        jobs.enqueue('send_otp_email', {'user_id': str(user.id)})
 
 
 class VerifyOTPView(APIView):
@@ -163,12 +151,4 @@ class ResendOTPView(APIView):
             return Response(response, status=status.HTTP_400_BAD_REQUEST)
 
     def send_otp_email(self, user):
-        mail_subject = 'Your OTP for account verification for Culinara'
-        message = f"Hello {user.username},\n\nYour new OTP for account verification is: {user.otp}\n\nThis OTP is valid for 15 minutes.\n\nThanks for choosing Culinara."
-        send_mail(
-            mail_subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            fail_silently=False,
-        )
+        jobs.enqueue('send_otp_email', {'user_id': str(user.id), 'resend': True})
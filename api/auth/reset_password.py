@@ -1,9 +1,3 @@
-from django.utils.http import urlsafe_base64_encode
-from django.utils.encoding import force_bytes
-from django.contrib.auth.tokens import PasswordResetTokenGenerator
-from django.core.mail import send_mail, EmailMultiAlternatives
-from django.template.loader import render_to_string
-from django.conf import settings
 from django.contrib.auth.password_validation import validate_password
 
 from django.utils.http import urlsafe_base64_decode
@@ -17,6 +11,17 @@ from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from rest_framework.views import APIView
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from api import jobs
+from api.auth import hashing
+from api.auth.login import request_data
 from api.models import User
 
 
@@ -31,29 +36,7 @@ class PasswordResetRequestView(APIView):
 
         try:
             user = User.objects.get(email=email)
-            token_generator = PasswordResetTokenGenerator()
-            token = token_generator.make_token(user)
-            uid = urlsafe_base64_encode(force_bytes(user.pk))
-
-            reset_url = f"{settings.FRONTEND_URL}/reset-password/{uid}/{token}/"
-
-            context = {
-                'user': user,
-                'reset_url': reset_url
-            }
-            subject = "Password Reset Request"
-            text_content = f"Hello {user.username},\n\nYou requested a password reset. Click the link below to reset your password:\n{reset_url}"
-            html_content = render_to_string('password_reset_email.html', context)
-
-            email = EmailMultiAlternatives(
-                subject=subject,
-                body=text_content,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=[user.email],
-            )
-            
-            email.attach_alternative(html_content, "text/html")
-            email.send()
+            jobs.enqueue('send_password_reset_email', {'user_id': str(user.id)})
 
             return Response({'message': 'Password reset email sent.'}, status=status.HTTP_200_OK)
         
@@ -78,39 +61,43 @@ class PasswordResetTokenValidateView(APIView):
             return Response({'error': 'Invalid token.'}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class PasswordResetView(APIView):
-    permission_classes = (AllowAny,)
+@method_decorator(csrf_exempt, name='dispatch')
+class PasswordResetView(View):
+    """
+    Async, like `LoginView`: the new password is hashed in the hashing pool (`api.auth.hashing`) rather
+    than on the shared sync thread.
+    """
 
-    def post(self, request, uidb64, token):
-        new_password = request.data.get('password')
+    async def post(self, request, uidb64, token):
+        new_password = request_data(request).get('password')
 
         if not new_password:
-            return Response({'error': 'New password is required.'}, status=status.HTTP_400_BAD_REQUEST)
+            return JsonResponse({'error': 'New password is required.'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
             uid = urlsafe_base64_decode(uidb64).decode()
-            user = User.objects.get(pk=uid)
+            user = await User.objects.aget(pk=uid)
+        except (TypeError, ValueError, OverflowError, DjangoValidationError, User.DoesNotExist):
+            return JsonResponse({'error': 'Invalid token.'}, status=status.HTTP_400_BAD_REQUEST)
 
-            token_generator = PasswordResetTokenGenerator()
-            if token_generator.check_token(user, token):
-                try:
-                    validate_password(new_password, user)
-                    user.set_password(new_password)
-                    user.save()
-
-                    refresh = RefreshToken.for_user(user)
-                    access_token = str(refresh.access_token)
-                    refresh_token = str(refresh)
-
-                    return Response({'message': 'Password reset successful.', 'access_token': access_token, 'refresh_token': refresh_token}, status=status.HTTP_200_OK)
-                except ValidationError as e:
-                    return Response({'error': e.messages}, status=status.HTTP_400_BAD_REQUEST)
-            else:
-                return Response({'error': 'Invalid or expired token.'}, status=status.HTTP_400_BAD_REQUEST)
+        token_generator = PasswordResetTokenGenerator()
+        if not token_generator.check_token(user, token):
+            return JsonResponse({'error': 'Invalid or expired token.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            validate_password(new_password, user)
+        except DjangoValidationError as e:
+            return JsonResponse({'error': e.messages}, status=status.HTTP_400_BAD_REQUEST)
+
+        user.password = await hashing.amake_password(new_password)
+        await user.asave(update_fields=['password'])
+
+        refresh = await sync_to_async(RefreshToken.for_user)(user)
+        access_token = str(refresh.access_token)
+        refresh_token = str(refresh)
+
+        return JsonResponse({'message': 'Password reset successful.', 'access_token': access_token, 'refresh_token': refresh_token}, status=status.HTTP_200_OK)
 
-        except (TypeError, ValueError, OverflowError, User.DoesNotExist):
-            return Response({'error': 'Invalid token.'}, status=status.HTTP_400_BAD_REQUEST)
-        
 
 class ResendPasswordResetView(APIView):
     permission_classes = (AllowAny,)
@@ -124,29 +111,7 @@ class ResendPasswordResetView(APIView):
         try:
             user = User.objects.get(email=email)
             if user.is_active:
-                token_generator = PasswordResetTokenGenerator()
-                token = token_generator.make_token(user)
-                uid = urlsafe_base64_encode(force_bytes(user.pk))
-
-                reset_url = f"{settings.FRONTEND_URL}/reset-password/{uid}/{token}/"
-
-                context = {
-                    'user': user,
-                    'reset_url': reset_url
-                }
-                subject = "Password Reset Request (Resend)"
-                text_content = f"Hello {user.username},\n\nYou requested a password reset. Click the link below to reset your password:\n{reset_url}"
-                html_content = render_to_string('password_reset_email.html', context)
-
-                email = EmailMultiAlternatives(
-                    subject=subject,
-                    body=text_content,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    to=[user.email],
-                )
-                
-                email.attach_alternative(html_content, "text/html")
-                email.send()
+                jobs.enqueue('send_password_reset_email', {'user_id': str(user.id), 'resend': True})
 
                 return Response({'message': 'Password reset email has been resent.'}, status=status.HTTP_200_OK)
 
@@ -0,0 +1,64 @@
+"""
+Prefix autocomplete for tag names and usernames.
+
+Lookups compile to `UPPER(col::text) LIKE UPPER('abc%')`, which on PostgreSQL is a range scan on the
+`text_pattern_ops` expression indexes created in `0003_prefix_autocomplete`. Matches are ranked by
+popularity (`Tag.post_count`, `User.follower_count`) and the results cached per normalized prefix.
+One- and two-character prefixes match the most rows and change the least, so they are kept longer.
+"""
+
+import hashlib
+
+from django.core.cache import cache
+
+from api import metrics
+from api.constants import (
+    AUTOCOMPLETE_CACHE_TIMEOUT,
+    AUTOCOMPLETE_LIMIT,
+    AUTOCOMPLETE_MAX_PREFIX_LENGTH,
+    AUTOCOMPLETE_SHORT_PREFIX_CACHE_TIMEOUT,
+)
+from api.models import Tag, User
+
+
+def normalize(prefix):
+    return prefix.strip().lstrip('#@').lower()[:AUTOCOMPLETE_MAX_PREFIX_LENGTH]
+
+
+def _cached(kind, prefix, loader):
+    # Hashed: prefixes are user input, and memcached keys cannot hold spaces or exceed 250 bytes.
+    key = f'autocomplete:{kind}:{hashlib.md5(prefix.encode()).hexdigest()}'
+    results = cache.get(key)
+    metrics.count_cache('autocomplete', hits=results is not None, misses=results is None)
+    if results is None:
+        results = loader()
+        timeout = AUTOCOMPLETE_SHORT_PREFIX_CACHE_TIMEOUT if len(prefix) <= 2 else AUTOCOMPLETE_CACHE_TIMEOUT
+        cache.set(key, results, timeout)
+    return results
+
+
+def complete_tags(prefix, limit=AUTOCOMPLETE_LIMIT):
+    """Most used tags whose name starts with `prefix`."""
+    prefix = normalize(prefix)
+    if not prefix:
+        return []
+
+    return _cached('tags', prefix, lambda: list(
+        Tag.objects.filter(name__istartswith=prefix)
+        .order_by('-post_count', 'name')
+        .values('id', 'name', 'post_count')[:AUTOCOMPLETE_LIMIT]
+    ))[:limit]
+
+
+def complete_users(prefix, limit=AUTOCOMPLETE_LIMIT):
+    """Most followed active users whose username starts with `prefix`."""
+    prefix = normalize(prefix)
+    if not prefix:
+        return []
+
+    return _cached('users', prefix, lambda: [
+        {**user, 'id': str(user['id'])} for user in
+        User.objects.filter(username__istartswith=prefix, is_active=True)
+        .order_by('-follower_count', 'username')
+        .values('id', 'username', 'avatar', 'follower_count')[:AUTOCOMPLETE_LIMIT]
+    ])[:limit]
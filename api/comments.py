@@ -0,0 +1,139 @@
+"""
+Threaded comments on posts.
+
+Each comment stores its place in the thread as a materialized path (`Comment.path`): the IDs of its
+ancestors and its own, `COMMENT_PATH_SEGMENT` zero-padded base-36 digits each. IDs only grow, so
+sorting by path lists a thread depth-first with siblings oldest first, the order it is read in, and
+everything below a comment is one range of the `(post_id, path)` index (`descendants`). No query
+walks the tree level by level.
+
+* `GET posts/<id>/comments/`: top-level comments, newest first, each with its first
+  `COMMENT_REPLY_PREVIEW` replies (in thread order, with `depth` to indent by). Fetching the
+  previews of a whole page is one windowed query.
+* `GET comments/<id>/replies/`: everything below a comment, in thread order.
+
+Both are keyset-paginated (`?cursor=`), so deep pages cost what the first does. Authors come from
+the per-object user cache (`objects.get_users`) in one multi-get per page.
+
+`Comment.reply_count` and `Post.comment_count` are kept in step by `add_comment` and `delete_comment`,
+in the same transaction as the comment itself, so listing them needs no `COUNT(*)`.
+"""
+
+from django.db import transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import Greatest, RowNumber, Substr
+
+from api import objects
+from api.constants import COMMENT_MAX_DEPTH, COMMENT_PATH_SEGMENT, COMMENT_REPLY_PREVIEW
+from api.fast_serializers import FastSerializer
+from api.models import Comment, Post
+from api.serializers import CommentSerializer
+
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def encode_segment(comment_id):
+    digits = []
+    while comment_id:
+        comment_id, digit = divmod(comment_id, 36)
+        digits.append(DIGITS[digit])
+    return ''.join(reversed(digits)).rjust(COMMENT_PATH_SEGMENT, '0')
+
+
+def path_end(path):
+    """The first path past everything below `path`: its last segment plus one."""
+    return path[:-COMMENT_PATH_SEGMENT] + encode_segment(int(path[-COMMENT_PATH_SEGMENT:], 36) + 1)
+
+
+def descendants(post_id, path):
+    """Every comment below the one at `path`, as a range of the `(post_id, path)` index."""
+    return Comment.objects.filter(post_id=post_id, path__gt=path, path__lt=path_end(path))
+
+
+def top_level(post_id):
+    return Comment.objects.filter(post_id=post_id, parent=None)
+
+
+class FastCommentSerializer(FastSerializer):
+    serializer_class = CommentSerializer
+    related = ('author',)
+    extra_columns = ('author_id', 'path')
+
+    def load_related(self, rows):
+        authors = objects.get_users(list({str(row['author_id']) for row in rows if row['author_id'] is not None}))
+        return {'author': {row['pk']: authors.get(str(row['author_id'])) for row in rows}}
+
+
+def preview_rows(post_id, roots, limit=COMMENT_REPLY_PREVIEW):
+    """The first `limit` comments below each of the top-level comment rows `roots`, in thread order."""
+    ranges = Q()
+    for root in roots:
+        if root['reply_count']:
+            ranges |= Q(path__gt=root['path'], path__lt=path_end(root['path']))
+    if not ranges:
+        return []
+
+    ranked = Comment.objects.filter(ranges, post_id=post_id).values(*FastCommentSerializer.columns).annotate(
+        rank=Window(RowNumber(), partition_by=Substr('path', 1, COMMENT_PATH_SEGMENT), order_by=F('path').asc()),
+    )
+    return list(ranked.filter(rank__lte=limit).order_by('path'))
+
+
+def serialize_threads(rows):
+    """Serialize top-level comment rows, each with its preview under `replies`."""
+    if not rows:
+        return []
+    previews = preview_rows(rows[0]['post_id'], rows)
+    # One pass, so the authors of the whole page are loaded together.
+    serialized = FastCommentSerializer().serialize(rows + previews)
+    threads = {}
+    for row, data in zip(previews, serialized[len(rows):]):
+        threads.setdefault(int(row['path'][:COMMENT_PATH_SEGMENT], 36), []).append(data)
+
+    results = serialized[:len(rows)]
+    for data in results:
+        data['replies'] = threads.get(data['id'], [])
+    return results
+
+
+@transaction.atomic
+def add_comment(post_id, author, content, parent=None):
+    """
+    Add a comment to the post, or a reply to `parent`. Raises `Comment.DoesNotExist` if `parent` was
+    deleted meanwhile.
+    """
+    if parent is not None:
+        # Locked so the thread cannot be deleted from under the reply.
+        parent = Comment.objects.select_for_update().get(pk=parent.pk)
+        if parent.depth >= COMMENT_MAX_DEPTH:
+            parent = Comment.objects.select_for_update().get(pk=parent.parent_id)
+
+    comment = Comment.objects.create(
+        post_id=post_id, author=author, parent=parent, content=content,
+        depth=0 if parent is None else parent.depth + 1,
+    )
+    # The path ends with the comment's own ID, which the insert has only just assigned.
+    comment.path = (parent.path if parent is not None else '') + encode_segment(comment.id)
+    Comment.objects.filter(pk=comment.pk).update(path=comment.path)
+
+    if parent is not None:
+        Comment.objects.filter(pk=parent.pk).update(reply_count=F('reply_count') + 1)
+    Post.all_objects.filter(pk=post_id).update(comment_count=F('comment_count') + 1)
+    transaction.on_commit(lambda: objects.invalidate_posts([post_id]))
+    return comment
+
+
+@transaction.atomic
+def delete_comment(comment):
+    """Delete `comment` and everything below it. Returns how many comments went."""
+    thread = Comment.objects.filter(post_id=comment.post_id, path__gte=comment.path, path__lt=path_end(comment.path))
+    # One DELETE for the whole thread; nothing listens to comment deletes.
+    removed = thread._raw_delete(thread.db)
+    if not removed:
+        return 0
+
+    if comment.parent_id is not None:
+        Comment.objects.filter(pk=comment.parent_id).update(reply_count=Greatest(F('reply_count') - 1, 0))
+    Post.all_objects.filter(pk=comment.post_id).update(comment_count=Greatest(F('comment_count') - removed, 0))
+    transaction.on_commit(lambda: objects.invalidate_posts([comment.post_id]))
+    return removed
@@ -1,3 +1,142 @@
 """This file comprises of all constants to be reused across the Culinara application."""
 
 STOPWORDS = {"and", "or", "the", "a", "an", "is", "of", "on", "in", "for", "to", "with", "by", }
+
+# Follow graph (`api.graph`)
+FOLLOW_GRAPH_CACHE_TIMEOUT = 60 * 15
+BULK_FOLLOW_LIMIT = 200
+SUGGESTED_FOLLOWS_LIMIT = 20
+
+# Tag pages (`api.tags`)
+TAG_PAGE_CACHE_TIMEOUT = 60
+TAG_LOOKUP_CACHE_TIMEOUT = 60 * 60
+
+# Autocomplete (`api.autocomplete`)
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_PREFIX_LENGTH = 40
+AUTOCOMPLETE_CACHE_TIMEOUT = 60
+AUTOCOMPLETE_SHORT_PREFIX_CACHE_TIMEOUT = 60 * 10
+
+# Background jobs (`api.jobs`)
+JOB_POLL_INTERVAL = 1.0
+JOB_BATCH_SIZE = 10
+JOB_LOCK_TIMEOUT = 60 * 10
+JOB_MAX_BACKOFF = 60 * 60
+# Done jobs are deleted this long after finishing (dead ones are kept for requeueing).
+JOB_RETENTION = 60 * 60 * 24 * 7
+JOB_PRUNE_INTERVAL = 60 * 10
+JOB_PRUNE_BATCH_SIZE = 1000
+
+# Delta sync (`api.sync`). Cursors stay behind events younger than `SYNC_CURSOR_LAG` seconds, whose
+# lower-ID neighbours may not have committed yet.
+SYNC_BATCH_SIZE = 500
+SYNC_CURSOR_LAG = 10
+
+# Table partitioning (`api.partitions`)
+PARTITION_MONTHS_AHEAD = 3
+
+# Admin (`api.admin`)
+ESTIMATED_COUNT_THRESHOLD = 100_000
+
+# Soft deletion and purging (`api.moderation`)
+PURGE_BATCH_SIZE = 1000
+PURGE_BATCHES_PER_JOB = 50
+
+# Multi-get and per-object payload cache (`api.objects`)
+BATCH_GET_LIMIT = 100
+OBJECT_CACHE_TIMEOUT = 60 * 10
+
+# Similar posts (`api.similar`)
+SIMILAR_POSTS_K = 20
+SIMILAR_TAG_WEIGHT = 1.0
+SIMILAR_LIKE_WEIGHT = 1.0
+SIMILAR_MAX_FEATURE_POSTS = 5000
+SIMILAR_BLOCK_ROWS = 1024
+SIMILAR_WRITE_BATCH = 1000
+SIMILAR_CACHE_TIMEOUT = 60 * 60
+
+# View and impression counting (`api.impressions`)
+VIEW_FLUSH_INTERVAL = 5.0
+VIEW_FLUSH_MAX_POSTS = 10_000
+VIEW_FLUSH_BATCH = 500
+VIEW_DEDUP_WINDOW = 60 * 30
+VIEW_DEDUP_MAX_KEYS = 1_000_000
+
+# Single-flight reads (`api.single_flight`)
+SINGLE_FLIGHT_WAIT = 5.0
+SINGLE_FLIGHT_POLL_INTERVAL = 0.01
+SINGLE_FLIGHT_RESULT_TIMEOUT = 5
+
+# Admission control (`api.admission`). Concurrent requests per process and cost class; a process runs
+# Python on one core at a time, so more mostly adds latency. `explore?tab=for-me` is expensive too.
+# `hashing` routes wait on the password hashing pool instead, and get a slot per pool worker
+# (`PASSWORD_HASHING_WORKERS`, at least the `default` limit).
+ADMISSION_LIMITS = {'cheap': 4, 'default': 2, 'expensive': 1}
+ADMISSION_ROUTE_CLASSES = {
+    'current_user': 'cheap',
+    'like_post': 'cheap',
+    'autocomplete': 'cheap',
+    'tags-autocomplete': 'cheap',
+    'token_refresh': 'cheap',
+    'posts-detail': 'cheap',
+    'posts-batch': 'cheap',
+    'users-batch': 'cheap',
+    'posts-similar-posts': 'cheap',
+    'notifications-unread-count': 'cheap',
+    'posts-search': 'expensive',
+    'posts-home': 'expensive',
+    'users-suggested': 'expensive',
+    'sync': 'expensive',
+    'token_obtain_pair': 'hashing',
+    'password_reset_confirm': 'hashing',
+}
+ADMISSION_MAX_QUEUE = 64
+ADMISSION_CODEL_TARGET = 0.01
+ADMISSION_CODEL_INTERVAL = 0.1
+ADMISSION_RETRY_AFTER = 1
+
+# Comments (`api.comments`). Replies to a comment `COMMENT_MAX_DEPTH` levels below the top become its
+# siblings, which bounds `Comment.path` (`COMMENT_PATH_SEGMENT` characters a level).
+COMMENT_PATH_SEGMENT = 8
+COMMENT_MAX_DEPTH = 8
+COMMENT_PAGE_SIZE = 20
+COMMENT_REPLY_PREVIEW = 3
+COMMENT_MAX_LENGTH = 5000
+
+# Notifications (`api.notifications`)
+NOTIFICATION_FLUSH_INTERVAL = 2.0
+NOTIFICATION_FLUSH_MAX_GROUPS = 5000
+NOTIFICATION_FLUSH_BATCH = 100
+NOTIFICATION_FLUSH_MAX_ATTEMPTS = 5
+NOTIFICATION_PAGE_SIZE = 20
+NOTIFICATION_UNREAD_CAP = 99
+NOTIFICATION_UNREAD_CACHE_TIMEOUT = 60 * 10
+
+# JSON key filters (`api.json_filters`): the keys of each model's JSON fields that list endpoints
+# filter on (`?metadata__diet=vegan`). Each has an index; adding one needs `makemigrations`, with the
+# generated `AddIndex` changed to `api.operations.AddIndexConcurrently` (see `0014_json_key_indexes`).
+JSON_FILTER_KEYS = {
+    'user': {'metadata': ('diet', 'cuisine')},
+    'post': {'thumbnail': ('diet', 'cuisine')},
+}
+JSON_FILTER_MAX_VALUES = 20
+
+# Home screen (`api.home`)
+HOME_SECTION_LIMIT = 8
+HOME_SECTION_MAX_LIMIT = 50
+HOME_SECTION_WORKERS = 4
+
+# Uploaded images and their derivatives (`api.media`). Sizes in pixels; a variant is never larger
+# than its original. `..._DISPLAY_...` is the variant offered as `src` to clients that ignore `srcset`.
+MEDIA_THUMBNAIL_WIDTHS = (320, 640, 1280)
+MEDIA_THUMBNAIL_DISPLAY_WIDTH = 640
+MEDIA_AVATAR_SIZES = (64, 128, 256)
+MEDIA_AVATAR_DISPLAY_SIZE = 128
+MEDIA_FORMATS = ('avif', 'webp')
+MEDIA_WEBP_QUALITY = 80
+MEDIA_AVIF_QUALITY = 60
+MEDIA_AVIF_SPEED = 8
+MEDIA_PLACEHOLDER_SIZE = 16
+MEDIA_ACCEPTED_FORMATS = ('JPEG', 'MPO', 'PNG', 'WEBP', 'GIF', 'AVIF')
+MEDIA_MAX_UPLOAD_BYTES = 15 * 1024 * 1024
+MEDIA_MAX_PIXELS = 50_000_000
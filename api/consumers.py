@@ -1,5 +1,7 @@
 import json
-from channels.generic.websocket import AsyncWebsocketConsumer
+from urllib.parse import parse_qs
+
+from channels.generic.websocket import AsyncJsonWebsocketConsumer, AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 
 from djangochannelsrestframework import permissions
@@ -9,6 +11,11 @@ from djangochannelsrestframework.observer import model_observer
 from djangochannelsrestframework.observer.generics import ObserverModelInstanceMixin
 
 from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import notifications
 
 from .models import Post
 from .serializers import PostSerializer, UserSerializer
@@ -40,3 +47,40 @@ from .serializers import PostSerializer, UserSerializer
 #     queryset = get_user_model().objects.all()
 #     serializer_class = UserSerializer
 #     permission_classes = (permissions.AllowAny,)
+
+
+@database_sync_to_async
+def _user_id_from_token(token):
+    """The ID of the active user the access token `token` is for, or None."""
+    try:
+        user_id = AccessToken(token)[jwt_settings.USER_ID_CLAIM]
+    except (TokenError, KeyError):
+        return None
+    if not get_user_model().objects.filter(**{jwt_settings.USER_ID_FIELD: user_id, 'is_active': True}).exists():
+        return None
+    return user_id
+
+
+class NotificationConsumer(AsyncJsonWebsocketConsumer):
+    """
+    `ws/notifications/?token=<access token>`: the user's notification groups, as `GET notifications/`
+    returns them, each time a flush changes one (`api.notifications`).
+    """
+    group = None
+
+    async def connect(self):
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        user_id = await _user_id_from_token(query.get('token', [''])[0])
+        if user_id is None:
+            await self.close(code=4401)
+            return
+        self.group = notifications.group_name(user_id)
+        await self.channel_layer.group_add(self.group, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if self.group is not None:
+            await self.channel_layer.group_discard(self.group, self.channel_name)
+
+    async def notification_push(self, event):
+        await self.send_json(event['notification'])
@@ -20,6 +20,7 @@ from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.exceptions import ValidationError
 
+from . import metrics
 from .serializers import RegisterSerializer
 
 from .models import User
@@ -89,13 +90,14 @@ class RegisterView(CreateAPIView):
             'activation_url': activation_url,
         })
 
-        send_mail(
-            mail_subject,
-            message,
-            settings.EMAIL_HOST_USER,
-            [user.email],
-            fail_silently=False,
-        )
+        with metrics.timed_email('activation'):
+            send_mail(
+                mail_subject,
+                message,
+                settings.EMAIL_HOST_USER,
+                [user.email],
+                fail_silently=False,
+            )
 
 
 class EmailVerify(APIView):
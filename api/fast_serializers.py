@@ -0,0 +1,204 @@
+"""
+Read-only fast path for `PostSerializer` and `UserSerializer` payloads.
+
+DRF spends most of a list page's CPU in per-field dispatch: `get_attribute`, `to_representation` and
+`SerializerMethodField` lookups for every field of every row, plus one query per post for likes and
+tags and two per author for follows. The serializers here build the same dicts from `values()` rows:
+
+* Each serializer's field plan (output key, column, converter) is compiled once, at import, from the
+  DRF serializer's own fields, so a field added there shows up here without changes.
+* Related lists (likes, tags, followers, following) and authors are loaded in one query each for the
+  whole page, sorted like the DRF serializers sort them.
+
+The output is identical to the DRF serializers once rendered (`api.tests.FastSerializerTests`).
+Views opt in with `FastSerializerMixin`; writes always go through DRF.
+
+```py
+class PostViewSet(FastSerializerMixin, ModelViewSet):
+    serializer_class = PostSerializer
+    fast_serializer_class = FastPostSerializer
+```
+"""
+
+from django.db.models import QuerySet
+from rest_framework import fields as drf_fields
+from rest_framework import permissions
+from rest_framework import relations
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+from api.models import Like, PostTag, User
+from api.serializers import PostSerializer, UserSerializer
+
+Follow = User.followers.through
+
+
+def _identity(value):
+    return value
+
+
+def _converter(field):
+    """The cheapest callable equivalent to `field.to_representation` for non-null values."""
+    if isinstance(field, drf_fields.UUIDField) and field.uuid_format == 'hex_verbose':
+        return str
+    if isinstance(field, drf_fields.CharField):
+        return str
+    if type(field) is drf_fields.JSONField and not field.binary:
+        return _identity
+    if isinstance(field, relations.PrimaryKeyRelatedField) and field.pk_field is None:
+        # The column holds the related primary key already.
+        return _identity
+    return field.to_representation
+
+
+def compile_plan(serializer_class, related):
+    """
+    Compile `serializer_class`'s readable fields into `(key, column, convert)` steps. Fields named in
+    `related` are filled by batch loaders instead and get `column=None`.
+    """
+    model = serializer_class.Meta.model
+    plan = []
+    for name, field in serializer_class().fields.items():
+        if field.write_only:
+            continue
+        if name in related:
+            plan.append((name, None, None))
+            continue
+        if field.source_attrs and len(field.source_attrs) == 1:
+            column = model._meta.get_field(field.source).attname
+            plan.append((name, column, _converter(field)))
+            continue
+        raise TypeError(f'{serializer_class.__name__}.{name} has no fast representation.')
+    return tuple(plan)
+
+
+def _related_lists(queryset, key, value, ids):
+    lists = {id: [] for id in ids}
+    for owner, item in queryset.filter(**{f'{key}__in': ids}).values_list(key, value):
+        lists[owner].append(item)
+    # Sorted in Python like the DRF serializers, rather than in a database collation.
+    for items in lists.values():
+        items.sort()
+    return lists
+
+
+class FastSerializer:
+    """Serializes model instances, `values()` dicts or a queryset to the DRF serializer's output."""
+
+    serializer_class = None
+    related = ()
+    extra_columns = ()
+    plan = ()
+    columns = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.plan = compile_plan(cls.serializer_class, cls.related)
+        columns = ['pk', *(column for _, column, _ in cls.plan if column), *cls.extra_columns]
+        cls.columns = tuple(dict.fromkeys(columns))
+
+    def __init__(self, instance=None, many=False, **kwargs):
+        self.instance = instance
+        self.many = many
+
+    def get_rows(self, objects):
+        if isinstance(objects, QuerySet):
+            return list(objects.values(*self.columns))
+        rows = []
+        for obj in objects:
+            if not isinstance(obj, dict):
+                obj = {column: getattr(obj, column) for column in self.columns}
+            rows.append(obj)
+        return rows
+
+    def load_related(self, rows):
+        """Return `{field name: {pk: value}}` for the fields in `related`."""
+        return {}
+
+    def serialize(self, rows):
+        related = self.load_related(rows)
+        plan = self.plan
+        results = []
+        for row in rows:
+            pk = row['pk']
+            data = {}
+            for key, column, convert in plan:
+                if column is None:
+                    data[key] = related[key][pk]
+                else:
+                    value = row[column]
+                    data[key] = None if value is None else convert(value)
+            results.append(data)
+        return results
+
+    @property
+    def data(self):
+        if self.many:
+            return ReturnList(self.serialize(self.get_rows(self.instance)), serializer=self)
+        return ReturnDict(self.serialize(self.get_rows([self.instance]))[0], serializer=self)
+
+
+class FastUserSerializer(FastSerializer):
+    serializer_class = UserSerializer
+    related = ('followers', 'following')
+
+    def load_related(self, rows):
+        ids = [row['pk'] for row in rows]
+        return {
+            'followers': _related_lists(Follow.objects, 'from_user_id', 'to_user_id', ids),
+            'following': _related_lists(Follow.objects, 'to_user_id', 'from_user_id', ids),
+        }
+
+
+class FastPostSerializer(FastSerializer):
+    serializer_class = PostSerializer
+    related = ('author', 'likes', 'likes_count')
+    extra_columns = ('author_id',)
+
+    def load_related(self, rows):
+        ids = [row['pk'] for row in rows]
+        likes = _related_lists(Like.objects, 'post_id', 'user_id', ids)
+        self.tags = _related_lists(PostTag.objects, 'post_id', 'tag__name', ids)
+        authors = self.load_authors(rows)
+
+        return {
+            'author': {row['pk']: authors.get(str(row['author_id'])) for row in rows},
+            'likes': likes,
+            'likes_count': {pk: len(user_ids) for pk, user_ids in likes.items()},
+        }
+
+    def load_authors(self, rows):
+        """Return `{author ID: author}` for the authors of `rows`."""
+        author_ids = {row['author_id'] for row in rows if row['author_id'] is not None}
+        authors = FastUserSerializer(User.objects.filter(id__in=author_ids), many=True).data
+        return {author['id']: author for author in authors}
+
+    def serialize(self, rows):
+        results = super().serialize(rows)
+        # `PostSerializer.to_representation` appends the tags last.
+        for row, data in zip(rows, results):
+            data['tags'] = self.tags[row['pk']]
+        return results
+
+
+class FastSerializerMixin:
+    """
+    Serve safe requests of a generic view with `fast_serializer_class`. Paginated querysets of the
+    serializer's model are read as `values()` rows; annotations (e.g. a cursor's ordering key) are kept.
+    """
+
+    fast_serializer_class = None
+
+    def use_fast_serializer(self):
+        return self.fast_serializer_class is not None and self.request.method in permissions.SAFE_METHODS
+
+    def paginate_queryset(self, queryset):
+        fast_serializer_class = self.fast_serializer_class
+        if (self.use_fast_serializer() and isinstance(queryset, QuerySet)
+                and queryset.model is fast_serializer_class.serializer_class.Meta.model):
+            queryset = queryset.values(*fast_serializer_class.columns, *queryset.query.annotations)
+        return super().paginate_queryset(queryset)
+
+    def get_serializer(self, *args, **kwargs):
+        if 'data' not in kwargs and self.use_fast_serializer():
+            return self.fast_serializer_class(*args, **kwargs)
+        return super().get_serializer(*args, **kwargs)
@@ -0,0 +1,237 @@
+"""
+Follow graph service.
+
+Keeps each user's adjacency (who they follow, who follows them and which tags they follow)
+as cached ID sets so feeds and follow checks do not have to re-derive them per request.
+The caches (and the users' cached payloads in `api.objects`) are invalidated from `m2m_changed`,
+and the bulk helpers below invalidate explicitly because `bulk_create`/`QuerySet.delete` do not
+send that signal. The denormalized `User.follower_count` is recounted by a background job after
+each change.
+
+Edges of `User.followers` are stored as `from_user` (the followed user) -> `to_user` (the follower).
+
+Invalidation reaches only the cache it runs against. With the default per-process cache (`CACHES`
+in settings), other workers keep serving the adjacency they cached, for up to
+`FOLLOW_GRAPH_CACHE_TIMEOUT` after a follow changes; deployments with several processes configure a
+shared cache so every worker sees follows at once.
+"""
+
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from api import jobs, metrics, notifications, objects, sync
+from api.constants import FOLLOW_GRAPH_CACHE_TIMEOUT, SUGGESTED_FOLLOWS_LIMIT
+from api.models import SyncEvent, Tag, User
+
+Follow = User.followers.through
+TagFollow = User.followed_tags.through
+
+
+def _key(kind, user_id):
+    return f'graph:{kind}:{user_id}'
+
+
+def _cached_ids(kind, user_id, loader):
+    key = _key(kind, user_id)
+    ids = cache.get(key)
+    metrics.count_cache('graph', hits=ids is not None, misses=ids is None)
+    if ids is None:
+        ids = frozenset(loader())
+        cache.set(key, ids, FOLLOW_GRAPH_CACHE_TIMEOUT)
+    return ids
+
+
+def _cached_id_sets(kind, user_ids, load_pairs):
+    """
+    `{user ID: ID set}` of `kind` for `user_ids`: one `get_many`, then `load_pairs(missing)` (one query
+    of `(user ID, ID)` pairs) for the cache misses.
+    """
+    keys = {user_id: _key(kind, user_id) for user_id in user_ids}
+    cached = cache.get_many(keys.values())
+    missing = [user_id for user_id, key in keys.items() if key not in cached]
+    metrics.count_cache('graph', hits=len(keys) - len(missing), misses=len(missing))
+    if missing:
+        # Keyed by cache key, so IDs given as strings match the UUIDs the query returns.
+        loaded = {keys[user_id]: set() for user_id in missing}
+        for user_id, related_id in load_pairs(missing):
+            loaded[_key(kind, user_id)].add(related_id)
+        loaded = {key: frozenset(ids) for key, ids in loaded.items()}
+        cache.set_many(loaded, FOLLOW_GRAPH_CACHE_TIMEOUT)
+        cached.update(loaded)
+    return {user_id: cached[key] for user_id, key in keys.items()}
+
+
+def following_ids(user_id):
+    """IDs of the users `user_id` follows."""
+    return _cached_ids('following', user_id, lambda: Follow.objects.filter(
+        to_user_id=user_id).values_list('from_user_id', flat=True))
+
+
+def following_ids_many(user_ids):
+    """`{user ID: following_ids(user ID)}` for `user_ids`, in one cache round trip and at most one query."""
+    return _cached_id_sets('following', user_ids, lambda missing: Follow.objects.filter(
+        to_user_id__in=missing).values_list('to_user_id', 'from_user_id'))
+
+
+def follower_ids(user_id):
+    """IDs of the users following `user_id`."""
+    return _cached_ids('followers', user_id, lambda: Follow.objects.filter(
+        from_user_id=user_id).values_list('to_user_id', flat=True))
+
+
+def followed_tag_ids(user_id):
+    """IDs of the tags `user_id` follows."""
+    return _cached_ids('tags', user_id, lambda: TagFollow.objects.filter(
+        user_id=user_id).values_list('tag_id', flat=True))
+
+
+def invalidate(user_ids=(), tag_user_ids=()):
+    """
+    Drop cached adjacency for `user_ids` (users) and `tag_user_ids` (followed tags), and the cached
+    payloads of `user_ids`, whose `followers`/`following` changed.
+    """
+    objects.invalidate_users(user_ids)
+    keys = []
+    for user_id in user_ids:
+        keys += [_key('following', user_id), _key('followers', user_id)]
+    keys += [_key('tags', user_id) for user_id in tag_user_ids]
+    if keys:
+        cache.delete_many(keys)
+
+
+def refresh_follower_counts(user_ids):
+    """Recount `User.follower_count` for `user_ids` in one UPDATE."""
+    if not user_ids:
+        return
+    User.objects.filter(id__in=user_ids).update(follower_count=Coalesce(
+        Subquery(
+            Follow.objects.filter(from_user_id=OuterRef('id'))
+            .values('from_user_id').annotate(total=Count('id')).values('total')[:1]
+        ),
+        0,
+    ))
+
+
+def schedule_follower_counts(user_ids):
+    if user_ids:
+        jobs.enqueue('refresh_follower_counts', {'user_ids': [str(user_id) for user_id in user_ids]})
+
+
+def follow_users(user, target_ids):
+    """Make `user` follow every user in `target_ids` with a single insert. Returns the followed IDs."""
+    target_ids = set(User.objects.filter(id__in=target_ids).exclude(id=user.id).values_list('id', flat=True))
+    # Already followed targets are not notified or synced again.
+    new_ids = target_ids - set(
+        Follow.objects.filter(to_user_id=user.id, from_user_id__in=target_ids).values_list('from_user_id', flat=True)
+    )
+    Follow.objects.bulk_create(
+        [Follow(from_user_id=target_id, to_user_id=user.id) for target_id in new_ids],
+        ignore_conflicts=True,
+    )
+    invalidate({user.id, *target_ids})
+    schedule_follower_counts(target_ids)
+    sync.record_follows(user.id, new_ids, SyncEvent.UPSERT)
+    notifications.notify_follows(user.id, new_ids)
+    return target_ids
+
+
+def unfollow_users(user, target_ids):
+    """Make `user` unfollow every user in `target_ids` with a single delete."""
+    target_ids = set(target_ids)
+    Follow.objects.filter(to_user_id=user.id, from_user_id__in=target_ids).delete()
+    invalidate({user.id, *target_ids})
+    schedule_follower_counts(target_ids)
+    sync.record_follows(user.id, target_ids, SyncEvent.DELETE)
+    return target_ids
+
+
+def follow_tags(user, tag_ids):
+    """Make `user` follow every tag in `tag_ids` with a single insert. Returns the followed IDs."""
+    tag_ids = set(Tag.objects.filter(id__in=tag_ids).values_list('id', flat=True))
+    TagFollow.objects.bulk_create(
+        [TagFollow(user_id=user.id, tag_id=tag_id) for tag_id in tag_ids],
+        ignore_conflicts=True,
+    )
+    invalidate(tag_user_ids=[user.id])
+    return tag_ids
+
+
+def unfollow_tags(user, tag_ids):
+    """Make `user` unfollow every tag in `tag_ids` with a single delete."""
+    tag_ids = set(tag_ids)
+    TagFollow.objects.filter(user_id=user.id, tag_id__in=tag_ids).delete()
+    invalidate(tag_user_ids=[user.id])
+    return tag_ids
+
+
+def mutual_follow_ids(user_id):
+    """Users that `user_id` follows and who follow them back."""
+    return following_ids(user_id) & follower_ids(user_id)
+
+
+def suggested_follow_ids(user_id, limit=SUGGESTED_FOLLOWS_LIMIT):
+    """
+    Rank friends-of-friends by how many of the user's followees follow them.
+    Falls back to the user's followers they have not followed back.
+    """
+    following = following_ids(user_id)
+    excluded = following | {user_id}
+
+    scores = Counter()
+    for followees_following in following_ids_many(following).values():
+        scores.update(followees_following - excluded)
+
+    suggestions = [candidate for candidate, _ in scores.most_common(limit)]
+    if len(suggestions) < limit:
+        suggestions += [
+            follower for follower in follower_ids(user_id) - excluded
+            if follower not in scores
+        ][:limit - len(suggestions)]
+    return suggestions
+
+
+def _record_follow_events(instance_id, pk_set, reverse, action):
+    if reverse:
+        # `user.following.add(*users)`: `instance` is the follower.
+        sync.record_follows(instance_id, pk_set, action)
+    else:
+        # `user.followers.add(*users)`: `instance` is the followed user.
+        for follower_id in pk_set:
+            sync.record_follows(follower_id, [instance_id], action)
+
+
+@receiver(m2m_changed, sender=Follow)
+def invalidate_follows(sender, instance, action, pk_set=None, reverse=False, **kwargs):
+    if action == 'pre_clear':
+        # Capture the other side of the edges before they disappear.
+        related = follower_ids(instance.pk) if not reverse else following_ids(instance.pk)
+        instance._cleared_follow_ids = related
+        invalidate({instance.pk, *related})
+        _record_follow_events(instance.pk, related, reverse, SyncEvent.DELETE)
+    elif action == 'post_clear':
+        schedule_follower_counts([instance.pk] if not reverse else instance.__dict__.pop('_cleared_follow_ids', ()))
+    elif action in ('post_add', 'post_remove'):
+        invalidate({instance.pk, *(pk_set or ())})
+        _record_follow_events(
+            instance.pk, pk_set or (), reverse, SyncEvent.UPSERT if action == 'post_add' else SyncEvent.DELETE,
+        )
+        # Forward changes (`user.followers.add(...)`) only change the count of `instance`.
+        schedule_follower_counts([instance.pk] if not reverse else pk_set)
+
+
+@receiver(m2m_changed, sender=TagFollow)
+def invalidate_tag_follows(sender, instance, action, pk_set=None, reverse=False, **kwargs):
+    if reverse:
+        # `tag.followed_by.add(...)`: `instance` is the tag and `pk_set` holds user IDs.
+        if action == 'pre_clear':
+            invalidate(tag_user_ids=TagFollow.objects.filter(
+                tag_id=instance.pk).values_list('user_id', flat=True))
+        elif action in ('post_add', 'post_remove'):
+            invalidate(tag_user_ids=pk_set or ())
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate(tag_user_ids=[instance.pk])
@@ -0,0 +1,98 @@
+"""
+Explore tabs and the aggregated home screen.
+
+The home screen used to be four requests (three explore tabs and `posts/trending/`), each paying
+for authentication, the user lookup and serializer setup. `home_sections` answers it in one:
+
+* Each section's post IDs are fetched concurrently on a small thread pool, one persistent DB connection
+  per thread, reused across requests like a request thread's (`CONN_MAX_AGE`). Without persistent
+  connections (`CONN_MAX_AGE=0`) every section would pay for connecting, so the sections are fetched
+  one after another instead, as they are on SQLite and for callers inside a transaction (whose
+  uncommitted rows other connections cannot see, e.g. tests).
+* Posts that appear in several sections are loaded and serialized once (`FastPostSerializer`);
+  sections refer to them by ID.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import close_old_connections, connection
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from api import graph
+from api.constants import HOME_SECTION_WORKERS
+from api.fast_serializers import FastPostSerializer
+from api.models import Post
+
+HOME_SECTIONS = ('trending', 'recent', 'popular', 'for-me')
+
+_executor = ThreadPoolExecutor(max_workers=HOME_SECTION_WORKERS, thread_name_prefix='home')
+
+
+def explore_queryset(tab, user):
+    """Posts of an explore `tab`. `for-me` needs an authenticated `user`; unknown tabs list everything."""
+    if tab == 'trending':
+        # Most liked in the last 24 hours, counted off the `(post_id, liked_at)` index.
+        return Post.objects.liked_between(
+            timezone.now() - timedelta(days=1), timezone.now()
+        ).order_by('-likes_count', '-created_at')
+
+    if tab == 'recent':
+        return Post.objects.all().order_by('-created_at')
+
+    if tab == 'popular':
+        return Post.objects.annotate(
+            likes_count=Count('likes')
+        ).order_by('-likes_count', '-created_at')
+
+    if tab == 'for-me':
+        return Post.objects.filter(
+            Q(likes=user) |
+            Q(author__in=graph.following_ids(user.id)) |
+            Q(tags__in=graph.followed_tag_ids(user.id))
+        ).distinct().annotate(
+            likes_count=Count('likes')
+        ).order_by('-likes_count', '-created_at')
+
+    return Post.objects.all().annotate(
+        likes_count=Count('likes')
+    ).order_by('-created_at')
+
+
+def _section_ids(section, user, limit):
+    return list(explore_queryset(section, user).values_list('id', flat=True)[:limit])
+
+
+def _section_ids_in_thread(section, user, limit):
+    # What `request_started` and `request_finished` do for a request thread: drop broken connections
+    # and those older than `CONN_MAX_AGE`, keep the rest for the next section.
+    close_old_connections()
+    try:
+        return _section_ids(section, user, limit)
+    finally:
+        close_old_connections()
+
+
+def home_sections(sections, user, limit):
+    """
+    Return `{'sections': {name: [post ID, ...]}, 'posts': {post ID: post}}` for `sections`, with
+    every post serialized once.
+    """
+    sequential = (
+        connection.vendor == 'sqlite' or connection.in_atomic_block or len(sections) == 1
+        or not connection.settings_dict['CONN_MAX_AGE']
+    )
+    if sequential:
+        ids = {section: _section_ids(section, user, limit) for section in sections}
+    else:
+        futures = {section: _executor.submit(_section_ids_in_thread, section, user, limit) for section in sections}
+        ids = {section: future.result() for section, future in futures.items()}
+
+    unique_ids = {post_id for section_ids in ids.values() for post_id in section_ids}
+    posts = FastPostSerializer(Post.objects.filter(id__in=unique_ids), many=True).data
+
+    return {
+        'sections': {section: [str(post_id) for post_id in section_ids] for section, section_ids in ids.items()},
+        'posts': {post['id']: post for post in posts},
+    }
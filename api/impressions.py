@@ -0,0 +1,161 @@
+"""
+Buffered post view and impression counts.
+
+An `UPDATE` per `retrieve` (a view) or per post shown in explore or home (an impression) would put a
+write behind every read. Instead each process:
+
+* counts in memory, once per viewer (the user, or the client IP when anonymous) per post per
+  `VIEW_DEDUP_WINDOW`;
+* flushes the summed deltas every `VIEW_FLUSH_INTERVAL` (sooner once `VIEW_FLUSH_MAX_POSTS` posts are
+  pending) from a background thread, as one `UPDATE ... SET view_count = view_count + CASE id WHEN ...`
+  per `VIEW_FLUSH_BATCH` posts, in ID order so concurrent flushes lock rows in the same order.
+
+Deduplication is per process, so with W workers a viewer counts at most W times per window, and its
+memory is capped at `VIEW_DEDUP_MAX_KEYS` (a full window starts over). A crashed process loses at
+most one interval of counts; a clean exit flushes, and a failed flush puts its deltas back.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from django.db import DatabaseError, close_old_connections
+from django.db.models import Case, F, Value, When
+
+from api import metrics
+from api.constants import (
+    VIEW_DEDUP_MAX_KEYS, VIEW_DEDUP_WINDOW, VIEW_FLUSH_BATCH, VIEW_FLUSH_INTERVAL, VIEW_FLUSH_MAX_POSTS,
+)
+from api.models import Post
+
+logger = logging.getLogger(__name__)
+
+VIEW = 'view'
+IMPRESSION = 'impression'
+
+_lock = threading.Lock()
+_pending = {VIEW: Counter(), IMPRESSION: Counter()}
+_seen = set()
+_window = None
+_wake = threading.Event()
+_flusher_pid = None
+
+
+def viewer(request):
+    """Who is viewing, for deduplication."""
+    if request.user.is_authenticated:
+        return request.user.id
+    return request.META.get('REMOTE_ADDR')
+
+
+def record(kind, post_ids, viewer):
+    """Count a `kind` (`VIEW` or `IMPRESSION`) of each of `post_ids` by `viewer`, unless already counted."""
+    global _window
+    window = int(time.time() // VIEW_DEDUP_WINDOW)
+    counter = _pending[kind]
+    with _lock:
+        if window != _window or len(_seen) >= VIEW_DEDUP_MAX_KEYS:
+            _seen.clear()
+            _window = window
+        for post_id in post_ids:
+            post_id = str(post_id)
+            key = hash((kind, post_id, viewer))
+            if key not in _seen:
+                _seen.add(key)
+                counter[post_id] += 1
+        pending = len(_pending[VIEW]) + len(_pending[IMPRESSION])
+
+    _start_flusher()
+    if pending >= VIEW_FLUSH_MAX_POSTS:
+        _wake.set()
+
+
+def record_views(post_ids, viewer):
+    record(VIEW, post_ids, viewer)
+
+
+def record_impressions(post_ids, viewer):
+    record(IMPRESSION, post_ids, viewer)
+
+
+def _take():
+    with _lock:
+        views, impressions = _pending[VIEW], _pending[IMPRESSION]
+        _pending[VIEW], _pending[IMPRESSION] = Counter(), Counter()
+    return views, impressions
+
+
+def _put_back(views, impressions):
+    with _lock:
+        _pending[VIEW].update(views)
+        _pending[IMPRESSION].update(impressions)
+
+
+def _deltas(counter, post_ids):
+    """`counter[post ID]` for each of `post_ids`, as an SQL expression."""
+    values = {counter[post_id] for post_id in post_ids}
+    if len(values) == 1:
+        return Value(values.pop())
+    return Case(
+        *(When(id=post_id, then=Value(counter[post_id])) for post_id in post_ids if counter[post_id]),
+        default=Value(0),
+    )
+
+
+def flush():
+    """Write the pending deltas. Returns `(posts, statements)`."""
+    started = time.perf_counter()
+    views, impressions = _take()
+    post_ids = sorted(views.keys() | impressions.keys())
+
+    statements = 0
+    for start in range(0, len(post_ids), VIEW_FLUSH_BATCH):
+        batch = post_ids[start:start + VIEW_FLUSH_BATCH]
+        try:
+            # Soft-deleted posts still count until they are purged; it is cheaper than excluding them.
+            Post.all_objects.filter(id__in=batch).update(
+                view_count=F('view_count') + _deltas(views, batch),
+                impression_count=F('impression_count') + _deltas(impressions, batch),
+            )
+        except DatabaseError:
+            logger.exception('Flushing view counts failed, retrying with the next flush.')
+            rest = post_ids[start:]
+            _put_back({post_id: views[post_id] for post_id in rest}, {post_id: impressions[post_id] for post_id in rest})
+            return start, statements
+        statements += 1
+
+    if post_ids:
+        elapsed = time.perf_counter() - started
+        metrics.VIEW_FLUSH_DURATION.observe(elapsed)
+        metrics.VIEW_FLUSH_POSTS.inc(len(post_ids))
+        logger.debug('Flushed %d posts in %d statements in %.3fs', len(post_ids), statements, elapsed)
+    return len(post_ids), statements
+
+
+def _run_flusher():
+    while True:
+        _wake.wait(VIEW_FLUSH_INTERVAL)
+        _wake.clear()
+        close_old_connections()
+        try:
+            flush()
+        except Exception:
+            logger.exception('Flushing view counts failed.')
+
+
+def _start_flusher():
+    """Start this process's flush thread, once (again after a fork: threads do not survive it)."""
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_run_flusher, name='view-counts', daemon=True).start()
+
+
+atexit.register(flush)
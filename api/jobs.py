@@ -0,0 +1,255 @@
+"""
+A small DB-backed job queue for work the client does not need to wait for.
+
+```py
+from api import jobs
+
+@jobs.task('send_otp_email')
+def send_otp_email(user_id, resend=False):
+    ...
+
+jobs.enqueue('send_otp_email', {'user_id': str(user.id)})
+```
+
+Views only enqueue; `python manage.py run_jobs --concurrency 4` runs the work. Because the queue
+is a table, a job enqueued inside a transaction only becomes visible once that transaction commits.
+
+* `key` makes an enqueue idempotent: a second enqueue with the same key returns the existing job.
+* A failing job is retried with exponential backoff until `max_attempts`, then parked as `dead`
+  (the dead-letter state) with its last traceback, and can be requeued from the admin.
+* Jobs stuck in `running` for longer than `JOB_LOCK_TIMEOUT` (a crashed worker) are requeued, or
+  parked as `dead` if that was their last attempt.
+* Done jobs are deleted `JOB_RETENTION` after they finished, by idle workers at most every
+  `JOB_PRUNE_INTERVAL` (`prune_finished`). Their idempotency keys are freed with them. Dead jobs stay.
+* With `JOBS_ALWAYS_EAGER = True` jobs run inline at enqueue time (development and tests).
+"""
+
+import importlib
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, close_old_connections, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from api import metrics
+from api.constants import (
+    JOB_BATCH_SIZE, JOB_LOCK_TIMEOUT, JOB_MAX_BACKOFF, JOB_POLL_INTERVAL, JOB_PRUNE_BATCH_SIZE, JOB_PRUNE_INTERVAL,
+    JOB_RETENTION,
+)
+from api.models import Job
+
+logger = logging.getLogger(__name__)
+
+_tasks = {}
+
+
+def task(name, max_attempts=5):
+    """Register a function as the handler of jobs called `name`."""
+    def decorator(func):
+        func.job_name = name
+        func.max_attempts = max_attempts
+        _tasks[name] = func
+        return func
+    return decorator
+
+
+def get_task(name):
+    if name not in _tasks:
+        importlib.import_module('api.tasks')
+    return _tasks[name]
+
+
+def enqueue(name, payload=None, *, key=None, delay=None, max_attempts=None):
+    """Queue `name(**payload)` for a worker. `payload` must be JSON serializable."""
+    payload = payload or {}
+    func = get_task(name)
+
+    if getattr(settings, 'JOBS_ALWAYS_EAGER', False):
+        func(**payload)
+        return None
+
+    fields = dict(
+        name=name,
+        payload=payload,
+        max_attempts=max_attempts or func.max_attempts,
+        run_at=timezone.now() + (delay or timedelta()),
+    )
+    if key is None:
+        return Job.objects.create(**fields)
+
+    job = Job.objects.filter(idempotency_key=key).first()
+    if job is not None:
+        return job
+    try:
+        with transaction.atomic():
+            return Job.objects.create(idempotency_key=key, **fields)
+    except IntegrityError:
+        return Job.objects.get(idempotency_key=key)
+
+
+def claim(worker_id, limit=JOB_BATCH_SIZE):
+    """Lock up to `limit` due jobs for `worker_id`."""
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.QUEUED, run_at__lte=now)
+            .order_by('run_at')
+            .values_list('id', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        # The status filter keeps claims exclusive on backends without `SKIP LOCKED`.
+        Job.objects.filter(id__in=ids, status=Job.QUEUED).update(
+            status=Job.RUNNING, locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1,
+        )
+    return list(Job.objects.filter(id__in=ids, locked_by=worker_id, status=Job.RUNNING, locked_at=now))
+
+
+def execute(job):
+    """Run a claimed job and record its outcome."""
+    # A batch is claimed at once: restart the lock timeout now, or jobs waiting behind a slow one would
+    # be requeued by `requeue_stale` and run twice. A job already requeued is no longer ours to run.
+    mine = Job.objects.filter(id=job.id, status=Job.RUNNING, locked_by=job.locked_by)
+    if not mine.update(locked_at=timezone.now()):
+        return False
+
+    started = time.perf_counter()
+    try:
+        get_task(job.name)(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        metrics.JOB_DURATION.labels(job.name).observe(time.perf_counter() - started)
+        dead = job.attempts >= job.max_attempts
+        metrics.JOBS.labels(job.name, 'dead' if dead else 'retried').inc()
+        if dead:
+            logger.error('Job %s is dead after %s attempts:\n%s', job, job.attempts, error)
+            mine.update(
+                status=Job.DEAD, last_error=error, locked_by=None, locked_at=None, finished_at=timezone.now(),
+            )
+        else:
+            backoff = min(2 ** job.attempts, JOB_MAX_BACKOFF)
+            logger.warning('Job %s failed, retrying in %ss', job, backoff)
+            mine.update(
+                status=Job.QUEUED, last_error=error, locked_by=None, locked_at=None,
+                run_at=timezone.now() + timedelta(seconds=backoff),
+            )
+        return False
+
+    metrics.JOB_DURATION.labels(job.name).observe(time.perf_counter() - started)
+    metrics.JOBS.labels(job.name, 'done').inc()
+    mine.update(status=Job.DONE, locked_by=None, locked_at=None, finished_at=timezone.now())
+    return True
+
+
+def requeue_stale():
+    """Return jobs held by workers that died mid-run to the queue, or park them if out of attempts."""
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, locked_at__lt=now - timedelta(seconds=JOB_LOCK_TIMEOUT))
+    # `claim` counted the lost run as an attempt.
+    dead = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.DEAD, last_error='The worker running the job was lost.', locked_by=None, locked_at=None,
+        finished_at=now,
+    )
+    if dead:
+        logger.error('%s stale jobs are dead after their last attempt', dead)
+    return stale.update(status=Job.QUEUED, locked_by=None, locked_at=None)
+
+
+def prune_finished(older_than=JOB_RETENTION, batch_size=JOB_PRUNE_BATCH_SIZE):
+    """Delete done jobs that finished more than `older_than` seconds ago, a batch per statement."""
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    pruned = 0
+    while True:
+        ids = list(
+            Job.objects.filter(status=Job.DONE, finished_at__lt=cutoff).values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return pruned
+        pruned += Job.objects.filter(id__in=ids).delete()[0]
+
+
+def requeue_dead(queryset):
+    """Give dead jobs a fresh set of attempts."""
+    return queryset.filter(status=Job.DEAD).update(
+        status=Job.QUEUED, attempts=0, run_at=timezone.now(), finished_at=None,
+    )
+
+
+def work(burst=False, batch_size=JOB_BATCH_SIZE, poll_interval=JOB_POLL_INTERVAL):
+    """Worker loop. With `burst` it returns as soon as the queue is empty."""
+    worker_id = f'{socket.gethostname()}:{os.getpid()}'
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+
+    processed = 0
+    next_prune = time.monotonic()
+    while not stopping:
+        close_old_connections()
+        try:
+            jobs = claim(worker_id, batch_size)
+        except OperationalError:
+            # Lost connection or lock contention; whatever was claimed is recovered by `requeue_stale`.
+            logger.exception('Worker %s could not claim jobs', worker_id)
+            time.sleep(poll_interval)
+            continue
+
+        if not jobs:
+            if burst:
+                break
+            requeue_stale()
+            if time.monotonic() >= next_prune:
+                prune_finished()
+                next_prune = time.monotonic() + JOB_PRUNE_INTERVAL
+            time.sleep(poll_interval)
+            continue
+
+        for job in jobs:
+            execute(job)
+            processed += 1
+
+    return processed
+
+
+def _work_in_child(burst, batch_size):
+    import django
+    django.setup()
+    work(burst=burst, batch_size=batch_size)
+
+
+def run_workers(concurrency=1, burst=False, batch_size=JOB_BATCH_SIZE):
+    """Run `concurrency` worker processes until they exit (or SIGTERM/SIGINT)."""
+    if concurrency == 1:
+        return work(burst=burst, batch_size=batch_size)
+
+    # Children must not inherit the parent's open database connections.
+    connections.close_all()
+    processes = [
+        multiprocessing.Process(target=_work_in_child, args=(burst, batch_size), daemon=True)
+        for _ in range(concurrency)
+    ]
+    for process in processes:
+        process.start()
+    # Forward SIGTERM so every child finishes its current batch and exits.
+    signal.signal(signal.SIGTERM, lambda *args: [process.terminate() for process in processes])
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+@task('noop', max_attempts=1)
+def noop(**payload):
+    """Does nothing; used by `bench_jobs`."""
@@ -0,0 +1,97 @@
+"""
+Filtering list endpoints on keys of JSON fields: `?metadata__diet=vegan`, or several values with
+`?metadata__diet__in=vegan,vegetarian`.
+
+Only the keys declared in `JSON_FILTER_KEYS` can be filtered on, and each has an index over the
+key's value as text (`key_indexes`, added to the models' `Meta.indexes`), so a filter is an index
+lookup rather than a scan that decodes every row's JSON. Other keys are a 400.
+
+The value is compared as text: declared keys should hold strings.
+
+Both databases index the same expression, `JSONKey`: `field ->> 'key'` on PostgreSQL,
+`JSON_EXTRACT(field, '$."key"')` on SQLite. The key is written into the SQL rather than sent as a
+parameter, because SQLite uses an index on an expression only when the query repeats the
+expression exactly, and a bound parameter does not count as the same expression. Keys come from
+the whitelist and are checked to be identifiers.
+"""
+
+import re
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from django.db.models.fields.json import KeyTextTransform, compile_json_path
+from django.db.models.lookups import Exact, In
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from api.constants import JSON_FILTER_KEYS, JSON_FILTER_MAX_VALUES
+
+IDENTIFIER = re.compile(r'^[a-z_][a-z0-9_]*$')
+
+
+class JSONKey(KeyTextTransform):
+    """The text value of `key` in the JSON field `field`, matching the indexes of `key_indexes`."""
+
+    def __init__(self, field, key):
+        if not IDENTIFIER.match(key):
+            raise ValueError(f'{key!r} is not a filterable JSON key.')
+        super().__init__(key, field)
+
+    def as_postgresql(self, compiler, connection):
+        lhs, params = compiler.compile(self.lhs)
+        return f"({lhs} ->> '{self.key_name}')", params
+
+    def as_sqlite(self, compiler, connection):
+        lhs, params = compiler.compile(self.lhs)
+        return f"JSON_EXTRACT({lhs}, '{compile_json_path([self.key_name])}')", params
+
+
+def filterable_keys(model):
+    """`{field: keys}` of `model` from `JSON_FILTER_KEYS`."""
+    return JSON_FILTER_KEYS.get(model._meta.model_name, {})
+
+
+def key_indexes(model_name):
+    """An index for each declared key of the model named `model_name`, for its `Meta.indexes`."""
+    indexes = []
+    for field, keys in JSON_FILTER_KEYS.get(model_name, {}).items():
+        for key in keys:
+            name = f'api_{model_name}_{field}_{key}_idx'
+            if len(name) > models.Index.max_name_length:
+                raise ImproperlyConfigured(f'Index name {name} of JSON_FILTER_KEYS is too long.')
+            indexes.append(models.Index(JSONKey(field, key), name=name))
+    return indexes
+
+
+def filter_queryset(queryset, params):
+    """
+    `queryset` filtered by the JSON key parameters among `params` (a `QueryDict`). Raises
+    `ValidationError` for keys that are not declared.
+    """
+    declared = filterable_keys(queryset.model)
+    json_fields = {field.name for field in queryset.model._meta.fields if isinstance(field, models.JSONField)}
+
+    for param, value in params.items():
+        field, _, lookup = param.partition('__')
+        if field not in json_fields or not lookup:
+            continue
+        key, _, operator = lookup.partition('__')
+        if key not in declared.get(field, ()) or operator not in ('', 'in'):
+            allowed = ', '.join(f'{field}__{key}' for key in declared.get(field, ())) or 'none'
+            raise ValidationError({param: f'Not a filter. Filters on {field}: {allowed}, each with an optional `__in`.'})
+
+        if operator == 'in':
+            values = [item for item in value.split(',') if item]
+            if not values or len(values) > JSON_FILTER_MAX_VALUES:
+                raise ValidationError({param: f'Give 1 to {JSON_FILTER_MAX_VALUES} comma-separated values.'})
+            queryset = queryset.filter(In(JSONKey(field, key), values))
+        else:
+            queryset = queryset.filter(Exact(JSONKey(field, key), value))
+    return queryset
+
+
+class JSONKeyFilter(BaseFilterBackend):
+    """DRF filter backend applying `filter_queryset` to the request's query parameters."""
+
+    def filter_queryset(self, request, queryset, view):
+        return filter_queryset(queryset, request.query_params)
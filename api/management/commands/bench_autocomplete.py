@@ -0,0 +1,52 @@
+"""
+Measure autocomplete latency percentiles for random prefixes drawn from existing tag names and usernames.
+
+```sh
+python manage.py bench_autocomplete --queries 2000 --cold
+```
+"""
+
+import random
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from api import autocomplete
+from api.models import Tag, User
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = 'Report p50/p99 latency of tag and username autocomplete.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=1000)
+        parser.add_argument('--cold', action='store_true', help='Clear the cache before every lookup.')
+
+    def handle(self, *args, **options):
+        words = list(Tag.objects.exclude(name=None).values_list('name', flat=True)[:5000])
+        words += list(User.objects.exclude(username=None).values_list('username', flat=True)[:5000])
+        if not words:
+            self.stdout.write(self.style.WARNING('No tags or users to benchmark.'))
+            return
+
+        for name, complete in (('tags', autocomplete.complete_tags), ('users', autocomplete.complete_users)):
+            samples = []
+            for _ in range(options['queries']):
+                word = random.choice(words)
+                prefix = word[:random.randint(1, min(len(word), 6))]
+                if options['cold']:
+                    cache.clear()
+                started = time.perf_counter()
+                complete(prefix)
+                samples.append((time.perf_counter() - started) * 1000)
+
+            self.stdout.write(
+                f'{name:<6} p50={percentile(samples, 50):.2f}ms p99={percentile(samples, 99):.2f}ms '
+                f'max={max(samples):.2f}ms'
+            )
@@ -0,0 +1,190 @@
+"""
+Benchmark rendering comment threads (`api.comments`) on a post with `--comments` comments.
+
+```sh
+python manage.py bench_comments --comments 100000 --threads 2000 --repeat 20
+```
+
+Seeds a post whose comments form `--threads` threads of Zipf-like popularity, with replies up to
+`COMMENT_MAX_DEPTH` deep, then times requests through the full stack in-process: the first and a deep
+page of top-level comments (with reply previews), and the first and a deep page of the biggest
+thread's replies. Reported per request: median server time, queries and response bytes. Then loads
+the whole biggest thread from its path range, and the way a parent foreign key alone would need
+it, one query per comment for its replies. The post and its comments are deleted afterwards unless
+`--keep` is given.
+"""
+
+import random
+import time
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from rest_framework.test import APIClient
+
+from api import comments
+from api.constants import COMMENT_MAX_DEPTH
+from api.models import Comment, Post, User
+
+BENCH_TITLE = 'bench_comments'
+
+
+@contextmanager
+def count_queries():
+    """Counts statements run, including during requests (which reset `connection.queries`)."""
+    executed = []
+
+    def counter(execute, sql, params, many, context):
+        executed.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(counter):
+        yield executed
+
+
+class Command(BaseCommand):
+    help = 'Time top-level and reply pages of a post with many comments, and whole-thread loads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--comments', type=int, default=100_000)
+        parser.add_argument('--threads', type=int, default=2000)
+        parser.add_argument('--authors', type=int, default=200)
+        parser.add_argument('--deep-page', type=int, default=20, help='Which page to time as a deep one.')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['threads'] > options['comments']:
+            raise CommandError('--threads cannot exceed --comments.')
+        started = time.perf_counter()
+        post = self.seed(options['comments'], options['threads'], options['authors'], random.Random(options['seed']))
+        self.stdout.write(f"Seeded {options['comments']} comments in {time.perf_counter() - started:.1f}s.")
+
+        try:
+            biggest = Comment.objects.filter(post=post, parent=None).order_by('-reply_count').first()
+            size = comments.descendants(post.id, biggest.path).count()
+            self.stdout.write(f'Biggest thread: {size} replies, {biggest.reply_count} of them direct.')
+
+            client = APIClient()
+            self.stdout.write(f"{'':<26}{'median ms':>10}{'queries':>9}{'bytes':>9}")
+            for label, path in (
+                ('top-level, first page', f'/api/posts/{post.id}/comments/'),
+                ('replies, first page', f'/api/comments/{biggest.id}/replies/'),
+            ):
+                self.report(label, client, path, options['repeat'])
+                deep = self.follow(client, path, options['deep_page'])
+                if deep is not None:
+                    self.report(f"{label.split(',')[0]}, page {options['deep_page']}", client, deep, options['repeat'])
+
+            self.whole_thread(biggest)
+        finally:
+            if not options['keep']:
+                self.cleanup(post)
+
+    def seed(self, count, threads, author_count, rng):
+        authors = list(User.objects.filter(username__startswith='bench_commenter').order_by('username')[:author_count])
+        if len(authors) < author_count:
+            User.objects.bulk_create([
+                User(email=f'bench_commenter{i}@example.com', username=f'bench_commenter{i}', is_active=True)
+                for i in range(len(authors), author_count)
+            ], ignore_conflicts=True)
+            authors = list(User.objects.filter(username__startswith='bench_commenter').order_by('username')[:author_count])
+        author_ids = [author.id for author in authors]
+        post = Post.objects.create(author=authors[0], title=BENCH_TITLE, content='Comment thread benchmark.')
+
+        # IDs are assigned here, so paths can be built before inserting; the sequence is moved past
+        # them afterwards.
+        first_id = (Comment.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        parents, paths, depths, reply_counts = [], [], [], [0] * count
+        members = [[] for _ in range(threads)]
+        weights = [1 / (rank + 1) for rank in range(threads)]
+        cumulative = [sum(weights[:1])]
+        for weight in weights[1:]:
+            cumulative.append(cumulative[-1] + weight)
+
+        for index in range(count):
+            if index < threads:
+                parent, thread = None, index
+            else:
+                thread = rng.choices(range(threads), cum_weights=cumulative)[0]
+                parent = rng.choice(members[thread])
+                if depths[parent] >= COMMENT_MAX_DEPTH:
+                    parent = parents[parent]
+                reply_counts[parent] += 1
+            members[thread].append(index)
+            parents.append(parent)
+            depths.append(0 if parent is None else depths[parent] + 1)
+            paths.append((paths[parent] if parent is not None else '') + comments.encode_segment(first_id + index))
+
+        with transaction.atomic():
+            Comment.objects.bulk_create([
+                Comment(
+                    id=first_id + index, post=post, author_id=rng.choice(author_ids),
+                    parent_id=None if parents[index] is None else first_id + parents[index],
+                    path=paths[index], depth=depths[index], reply_count=reply_counts[index],
+                    content=f'Comment {index}: ' + 'so good ' * rng.randint(1, 20),
+                )
+                for index in range(count)
+            ], batch_size=5000)
+            Post.objects.filter(id=post.id).update(comment_count=count)
+            with connection.cursor() as cursor:
+                for statement in connection.ops.sequence_reset_sql(no_style(), [Comment]):
+                    cursor.execute(statement)
+        return post
+
+    def get(self, client, path):
+        response = client.get(path)
+        if response.status_code != 200:
+            raise CommandError(f'{path} returned {response.status_code}.')
+        return response
+
+    def follow(self, client, path, pages):
+        """The URL of page `pages`, reached through `next` links."""
+        for _ in range(pages - 1):
+            path = self.get(client, path).json()['next']
+            if path is None:
+                return None
+        return path
+
+    def report(self, label, client, path, repeat):
+        with count_queries() as queries:
+            size = len(self.get(client, path).content)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            self.get(client, path)
+            timings.append(time.perf_counter() - started)
+        median = sorted(timings)[len(timings) // 2]
+        self.stdout.write(f'{label:<26}{median * 1000:>10.1f}{len(queries):>9}{size:>9}')
+
+    def whole_thread(self, root):
+        with count_queries() as queries:
+            started = time.perf_counter()
+            by_path = list(comments.descendants(root.post_id, root.path).order_by('path').values('id', 'depth', 'content'))
+            path_elapsed = time.perf_counter() - started
+        path_queries = len(queries)
+
+        with count_queries() as queries:
+            started = time.perf_counter()
+            by_parent = []
+            pending = [root.id]
+            while pending:
+                children = list(Comment.objects.filter(parent_id=pending.pop()).order_by('-id').values('id', 'depth', 'content'))
+                by_parent.extend(children)
+                pending.extend(child['id'] for child in children)
+            parent_elapsed = time.perf_counter() - started
+
+        if len(by_parent) != len(by_path):
+            raise CommandError('The two thread loads disagree.')
+        self.stdout.write(f'Whole biggest thread ({len(by_path)} comments):')
+        self.stdout.write(f'  path range          {path_elapsed * 1000:>8.1f} ms {path_queries:>7} queries')
+        self.stdout.write(f'  parent per comment  {parent_elapsed * 1000:>8.1f} ms {len(queries):>7} queries')
+
+    def cleanup(self, post):
+        with transaction.atomic():
+            thread = Comment.objects.filter(post=post)
+            thread._raw_delete(thread.db)
+            post.delete()
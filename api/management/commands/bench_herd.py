@@ -0,0 +1,97 @@
+"""
+Thundering herd: many identical requests at once, with and without single-flight (`api.single_flight`).
+
+```sh
+python manage.py bench_herd --concurrency 200                   # retrieve of the most liked post
+python manage.py bench_herd --path '/api/posts/explore/?tab=popular'
+```
+
+`--concurrency` threads are released together, each sending one request through the full stack
+in-process. Reported per mode: DB queries across all threads, time from release to the last response,
+latency percentiles and the coalescing counters.
+"""
+
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Count
+from django.test import Client, override_settings
+
+from api import single_flight
+from api.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Compare DB queries and latency of a burst of identical requests with and without single-flight.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help='Defaults to the detail of the most liked post.')
+        parser.add_argument('--concurrency', type=int, default=100)
+
+    def herd(self, path, concurrency):
+        released = []
+        barrier = threading.Barrier(concurrency, action=lambda: released.append(time.perf_counter()))
+        lock = threading.Lock()
+        queries = []
+        latencies = []
+        finished = []
+        bodies = set()
+
+        def count_query(execute, sql, params, many, context):
+            with lock:
+                queries.append(sql)
+            return execute(sql, params, many, context)
+
+        def client():
+            http = Client()
+            # Loading middleware (WhiteNoise scans the static files) is per client, not per request.
+            http.handler.load_middleware()
+            barrier.wait()
+            try:
+                with connection.execute_wrapper(count_query):
+                    started = time.perf_counter()
+                    response = http.get(path)
+                    elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    finished.append(started + elapsed)
+                    bodies.add((response.status_code, response.content))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return len(queries), max(finished) - released[0], sorted(latencies), bodies
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if path is None:
+            post = Post.objects.annotate(total=Count('likes')).order_by('-total').first()
+            if post is None:
+                raise CommandError('No posts.')
+            path = f'/api/posts/{post.id}/'
+
+        concurrency = options['concurrency']
+        self.stdout.write(f'{concurrency} concurrent GET {path}')
+        self.stdout.write(f"{'':<16}{'queries':>9}{'wall ms':>10}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+        for label, enabled in (('without', False), ('single-flight', True)):
+            single_flight.reset_stats()
+            with override_settings(SINGLE_FLIGHT_ENABLED=enabled):
+                query_count, wall, latencies, bodies = self.herd(path, concurrency)
+            p50 = statistics.median(latencies)
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            self.stdout.write(
+                f'{label:<16}{query_count:>9}{wall * 1000:>10.0f}{p50 * 1000:>9.0f}{p99 * 1000:>9.0f}'
+                f'{latencies[-1] * 1000:>9.0f}'
+            )
+            if len(bodies) != 1:
+                self.stderr.write(self.style.ERROR(f'{len(bodies)} different responses {label} single-flight.'))
+
+        for route, outcomes in single_flight.stats().items():
+            self.stdout.write(f'{route}: {outcomes}')
@@ -0,0 +1,79 @@
+"""
+Benchmark the home screen: its four sections fetched with a call each against one `posts/home/` call.
+
+```sh
+python manage.py bench_home --username cook3 --repeat 20
+```
+
+Requests go through the full stack in-process, authenticated with a real JWT, so each one pays for
+authentication and the user lookup as it would in production. Reported per home screen load: round
+trips, server time, queries and response bytes. Both sides load the same sections: the app's
+`posts/trending/` call is the home screen's `popular` section, timed here as the explore tab of the
+same name. On PostgreSQL with persistent connections the section queries of `posts/home` run on the
+pool's own connections and are not in its query count.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.models import User
+
+FOUR_CALLS = (
+    ('/api/posts/explore/', {'tab': 'trending'}),
+    ('/api/posts/explore/', {'tab': 'recent'}),
+    ('/api/posts/explore/', {'tab': 'for-me'}),
+    ('/api/posts/explore/', {'tab': 'popular'}),
+)
+HOME_CALL = (
+    ('/api/posts/home/', {'sections': 'trending,recent,for-me,popular'}),
+)
+
+
+class Command(BaseCommand):
+    help = 'Compare round trips and server time of the four-call home screen and `posts/home/`.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='Defaults to the most followed active user.')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def load(self, client, calls):
+        """Make `calls` once; return `(seconds, queries, bytes)`."""
+        size = 0
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for path, params in calls:
+                response = client.get(path, params)
+                if response.status_code != 200:
+                    raise CommandError(f'{path} {params} returned {response.status_code}.')
+                size += len(response.content)
+            elapsed = time.perf_counter() - started
+        return elapsed, len(queries), size
+
+    def measure(self, client, calls, repeat):
+        _, query_count, size = self.load(client, calls)
+        timings = []
+        for _ in range(repeat):
+            timings.append(self.load(client, calls)[0])
+            reset_queries()
+        return sorted(timings)[len(timings) // 2], query_count, size
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True)
+        if options['username']:
+            users = users.filter(username=options['username'])
+        user = users.order_by('-follower_count').first()
+        if user is None:
+            raise CommandError('No such active user.')
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+        self.stdout.write(f"{'':<12}{'round trips':>12}{'median ms':>12}{'queries':>10}{'bytes':>10}")
+        for label, calls in (('four calls', FOUR_CALLS), ('posts/home', HOME_CALL)):
+            elapsed, query_count, size = self.measure(client, calls, options['repeat'])
+            self.stdout.write(f'{label:<12}{len(calls):>12}{elapsed * 1000:>12.1f}{query_count:>10}{size:>10}')
@@ -0,0 +1,39 @@
+"""
+Benchmark job throughput at several worker counts.
+Enqueues `--jobs` no-op jobs per run and times how long the workers take to drain them.
+
+```sh
+python manage.py bench_jobs --jobs 5000 --workers 1 4 16
+```
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import jobs
+from api.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Measure job worker throughput for 1, 4 and 16 worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=2000)
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16])
+        parser.add_argument('--batch-size', type=int, default=10)
+
+    def handle(self, *args, **options):
+        for concurrency in options['workers']:
+            Job.objects.bulk_create(
+                [Job(name='noop', max_attempts=1, payload={'n': n}) for n in range(options['jobs'])],
+                batch_size=1000,
+            )
+
+            started = time.perf_counter()
+            jobs.run_workers(concurrency=concurrency, burst=True, batch_size=options['batch_size'])
+            elapsed = time.perf_counter() - started
+
+            done = Job.objects.filter(name='noop', status=Job.DONE).count()
+            Job.objects.filter(name='noop').delete()
+            self.stdout.write(f'{concurrency:>3} worker(s): {done} jobs in {elapsed:.2f}s ({done / elapsed:.0f} jobs/s)')
@@ -0,0 +1,109 @@
+"""
+Login storm against a running server: login throughput, and the latency other requests see meanwhile.
+
+```sh
+daphne src.asgi:application &
+python manage.py bench_login --url http://127.0.0.1:8000 --concurrency 16 --duration 10
+```
+
+The probe first runs alone for a baseline, then alongside `--concurrency` clients logging in as a
+benchmark user (created, active, on first run). Compare runs with the default
+`PASSWORD_HASHING_WORKERS=0` (hashing inline) and a pool, e.g. `PASSWORD_HASHING_WORKERS=2`.
+"""
+
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from django.core.management.base import BaseCommand
+
+from api.auth import hashing
+from api.models import User
+
+BENCH_EMAIL = 'bench-login@culinara.local'
+BENCH_PASSWORD = 'bench-login-password'
+
+
+def timed_request(url, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read()
+            ok = response.status < 400
+    except urllib.error.URLError:
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+def summary(latencies):
+    if len(latencies) < 2:
+        return 'n/a'
+    centiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    return (
+        f'p50 {centiles[49] * 1000:7.1f}ms  p99 {centiles[98] * 1000:7.1f}ms  '
+        f'max {max(latencies) * 1000:7.1f}ms  (n={len(latencies)})'
+    )
+
+
+class Command(BaseCommand):
+    help = 'Measure login throughput and the tail latency of another endpoint during a login storm.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--login-path', default='/api/auth/login/')
+        parser.add_argument('--probe-path', default='/api/tags/autocomplete/?q=j')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=10)
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(email=BENCH_EMAIL, defaults={'username': 'bench-login'})
+        user.password = hashing.make_password(BENCH_PASSWORD)
+        user.is_active = True
+        user.save(update_fields=['password', 'is_active'])
+
+        login_url = options['url'] + options['login_path']
+        probe_url = options['url'] + options['probe_path']
+        credentials = {'email': BENCH_EMAIL, 'password': BENCH_PASSWORD}
+
+        baseline = self.run_for(options['duration'] / 2, lambda: timed_request(probe_url))
+        self.stdout.write(f'probe alone        {summary(baseline)}')
+
+        stop = threading.Event()
+        logins = []
+
+        def storm():
+            while not stop.is_set():
+                elapsed, ok = timed_request(login_url, credentials)
+                logins.append((elapsed, ok))
+
+        clients = [threading.Thread(target=storm) for _ in range(options['concurrency'])]
+        for client in clients:
+            client.start()
+        started = time.perf_counter()
+        probe = self.run_for(options['duration'], lambda: timed_request(probe_url))
+        stop.set()
+        for client in clients:
+            client.join()
+        elapsed = time.perf_counter() - started
+
+        succeeded = [latency for latency, ok in logins if ok]
+        self.stdout.write(f'probe during storm {summary(probe)}')
+        self.stdout.write(f'logins             {summary(succeeded)}')
+        self.stdout.write(
+            f'login throughput   {len(succeeded) / elapsed:.1f}/s ({len(logins) - len(succeeded)} failed)'
+        )
+
+    def run_for(self, duration, request):
+        latencies = []
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            elapsed, ok = request()
+            if ok:
+                latencies.append(elapsed)
+            time.sleep(0.05)
+        return latencies
@@ -0,0 +1,98 @@
+"""
+Benchmark image derivative generation (`api.media`): output sizes, and images rendered per second
+inline and in process pools of each size.
+
+```sh
+python manage.py bench_media --images 12 --workers 0,1,2,4
+python manage.py bench_media --source photo.jpg --kind avatar
+```
+
+Renders `--source` (by default a generated 3000x2000 photo-like JPEG) as an upload would be:
+`derivatives.probe` for its placeholder, then every variant size in every format. First one
+image, size by size: the time to render each and the bytes of each format against the original's.
+Then `--images` copies, timed end to end with every variant size rendered at once: inline (`0`)
+and with each pool size in `--workers`, pools started beforehand. No database or storage is used.
+"""
+
+import io
+import time
+from itertools import repeat
+
+from django.core.management.base import BaseCommand
+from PIL import Image, ImageFilter
+
+from api import media
+from api.media import derivatives
+
+
+def synthetic_photo(width=3000, height=2000):
+    """A JPEG with a photo's mix of smooth regions, edges and noise, so encoders work as hard."""
+    image = Image.effect_mandelbrot((width, height), (-2.2, -1.2, 1.0, 1.2), 100).convert('RGB')
+    noise = Image.effect_noise((width, height), 40).convert('RGB')
+    image = Image.blend(image, noise, 0.3).filter(ImageFilter.GaussianBlur(1))
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=90)
+    return output.getvalue()
+
+
+class Command(BaseCommand):
+    help = 'Time resizing and encoding uploads into their WebP and AVIF variants.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', help='Image file to render; a generated photo by default.')
+        parser.add_argument('--kind', choices=(media.THUMBNAIL, media.AVATAR), default=media.THUMBNAIL)
+        parser.add_argument('--images', type=int, default=12)
+        parser.add_argument('--workers', default='0,1,2,4', help='Pool sizes to compare; 0 renders inline.')
+
+    def handle(self, *args, **options):
+        if options['source']:
+            with open(options['source'], 'rb') as source:
+                data = source.read()
+        else:
+            data = synthetic_photo()
+        kind = options['kind']
+        info = derivatives.probe(data, kind)
+        sizes = media.sizes(kind, info['width'], info['height'])
+        self.stdout.write(
+            f"{kind}: {info['format']} {info['width']}x{info['height']}, {len(data) / 1024:.0f} KiB, "
+            f"placeholder {len(info['placeholder'])} characters"
+        )
+
+        self.stdout.write(f'{"size":>6}{"render ms":>11}' + ''.join(f'{name + " KiB":>11}' for name in derivatives.MEDIA_FORMATS))
+        for size in sizes:
+            started = time.perf_counter()
+            variants = derivatives.render(data, kind, size)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{size:>6}{elapsed * 1000:>11.0f}' + ''.join(f'{len(content) / 1024:>11.1f}' for _, content, _, _ in variants))
+
+        variants_per_image = len(sizes) * len(derivatives.MEDIA_FORMATS)
+        self.stdout.write(f'{options["images"]} images, {variants_per_image} variants each:')
+        for workers in (int(workers) for workers in options['workers'].split(',')):
+            executor = media.make_executor(workers) if workers else None
+            if executor is not None:
+                # Start (and set up) every worker before timing.
+                list(executor.map(derivatives.probe, repeat(data, workers), repeat(kind, workers)))
+            started = time.perf_counter()
+            self.render_all(executor, data, kind, sizes, options['images'])
+            elapsed = time.perf_counter() - started
+            if executor is not None:
+                executor.shutdown()
+            label = f'{workers} workers' if workers else 'inline'
+            self.stdout.write(
+                f'  {label:<12}{options["images"] / elapsed:>8.2f} images/s'
+                f'{options["images"] * variants_per_image / elapsed:>9.1f} variants/s'
+            )
+
+    def render_all(self, executor, data, kind, sizes, images):
+        if executor is None:
+            for _ in range(images):
+                derivatives.probe(data, kind)
+                for size in sizes:
+                    derivatives.render(data, kind, size)
+            return
+        futures = []
+        for _ in range(images):
+            futures.append(executor.submit(derivatives.probe, data, kind))
+            futures.extend(executor.submit(derivatives.render, data, kind, size) for size in sizes)
+        for future in futures:
+            future.result()
@@ -0,0 +1,146 @@
+"""
+Benchmark notification grouping (`api.notifications`) under a burst of likes on one post.
+
+```sh
+python manage.py bench_notifications --rate 10000 --duration 30
+python manage.py bench_notifications --rate 10000 --duration 60 --direct
+```
+
+Likes one post at `--rate` likes a minute for `--duration` seconds, each from a different user,
+through the full like endpoint in-process, with the flush thread running as it would in a worker.
+Reported: the rate achieved, like latency (median and 99th percentile), how many flushes and
+upsert statements wrote the likes' notifications against the one row per like a notification per
+event would need, and that the author ends up with one group counting every liker. Then times the
+author's unread counter (cached and not) and first feed page. The post, its likes and the
+notification are deleted afterwards unless `--keep` is given.
+
+The like endpoint's own cost grows with the post's likes (its response lists every liker), so
+`--direct` calls `notifications.notify` instead, for the cost of notifications alone.
+"""
+
+import math
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient
+
+from api import notifications
+from api.constants import NOTIFICATION_FLUSH_INTERVAL
+from api.models import Like, Notification, Post, User
+
+BENCH_TITLE = 'bench_notifications'
+
+
+def flush_stats():
+    """`(flushes, groups, seconds flushing)` so far in this process."""
+    return (
+        REGISTRY.get_sample_value('api_notification_flush_duration_seconds_count') or 0,
+        REGISTRY.get_sample_value('api_notification_flush_groups_total') or 0,
+        REGISTRY.get_sample_value('api_notification_flush_duration_seconds_sum') or 0,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Time likes on one post at a steady rate, and the grouped notification writes they cause.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rate', type=int, default=10_000, help='Likes a minute.')
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds.')
+        parser.add_argument('--direct', action='store_true', help='Call `notifications.notify` instead of the endpoint.')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--keep', action='store_true')
+
+    def handle(self, *args, **options):
+        per_second = options['rate'] / 60
+        count = math.ceil(per_second * options['duration'])
+        if count < 1:
+            raise CommandError('--rate and --duration allow no likes.')
+        author, post, likers = self.seed(count)
+        self.stdout.write(f'{count} likes at {options["rate"]}/min on one post, flushing every {NOTIFICATION_FLUSH_INTERVAL}s.')
+
+        try:
+            before = flush_stats()
+            timings = self.like(post, likers, per_second, options['direct'])
+            # What the flush thread has not written yet.
+            notifications.flush()
+            flushes, groups, flushing = (after - earlier for after, earlier in zip(flush_stats(), before))
+
+            elapsed = sum(timings)
+            timings.sort()
+            self.stdout.write(
+                f'  achieved        {count / self.wall * 60:>10.0f} likes/min (busy {elapsed:.1f}s of {self.wall:.1f}s)'
+            )
+            self.stdout.write(f'  like p50        {timings[len(timings) // 2] * 1000:>10.1f} ms')
+            self.stdout.write(f'  like p99        {timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000:>10.1f} ms')
+            self.stdout.write(f'  upserts         {groups:>10.0f} in {flushes:.0f} flushes, against {count} inserts for a row per like')
+            self.stdout.write(f'  flush mean      {flushing / max(flushes, 1) * 1000:>10.1f} ms')
+
+            notification = Notification.objects.get(recipient=author, verb=Notification.LIKE, target_id=post.id)
+            if notification.actor_count != count:
+                raise CommandError(f'The group counts {notification.actor_count} likers, not {count}.')
+            self.stdout.write(f'  group           {notification.actor_count:>10} likers, last {notification.last_actor_id}')
+
+            client = APIClient()
+            client.force_authenticate(author)
+            self.report('unread, uncached', client, '/api/notifications/unread-count/', options['repeat'], clear=author.id)
+            self.report('unread, cached', client, '/api/notifications/unread-count/', options['repeat'])
+            self.report('feed, first page', client, '/api/notifications/', options['repeat'])
+        finally:
+            if not options['keep']:
+                self.cleanup(author, post)
+
+    def seed(self, count):
+        likers = list(User.objects.filter(username__startswith='bench_liker').order_by('username')[:count])
+        if len(likers) < count:
+            User.objects.bulk_create([
+                User(email=f'bench_liker{i}@example.com', username=f'bench_liker{i}', is_active=True)
+                for i in range(len(likers), count)
+            ], batch_size=5000, ignore_conflicts=True)
+            likers = list(User.objects.filter(username__startswith='bench_liker').order_by('username')[:count])
+        author, _ = User.objects.get_or_create(
+            username='bench_notified', defaults={'email': 'bench_notified@example.com', 'is_active': True},
+        )
+        post = Post.objects.create(author=author, title=BENCH_TITLE, content='Notification benchmark.')
+        return author, post, likers
+
+    def like(self, post, likers, per_second, direct):
+        """Like `post` once from each of `likers`, `per_second` likes a second. Returns each like's time."""
+        client = APIClient()
+        path = f'/api/posts/{post.id}/like/'
+        timings = []
+        started = time.perf_counter()
+        for index, liker in enumerate(likers):
+            # Paced against the start, so a slow like is caught up on rather than pushing the rest back.
+            delay = started + index / per_second - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            like_started = time.perf_counter()
+            if direct:
+                notifications.notify(Notification.LIKE, post.author_id, post.id, liker.id)
+            else:
+                client.force_authenticate(liker)
+                response = client.post(path)
+                if response.status_code != 201:
+                    raise CommandError(f'Liking returned {response.status_code}.')
+            timings.append(time.perf_counter() - like_started)
+        self.wall = time.perf_counter() - started
+        return timings
+
+    def report(self, label, client, path, repeat, clear=None):
+        timings = []
+        for _ in range(repeat):
+            if clear is not None:
+                cache.delete(notifications._unread_key(clear))
+            started = time.perf_counter()
+            response = client.get(path)
+            timings.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise CommandError(f'{path} returned {response.status_code}.')
+        self.stdout.write(f'  {label:<16}{sorted(timings)[len(timings) // 2] * 1000:>8.1f} ms')
+
+    def cleanup(self, author, post):
+        Notification.objects.filter(recipient=author).delete()
+        Like.objects.filter(post=post).delete()
+        post.delete()
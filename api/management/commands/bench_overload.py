@@ -0,0 +1,193 @@
+"""
+Load test admission control (`api.admission`): goodput at and past capacity, with and without it.
+
+```sh
+python manage.py bench_overload --duration 10 --loads 1,2
+```
+
+Starts daphne on `--port` (once with `ADMISSION_CONTROL_ENABLED=False`, once with it on) and sends it
+a mix of cheap, expensive, anonymous and authenticated requests, likes among them, over HTTP. First
+the capacity is measured closed-loop with `--workers` clients. Then requests arrive open-loop
+(Poisson) at each of `--loads` times that rate. Goodput is the requests per second answered
+successfully within `--slo` of their arrival. Reported per run and per request kind: goodput, shed
+(503) and failed requests, and latency percentiles.
+"""
+
+import http.client
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.models import Post, User
+
+# (kind, weight, method, path, authenticated)
+MIX = (
+    ('current user', 20, 'GET', '/api/auth/user/', True),
+    ('post detail', 25, 'GET', '/api/posts/{post}/', False),
+    ('like', 10, 'POST', '/api/posts/{post}/like/', True),
+    ('explore recent', 15, 'GET', '/api/posts/explore/?tab=recent&page={page}', False),
+    ('for-me', 15, 'GET', '/api/posts/explore/?tab=for-me', True),
+    ('search', 15, 'GET', '/api/posts/search/?q={word}', False),
+)
+WORDS = ('rice', 'soup', 'jollof', 'beef', 'stew', 'pepper', 'yam', 'egg')
+
+
+class Command(BaseCommand):
+    help = 'Compare goodput of a mixed request load at and past capacity with and without admission control.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument('--loads', default='1,2', help='Offered load as multiples of the measured capacity.')
+        parser.add_argument('--workers', type=int, default=8, help='Clients when measuring capacity.')
+        parser.add_argument('--connections', type=int, default=200, help='Most requests in flight open-loop.')
+        parser.add_argument('--slo', type=float, default=1.0, help='Seconds within which a response is useful.')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        post_ids = [str(post_id) for post_id in Post.objects.values_list('id', flat=True)]
+        users = list(User.objects.filter(is_active=True)[:50])
+        if not post_ids or not users:
+            raise CommandError('Needs posts and active users.')
+        self.tokens = [f'Bearer {AccessToken.for_user(user)}' for user in users]
+        self.post_ids = post_ids
+        self.rng = random.Random(options['seed'])
+        self.rng_lock = threading.Lock()
+        self.local = threading.local()
+        self.port = options['port']
+
+        with self.server(options['port'], enabled=False):
+            capacity = self.capacity(options['workers'], options['duration'])
+        self.stdout.write(f'capacity: {capacity:.0f} requests/s closed-loop with {options["workers"]} clients')
+
+        self.stdout.write(
+            f"{'load':<6}{'admission':<18}{'offered/s':>10}{'goodput/s':>10}{'ok':>7}{'shed':>7}{'failed':>7}"
+            f"{'ok p50':>9}{'ok p99':>9}{'shed p99':>9}"
+        )
+        for load in (float(load) for load in options['loads'].split(',')):
+            for enabled in (False, True):
+                with self.server(options['port'], enabled):
+                    results = self.open_loop(capacity * load, options['duration'], options['connections'])
+                self.report(f'{load:g}x', 'on' if enabled else 'off', capacity * load, results, options)
+
+    def server(self, port, enabled):
+        command = self
+
+        class Server:
+            def __enter__(self):
+                env = {**os.environ, 'ADMISSION_CONTROL_ENABLED': str(enabled)}
+                self.process = subprocess.Popen(
+                    [sys.executable, '-m', 'daphne', '-p', str(port), 'src.asgi:application'],
+                    env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                )
+                deadline = time.monotonic() + 30
+                while time.monotonic() < deadline:
+                    if command.send('GET', '/api/auth/user/', None) is not None:
+                        return self
+                    time.sleep(0.2)
+                self.process.kill()
+                raise CommandError('daphne did not start.')
+
+            def __exit__(self, *exc_info):
+                self.process.terminate()
+                self.process.wait()
+                # Let the connections the server had open close before the next run.
+                time.sleep(1)
+
+        return Server()
+
+    def pick(self):
+        with self.rng_lock:
+            kind, _, method, path, authenticated = self.rng.choices(MIX, weights=[entry[1] for entry in MIX])[0]
+            path = path.format(
+                post=self.rng.choice(self.post_ids), page=self.rng.randint(1, 3), word=self.rng.choice(WORDS),
+            )
+            token = self.rng.choice(self.tokens) if authenticated else None
+        return kind, method, path, token
+
+    def send(self, method, path, token):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+        headers = {'Authorization': token} if token else {}
+        try:
+            connection.request(method, path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            return None
+
+    def capacity(self, workers, duration):
+        done = []
+        deadline = time.perf_counter() + duration
+
+        def work():
+            while time.perf_counter() < deadline:
+                _, method, path, token = self.pick()
+                status = self.send(method, path, token)
+                if status is not None and status < 500:
+                    done.append(1)
+
+        threads = [threading.Thread(target=work) for _ in range(workers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return len(done) / (time.perf_counter() - started)
+
+    def open_loop(self, rate, duration, connections):
+        """Send Poisson arrivals at `rate` for `duration`; `[(kind, status, seconds since arrival), ...]`."""
+        results = []
+        lock = threading.Lock()
+
+        def serve(kind, method, path, token, arrived):
+            status = self.send(method, path, token)
+            with lock:
+                results.append((kind, status, time.perf_counter() - arrived))
+
+        with ThreadPoolExecutor(connections) as executor:
+            arrival = time.perf_counter()
+            deadline = arrival + duration
+            while arrival < deadline:
+                delay = arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(serve, *self.pick(), arrival)
+                arrival += self.rng.expovariate(rate)
+        return results
+
+    def report(self, load, mode, rate, results, options):
+        slo = options['slo']
+        duration = options['duration']
+        by_kind = defaultdict(list)
+        for kind, status, seconds in results:
+            by_kind[kind].append((status, seconds))
+        self.line(load, mode, rate, [result[1:] for result in results], slo, duration)
+        for kind, _, _, _, _ in MIX:
+            self.line('', f'  {kind}', None, by_kind[kind], slo, duration)
+
+    def line(self, load, mode, rate, results, slo, duration):
+        ok = sorted(seconds for status, seconds in results if status is not None and status < 500)
+        shed = sorted(seconds for status, seconds in results if status == 503)
+        failed = len(results) - len(ok) - len(shed)
+        goodput = sum(1 for seconds in ok if seconds <= slo) / duration
+
+        def percentile(values, share):
+            return f'{values[min(len(values) - 1, int(len(values) * share))] * 1000:.0f}' if values else '-'
+
+        offered = f'{rate:.0f}' if rate is not None else ''
+        self.stdout.write(
+            f'{load:<6}{mode:<18}{offered:>10}{goodput:>10.0f}{len(ok):>7}{len(shed):>7}{failed:>7}'
+            f'{percentile(ok, 0.5):>9}{percentile(ok, 0.99):>9}{percentile(shed, 0.99):>9}'
+        )
@@ -0,0 +1,63 @@
+"""
+Benchmark JSON against MessagePack (plain and dictionary-encoded) on real explore pages.
+
+```sh
+python manage.py bench_renderers --tab popular --pages 5 --page-size 20 --repeat 200
+```
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from api.renderers import MessagePackRenderer
+from api.views import PostViewSet
+
+
+class Command(BaseCommand):
+    help = 'Compare encode time and payload size of JSON and MessagePack on explore pages.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tab', default='all')
+        parser.add_argument('--pages', type=int, default=3)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=100)
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        view = PostViewSet.as_view({'get': 'explore'})
+
+        pages = []
+        for page in range(1, options['pages'] + 1):
+            request = factory.get('/api/posts/explore/', {
+                'tab': options['tab'], 'page': page, 'page_size': options['page_size'],
+            })
+            response = view(request)
+            if response.status_code != 200:
+                break
+            pages.append(response.data)
+
+        if not pages:
+            self.stdout.write(self.style.WARNING('No explore pages to benchmark.'))
+            return
+
+        encoders = [
+            ('json', JSONRenderer(), 'application/json'),
+            ('msgpack', MessagePackRenderer(), 'application/msgpack'),
+            ('msgpack+dedupe', MessagePackRenderer(), 'application/msgpack; dedupe=1'),
+        ]
+
+        self.stdout.write(f"{'format':<16}{'bytes/page':>12}{'us/page':>12}")
+        for name, renderer, media_type in encoders:
+            size = sum(len(renderer.render(data, media_type, {})) for data in pages) / len(pages)
+
+            started = time.perf_counter()
+            for _ in range(options['repeat']):
+                for data in pages:
+                    renderer.render(data, media_type, {})
+            elapsed = time.perf_counter() - started
+
+            per_page = elapsed / (options['repeat'] * len(pages)) * 1e6
+            self.stdout.write(f'{name:<16}{size:>12.0f}{per_page:>12.1f}')
@@ -0,0 +1,65 @@
+"""
+Benchmark `PostSerializer` against `FastPostSerializer` (`api.fast_serializers`) on real posts.
+
+```sh
+python manage.py bench_serializers --rows 20 100 1000 --repeat 20
+```
+
+Both sides start from the same queryset and include their queries; the fast output is checked to
+render identically before timing.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from api.fast_serializers import FastPostSerializer
+from api.models import Post
+from api.serializers import PostSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare rows per second of the DRF and compiled post serializers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[20, 100, 1000])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def measure(self, serialize, repeat):
+        with CaptureQueriesContext(connection) as queries:
+            serialize()
+        query_count = len(queries)
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            serialize()
+            reset_queries()
+        return (time.perf_counter() - started) / repeat, query_count
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        available = Post.objects.count()
+
+        self.stdout.write(f"{'rows':>6}{'drf rows/s':>14}{'fast rows/s':>14}{'speedup':>10}{'drf q':>8}{'fast q':>8}")
+        for rows in options['rows']:
+            if rows > available:
+                self.stdout.write(self.style.WARNING(f'Skipping {rows} rows, only {available} posts.'))
+                continue
+
+            queryset = Post.objects.order_by('-created_at')[:rows]
+            drf = lambda: PostSerializer(list(queryset), many=True).data  # noqa: E731
+            fast = lambda: FastPostSerializer(queryset, many=True).data  # noqa: E731
+
+            if renderer.render(drf()) != renderer.render(fast()):
+                self.stderr.write(self.style.ERROR(f'Output differs at {rows} rows.'))
+                return
+
+            drf_time, drf_queries = self.measure(drf, options['repeat'])
+            fast_time, fast_queries = self.measure(fast, options['repeat'])
+            self.stdout.write(
+                f'{rows:>6}{rows / drf_time:>14.0f}{rows / fast_time:>14.0f}{drf_time / fast_time:>9.1f}x'
+                f'{drf_queries:>8}{fast_queries:>8}'
+            )
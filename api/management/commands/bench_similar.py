@@ -0,0 +1,91 @@
+"""
+Benchmark the similar-posts build (`api.similar.build`) on synthetic data, without the database.
+
+```sh
+python manage.py bench_similar --posts 1000000 --likes 10000000
+python manage.py bench_similar --posts 1000000 --likes 10000000 --sample 50000   # extrapolate the full build
+```
+
+Post popularity, liker activity and tag use follow Zipf-like distributions, like real feeds. Reported:
+building the feature matrix, the full top-K pass (or `--sample` rows of it, extrapolated), an
+incremental pass over `--new` posts, and the stored size per post.
+"""
+
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from api.constants import SIMILAR_LIKE_WEIGHT, SIMILAR_POSTS_K, SIMILAR_TAG_WEIGHT
+from api.similar import build
+
+
+def zipf_choice(rng, n, size, exponent):
+    """`size` draws from `range(n)`, item `i` weighted by `1 / (i + 1) ** exponent`."""
+    weights = 1 / np.arange(1, n + 1) ** exponent
+    return rng.choice(n, size=size, p=weights / weights.sum()).astype(np.intc)
+
+
+def unique_pairs(rows, cols):
+    pairs = np.unique(rows.astype(np.int64) << 32 | cols.astype(np.int64))
+    return (pairs >> 32).astype(np.intc), (pairs & 0xFFFFFFFF).astype(np.intc)
+
+
+class Command(BaseCommand):
+    help = 'Time the similar-posts matrix build and top-K pass on synthetic posts, likes and tags.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--likes', type=int, default=10_000_000)
+        parser.add_argument('--users', type=int, default=500_000)
+        parser.add_argument('--tags', type=int, default=20_000)
+        parser.add_argument('--tags-per-post', type=int, default=3)
+        parser.add_argument('--sample', type=int, help='Time this many rows of the full pass and extrapolate.')
+        parser.add_argument('--new', type=int, default=1000, help='Posts in the incremental pass.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def timed(self, label, func):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{label:<28}{elapsed:>9.2f}s')
+        return result, elapsed
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        posts = options['posts']
+
+        def generate():
+            like_rows, like_cols = unique_pairs(
+                zipf_choice(rng, posts, options['likes'], 0.8), zipf_choice(rng, options['users'], options['likes'], 0.6),
+            )
+            tag_count = posts * options['tags_per_post']
+            tag_rows, tag_cols = unique_pairs(
+                np.repeat(np.arange(posts, dtype=np.intc), options['tags_per_post']),
+                zipf_choice(rng, options['tags'], tag_count, 1.0),
+            )
+            return (tag_rows, tag_cols, options['tags'], SIMILAR_TAG_WEIGHT), (like_rows, like_cols, options['users'], SIMILAR_LIKE_WEIGHT)
+
+        groups, _ = self.timed('generate', generate)
+        self.stdout.write(f'{posts} posts, {len(groups[1][0])} likes, {len(groups[0][0])} post tags')
+        matrix, _ = self.timed('feature matrix', lambda: build.feature_matrix(posts, groups))
+        self.stdout.write(f'{matrix.nnz} non-zero features, {matrix.data.nbytes + matrix.indices.nbytes >> 20} MiB')
+
+        def run(rows):
+            found = 0
+            for _, similar_rows, _ in build.top_k(matrix, rows):
+                found += len(similar_rows)
+            return found
+
+        sample = min(options['sample'] or posts, posts)
+        rows = rng.choice(posts, size=sample, replace=False) if sample < posts else np.arange(posts)
+        found, elapsed = self.timed(f'top-{SIMILAR_POSTS_K} of {sample} posts', lambda: run(rows))
+        if sample < posts:
+            self.stdout.write(f'{"full pass (extrapolated)":<28}{elapsed * posts / sample:>9.2f}s')
+        self.stdout.write(f'{found / sample:.1f} similar posts per post')
+
+        newest = np.arange(posts - options['new'], posts)
+        self.timed(f'incremental, {options["new"]} new posts', lambda: run(newest))
+
+        # 16 bytes of UUID and 4 of score per similar post, plus the row itself.
+        self.stdout.write(f'stored: {found / sample * 20:.0f} bytes of lists per post')
@@ -0,0 +1,132 @@
+"""
+Benchmark worker startup: time from a fresh process to its first response.
+
+```sh
+python manage.py bench_startup --repeat 5
+python manage.py bench_startup --interface asgi --path '/api/posts/explore/?tab=recent'
+```
+
+Each run starts a new interpreter that imports the application (`src.wsgi` or `src.asgi`) and
+serves one request in-process, as a worker booting under a load balancer would. Reported as medians
+of `--repeat` runs: interpreter start to application loaded, to first response, and the first
+response itself against a second one. Then the preload case, as gunicorn's `preload_app` runs it:
+one process loads and warms the application and forks `--repeat` children, and each child's time
+from fork to its first response is reported.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+WORKER = r'''
+import asyncio, io, json, os, sys, time
+started = float(sys.argv[1])
+interface, path, forks = sys.argv[2], sys.argv[3], int(sys.argv[4])
+path, _, query = path.partition('?')
+
+if interface == 'wsgi':
+    from src.wsgi import application
+
+    def serve():
+        status = []
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80', 'HTTP_HOST': 'localhost', 'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+        }
+        b''.join(application(environ, lambda line, headers: status.append(int(line.split()[0]))))
+        return status[0]
+else:
+    from src.asgi import application
+
+    def serve():
+        messages = []
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+            'headers': [(b'host', b'localhost')], 'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        }
+
+        async def receive():
+            if not messages:
+                messages.append(None)
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await asyncio.Event().wait()
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(application(scope, receive, send))
+        return messages[1]['status']
+
+loaded = time.time()
+if not forks:
+    tick = time.perf_counter()
+    status = serve()
+    first = time.perf_counter() - tick
+    tick = time.perf_counter()
+    serve()
+    second = time.perf_counter() - tick
+    print(json.dumps({'status': status, 'load': loaded - started, 'first_response': time.time() - started, 'first': first, 'second': second}))
+else:
+    from django.db import connections
+    connections.close_all()
+    results = []
+    for _ in range(forks):
+        read, write = os.pipe()
+        tick = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read)
+            status = serve()
+            os.write(write, json.dumps({'status': status, 'fork_to_response': time.perf_counter() - tick}).encode())
+            os._exit(0)
+        os.close(write)
+        with os.fdopen(read) as pipe:
+            results.append(json.loads(pipe.read()))
+        os.waitpid(pid, 0)
+    print(json.dumps(results))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Time worker startup to the first response, cold and forked from a preloaded parent.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interface', choices=('wsgi', 'asgi'), default='wsgi')
+        parser.add_argument('--path', default='/api/posts/explore/?tab=recent')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def worker(self, interface, path, forks=0):
+        completed = subprocess.run(
+            [sys.executable, '-W', 'ignore', '-c', WORKER, repr(time.time()), interface, path, str(forks)],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        if completed.returncode:
+            raise CommandError(completed.stderr)
+        return json.loads(completed.stdout.splitlines()[-1])
+
+    def handle(self, *args, **options):
+        interface, path = options['interface'], options['path']
+        runs = [self.worker(interface, path) for _ in range(options['repeat'])]
+        if runs[0]['status'] >= 400:
+            self.stderr.write(self.style.WARNING(f'{path} returned {runs[0]["status"]}.'))
+
+        def median(key, rows):
+            return statistics.median(row[key] for row in rows) * 1000
+
+        self.stdout.write(f'{interface} GET {path}, medians of {len(runs)} cold starts:')
+        self.stdout.write(f'  start to application loaded {median("load", runs):8.0f} ms')
+        self.stdout.write(f'  start to first response     {median("first_response", runs):8.0f} ms')
+        self.stdout.write(f'  first response              {median("first", runs):8.1f} ms')
+        self.stdout.write(f'  second response             {median("second", runs):8.1f} ms')
+
+        forked = self.worker(interface, path, forks=options['repeat'])
+        self.stdout.write(f'preloaded parent, {len(forked)} forked children:')
+        self.stdout.write(f'  fork to first response      {median("fork_to_response", forked):8.1f} ms')
@@ -0,0 +1,134 @@
+"""
+Benchmark static file serving: bytes transferred per encoding, cache headers, and throughput.
+
+```sh
+python manage.py bench_static --duration 10 --clients 8
+```
+
+Starts daphne on `--port` and requests every collected file (`STATIC_ROOT`'s manifest) once per
+`Accept-Encoding` a client may send, summing the bytes transferred. Reports the `Cache-Control` of a
+content-hashed and of an unhashed name. Then `--clients` keep-alive clients fetch the
+stylesheets and scripts at random, the way page loads do, for `--duration` seconds: requests and
+megabytes per second, and latency percentiles.
+"""
+
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+ENCODINGS = (('none', None), ('gzip', 'gzip'), ('br, gzip', 'br, gzip'))
+
+
+class Command(BaseCommand):
+    help = 'Measure bytes transferred and request throughput for collected static files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument('--clients', type=int, default=8)
+        parser.add_argument('--port', type=int, default=8766)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        manifest = Path(settings.STATIC_ROOT) / 'staticfiles.json'
+        if not manifest.exists():
+            raise CommandError('Run collectstatic first.')
+        paths = json.loads(manifest.read_text())['paths']
+        prefix = '/' + settings.STATIC_URL.strip('/') + '/'
+        hashed = sorted(prefix + name for name in paths.values())
+        self.port = options['port']
+        self.local = threading.local()
+
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'daphne', '-p', str(self.port), 'src.asgi:application'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            self.wait_until_up(hashed[0])
+            self.transfer(hashed, prefix + next(iter(paths)))
+            self.throughput(
+                [path for path in hashed if path.endswith(('.css', '.js'))],
+                options['duration'], options['clients'], random.Random(options['seed']),
+            )
+        finally:
+            process.terminate()
+            process.wait()
+
+    def wait_until_up(self, path):
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.get(path)[0] is not None:
+                return
+            time.sleep(0.2)
+        raise CommandError('daphne did not start.')
+
+    def get(self, path, accept_encoding='br, gzip'):
+        """`(status, headers, body bytes)`, `(None, None, 0)` if the request failed."""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+        headers = {'Accept-Encoding': accept_encoding} if accept_encoding else {}
+        try:
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            return response.status, response.headers, len(response.read())
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self.local.connection = None
+            return None, None, 0
+
+    def transfer(self, hashed, unhashed):
+        self.stdout.write(f'{len(hashed)} files, bytes transferred for all of them:')
+        for label, accept_encoding in ENCODINGS:
+            total = 0
+            for path in hashed:
+                status, _, size = self.get(path, accept_encoding)
+                if status != 200:
+                    raise CommandError(f'{path} returned {status}.')
+                total += size
+            self.stdout.write(f'  Accept-Encoding: {label:<10}{total / 1024:>10.0f} KiB')
+        self.stdout.write(f'Cache-Control, hashed:   {self.get(hashed[0])[1]["Cache-Control"]}')
+        self.stdout.write(f'Cache-Control, unhashed: {self.get(unhashed)[1]["Cache-Control"]}')
+
+    def throughput(self, paths, duration, clients, rng):
+        latencies = []
+        transferred = []
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def work(seed):
+            local_rng = random.Random(seed)
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                status, _, size = self.get(local_rng.choice(paths))
+                elapsed = time.perf_counter() - started
+                if status == 200:
+                    with lock:
+                        latencies.append(elapsed)
+                        transferred.append(size)
+
+        threads = [threading.Thread(target=work, args=(rng.random(),)) for _ in range(clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+
+        def percentile(share):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * share))] * 1000
+
+        self.stdout.write(
+            f'{clients} clients, {len(paths)} stylesheets and scripts, Accept-Encoding: br, gzip: '
+            f'{len(latencies) / elapsed:.0f} requests/s, {sum(transferred) / elapsed / 2 ** 20:.1f} MiB/s, '
+            f'p50 {percentile(0.5):.1f} ms, p99 {percentile(0.99):.1f} ms'
+        )
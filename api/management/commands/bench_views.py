@@ -0,0 +1,93 @@
+"""
+Benchmark sustained view ingestion through `api.impressions` on a single node.
+
+```sh
+python manage.py bench_views --rate 50000 --duration 20
+```
+
+Views of existing posts by `--viewers` synthetic viewers are recorded at `--rate` per second (Zipf-like
+post popularity, so some pairs repeat and are deduplicated) while the background thread flushes.
+Reported: the rate actually sustained, the recording cost per view, every flush, and a check that
+the database received exactly the counted views.
+"""
+
+import logging
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+
+from api import impressions
+from api.models import Post
+
+
+class FlushLog(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.flushes = []
+
+    def emit(self, record):
+        if record.msg.startswith('Flushed'):
+            self.flushes.append(record.args)
+
+
+class Command(BaseCommand):
+    help = 'Record views at a target rate through the buffered counters and report throughput and flushes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rate', type=int, default=50_000, help='Views per second.')
+        parser.add_argument('--duration', type=float, default=20)
+        parser.add_argument('--viewers', type=int, default=100_000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        post_ids = [str(post_id) for post_id in Post.objects.values_list('id', flat=True)]
+        if not post_ids:
+            raise CommandError('No posts to view.')
+        impressions.flush()
+        before = Post.all_objects.aggregate(total=Sum('view_count'))['total'] or 0
+
+        log = FlushLog()
+        logger = logging.getLogger('api.impressions')
+        logger.addHandler(log)
+        logger.setLevel(logging.DEBUG)
+
+        rng = random.Random(options['seed'])
+        weights = [1 / (rank + 1) ** 0.8 for rank in range(len(post_ids))]
+        chunk = max(options['rate'] // 100, 1)
+        recorded = busy = 0
+        distinct = set()
+
+        started = time.perf_counter()
+        deadline = started + options['duration']
+        while time.perf_counter() < deadline:
+            views = list(zip(rng.choices(post_ids, weights, k=chunk), rng.choices(range(options['viewers']), k=chunk)))
+            tick = time.perf_counter()
+            for post_id, viewer in views:
+                impressions.record_views([post_id], viewer)
+            busy += time.perf_counter() - tick
+            distinct.update(views)
+            recorded += chunk
+            # Pace to the target rate; when behind, keep going flat out.
+            ahead = started + recorded / options['rate'] - time.perf_counter()
+            if ahead > 0:
+                time.sleep(ahead)
+        elapsed = time.perf_counter() - started
+
+        counted = sum(impressions._pending[impressions.VIEW].values())
+        impressions.flush()
+        flushed = sum(post_count for post_count, _, _ in log.flushes)
+        after = Post.all_objects.aggregate(total=Sum('view_count'))['total'] or 0
+        logger.removeHandler(log)
+
+        self.stdout.write(f'recorded   {recorded} views in {elapsed:.1f}s = {recorded / elapsed:,.0f}/s (target {options["rate"]:,}/s)')
+        self.stdout.write(f'cost       {busy / recorded * 1e6:.2f}us per view, {busy / elapsed:.0%} of one core')
+        for post_count, statements, seconds in log.flushes:
+            self.stdout.write(f'flush      {post_count:>6} posts {statements:>4} statements {seconds * 1000:8.1f}ms')
+        self.stdout.write(f'flushed    {len(log.flushes)} times, {flushed} post updates')
+        self.stdout.write(f'stored     {after - before} views, {counted} of them in the final flush')
+        if after - before == len(distinct):
+            self.stdout.write(self.style.SUCCESS(f'check      {recorded - len(distinct)} repeat views deduplicated, none lost'))
+        else:
+            self.stdout.write(self.style.ERROR(f'check      expected {len(distinct)} distinct views'))
@@ -0,0 +1,29 @@
+"""
+Rebuild the similar-posts table (`api.similar.build`), e.g. from cron.
+
+```sh
+python manage.py build_similar --incremental   # every few minutes: posts without a list yet
+python manage.py build_similar                 # nightly: every post
+```
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.similar import build
+
+
+class Command(BaseCommand):
+    help = 'Precompute the most similar posts of every (or every new) post.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true', help='Only build posts without a list yet.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        stats = build.build(incremental=options['incremental'])
+        self.stdout.write(
+            f"{stats['computed']} of {stats['posts']} posts built, {stats['merged']} lists updated "
+            f"in {time.perf_counter() - started:.1f}s."
+        )
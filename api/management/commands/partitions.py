@@ -0,0 +1,55 @@
+"""
+Manage monthly partitions of the tables listed in `api.partitions.PARTITIONED_TABLES` (PostgreSQL only).
+
+```sh
+python manage.py partitions convert              # one-off: partition api_post_likes by liked_at
+python manage.py partitions create --ahead 3     # run monthly, e.g. from cron
+python manage.py partitions archive --older-than 24 [--drop]
+python manage.py partitions list
+```
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api import partitions
+from api.constants import PARTITION_MONTHS_AHEAD
+
+
+class Command(BaseCommand):
+    help = 'Convert, extend and archive monthly table partitions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=('convert', 'create', 'archive', 'list'))
+        parser.add_argument('--table', default='api_post_likes', choices=sorted(partitions.PARTITIONED_TABLES))
+        parser.add_argument('--ahead', type=int, default=PARTITION_MONTHS_AHEAD, help='Months of partitions to create ahead.')
+        parser.add_argument('--older-than', type=int, default=24, help='Archive partitions older than this many months.')
+        parser.add_argument('--drop', action='store_true', help='Drop archived partitions instead of keeping them as archive_* tables.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Table partitioning requires PostgreSQL.')
+
+        table = options['table']
+        action = options['action']
+
+        if action == 'convert':
+            if partitions.is_partitioned(table):
+                raise CommandError(f'{table} is already partitioned.')
+            partitions.convert(table)
+            partitions.ensure_partitions(table, ahead=options['ahead'])
+            self.stdout.write(self.style.SUCCESS(f'{table} is now partitioned by month.'))
+            return
+
+        if not partitions.is_partitioned(table):
+            raise CommandError(f'{table} is not partitioned; run `partitions convert` first.')
+
+        if action == 'create':
+            for name in partitions.ensure_partitions(table, ahead=options['ahead']):
+                self.stdout.write(name)
+        elif action == 'archive':
+            for name in partitions.archive(table, options['older_than'], drop=options['drop']):
+                self.stdout.write(f"{'dropped' if options['drop'] else 'archived'} {name}")
+        else:
+            for name in partitions.list_partitions(table):
+                self.stdout.write(name)
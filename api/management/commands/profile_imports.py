@@ -0,0 +1,69 @@
+"""
+Profile what importing the application costs, module by module.
+
+```sh
+python manage.py profile_imports
+python manage.py profile_imports --module src.wsgi --limit 30
+```
+
+Imports `--module` in a fresh interpreter under `python -X importtime` and reports the total, the
+modules with the largest cumulative time (their own plus everything they imported first) and the
+largest self time, and self time summed per top-level package: which dependencies a worker pays for
+at startup, and what they pull in. `src.wsgi` and `src.asgi` also set Django up and warm the
+application (`api.startup`), which shows as their own self time.
+"""
+
+import subprocess
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def parse(stderr):
+    """`[(module, self µs, cumulative µs, depth)]` from `-X importtime` output."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(own), int(cumulative), depth))
+    return modules
+
+
+class Command(BaseCommand):
+    help = 'Report the import time of every module the application loads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default='src.asgi', help='Module to import, e.g. src.wsgi.')
+        parser.add_argument('--limit', type=int, default=20, help='Rows per table.')
+
+    def handle(self, *args, **options):
+        completed = subprocess.run(
+            [sys.executable, '-W', 'ignore', '-X', 'importtime', '-c', f'import {options["module"]}'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        if completed.returncode:
+            raise CommandError(completed.stderr[-2000:])
+        modules = parse(completed.stderr)
+        limit = options['limit']
+        total = sum(own for _, own, _, _ in modules)
+        self.stdout.write(f'import {options["module"]}: {total / 1000:.0f} ms, {len(modules)} modules')
+
+        self.table('cumulative', sorted(modules, key=lambda module: -module[2])[:limit], total)
+        self.table('self', sorted(modules, key=lambda module: -module[1])[:limit], total)
+
+        packages = Counter()
+        for name, own, _, _ in modules:
+            packages[name.partition('.')[0]] += own
+        self.stdout.write(f'\n{"self ms":>9}{"share":>7}  package')
+        for package, own in packages.most_common(limit):
+            self.stdout.write(f'{own / 1000:>9.1f}{own / total:>7.0%}  {package}')
+
+    def table(self, title, rows, total):
+        self.stdout.write(f'\nby {title} time:\n{"self ms":>9}{"cum ms":>9}{"share":>7}  module')
+        for name, own, cumulative, _ in rows:
+            share = (cumulative if title == 'cumulative' else own) / total
+            self.stdout.write(f'{own / 1000:>9.1f}{cumulative / 1000:>9.1f}{share:>7.0%}  {name}')
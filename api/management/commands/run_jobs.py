@@ -0,0 +1,33 @@
+"""
+Run background job workers.
+
+```sh
+python manage.py run_jobs --concurrency 4
+python manage.py run_jobs --burst   # exit once the queue is empty
+```
+
+Run it next to the web server wherever `JOBS_ALWAYS_EAGER` is off, or emails, media cleanup and
+purges queue up unrun. Idle workers also delete done jobs older than `JOB_RETENTION`.
+"""
+
+from django.core.management.base import BaseCommand
+
+from api import jobs
+from api.constants import JOB_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Process queued background jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help='Number of worker processes.')
+        parser.add_argument('--batch-size', type=int, default=JOB_BATCH_SIZE, help='Jobs claimed per poll.')
+        parser.add_argument('--burst', action='store_true', help='Exit when there is nothing left to do.')
+
+    def handle(self, *args, **options):
+        jobs.requeue_stale()
+        jobs.run_workers(
+            concurrency=options['concurrency'],
+            burst=options['burst'],
+            batch_size=options['batch_size'],
+        )
@@ -0,0 +1,205 @@
+"""
+Uploaded images and their derivatives.
+
+Feed cards and avatar bubbles used to load whatever full-size original a thumbnail or avatar URL
+pointed at. Images uploaded to the API (multipart `thumbnail` when creating a post, `avatar` on
+`auth/update-user/`) get resized WebP and AVIF variants and a blur placeholder instead:
+
+* `store_upload` checks the file, computes its size and placeholder (`derivatives.probe`), and saves
+  the original with `default_storage` (`STORAGES['default']`: files under `MEDIA_ROOT` in development
+  and tests, any Django storage backend through `MEDIA_STORAGE_BACKEND`). Every upload gets a new
+  directory, so a URL always serves the same bytes and can be cached for good.
+* The `generate_media_variants` job (`api.tasks`) renders `MEDIA_THUMBNAIL_WIDTHS` (or square
+  `MEDIA_AVATAR_SIZES`) in each of `MEDIA_FORMATS` and records them, unless the image was replaced
+  meanwhile.
+* `discard` deletes the files of images that were replaced, or whose post or account was purged,
+  in a `delete_media_files` job once the change commits.
+
+Rendering is CPU-bound, so it runs in a process pool of `MEDIA_WORKERS` (0 renders inline, as do
+`run_jobs --concurrency` workers, which are separate processes already and cannot start a pool).
+
+Images are recorded in `Post.thumbnail` and `User.avatar_media` as
+
+```json
+{"image": ".../thumbnail/<id>/original.jpg", "width": 3000, "height": 2000, "format": "JPEG",
+ "placeholder": "data:image/webp;base64,...",
+ "variants": [{"url": ".../thumbnail/<id>/640.avif", "format": "avif", "width": 640, "height": 427, "bytes": 21046}, ...],
+ "files": ["thumbnail/<id>/original.jpg", "thumbnail/<id>/640.avif", ...]}
+```
+
+`files`, the storage names of the original and its variants, is for `discard` and not shown.
+
+`image` is the key thumbnails pointing elsewhere already use; those have no variants and are served
+unchanged. `representation` turns the variants into a `srcset` per MIME type, so browsers pick the
+size and format themselves, plus `src` for clients that do not.
+"""
+
+import multiprocessing
+import posixpath
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from api import jobs
+from api.constants import (
+    MEDIA_AVATAR_DISPLAY_SIZE, MEDIA_AVATAR_SIZES, MEDIA_MAX_UPLOAD_BYTES, MEDIA_THUMBNAIL_DISPLAY_WIDTH,
+    MEDIA_THUMBNAIL_WIDTHS,
+)
+from api.media import derivatives
+from api.media.derivatives import AVATAR, THUMBNAIL, InvalidImage
+from api.models import Post, User
+
+# Where each kind of image is recorded.
+FIELDS = {THUMBNAIL: (Post, 'thumbnail'), AVATAR: (User, 'avatar_media')}
+
+_executor = None
+
+
+def make_executor(workers):
+    # Spawned rather than forked: the server process runs threads (and an event loop). Workers set
+    # Django up before anything else, since unpickling a task imports this package and its models.
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup,
+    )
+
+
+def get_executor():
+    """The shared rendering pool, started on first use. `None` when rendering inline."""
+    global _executor
+    workers = getattr(settings, 'MEDIA_WORKERS', 0)
+    if not workers or multiprocessing.current_process().daemon:
+        return None
+    if _executor is None:
+        _executor = make_executor(workers)
+    return _executor
+
+
+def sizes(kind, width, height):
+    """The variant sizes for an original of `width` by `height`: the configured ones that fit, else its own."""
+    if kind == AVATAR:
+        configured, largest = MEDIA_AVATAR_SIZES, min(width, height)
+    else:
+        configured, largest = MEDIA_THUMBNAIL_WIDTHS, width
+    fitting = [size for size in configured if size <= largest]
+    if largest < configured[-1] and largest not in fitting:
+        fitting.append(largest)
+    return fitting
+
+
+def store_upload(upload, kind):
+    """
+    Save an uploaded image. Returns `(record without variants, storage name)`; pass the name to
+    `schedule_variants` once the record is saved. Raises `InvalidImage`.
+    """
+    if upload.size > MEDIA_MAX_UPLOAD_BYTES:
+        raise InvalidImage(f'Images can be at most {MEDIA_MAX_UPLOAD_BYTES // 2 ** 20} MB.')
+    data = upload.read()
+    executor = get_executor()
+    info = derivatives.probe(data, kind) if executor is None else executor.submit(derivatives.probe, data, kind).result()
+
+    extension = 'jpg' if info['format'] in ('JPEG', 'MPO') else info['format'].lower()
+    name = default_storage.save(f'{kind}/{uuid.uuid4().hex}/original.{extension}', ContentFile(data))
+    return {'image': default_storage.url(name), **info, 'variants': [], 'files': [name]}, name
+
+
+def schedule_variants(kind, object_id, name):
+    jobs.enqueue('generate_media_variants', {'kind': kind, 'object_id': str(object_id), 'name': name})
+
+
+def render_variants(kind, name, width, height):
+    """Render and store the variants of the original at `name`. Returns their records and storage names."""
+    with default_storage.open(name) as original:
+        data = original.read()
+    targets = sizes(kind, width, height)
+    executor = get_executor()
+    if executor is None:
+        rendered = map(derivatives.render, repeat(data), repeat(kind), targets)
+    else:
+        rendered = executor.map(derivatives.render, repeat(data), repeat(kind), targets)
+
+    directory = posixpath.dirname(name)
+    variants, names = [], []
+    for size, encoded in zip(targets, rendered):
+        for image_format, content, variant_width, variant_height in encoded:
+            saved = default_storage.save(f'{directory}/{size}.{image_format}', ContentFile(content))
+            names.append(saved)
+            variants.append({
+                'url': default_storage.url(saved),
+                'format': image_format,
+                'width': variant_width,
+                'height': variant_height,
+                'bytes': len(content),
+            })
+    return variants, names
+
+
+def generate_variants(kind, object_id, name):
+    """Render the variants of the image at `name` and record them, if `object_id` still shows it."""
+    model, field = FIELDS[kind]
+    url = default_storage.url(name)
+    record = model.objects.filter(id=object_id).values_list(field, flat=True).first()
+    if not record or record.get('image') != url:
+        return False
+
+    variants, names = render_variants(kind, name, record['width'], record['height'])
+    with transaction.atomic():
+        instance = model.objects.select_for_update().filter(id=object_id).first()
+        record = getattr(instance, field, None) if instance is not None else None
+        if record and record.get('image') == url:
+            setattr(instance, field, {**record, 'variants': variants, 'files': [name, *names]})
+            instance.save(update_fields=[field])
+            return True
+    # Replaced while rendering.
+    delete_files(names)
+    return False
+
+
+def stored_files(record):
+    """The storage names of the files behind an image record; none for images stored elsewhere."""
+    return list(record.get('files', ())) if isinstance(record, dict) else []
+
+
+def delete_files(names):
+    for name in names:
+        default_storage.delete(name)
+
+
+def discard(records, keep=None):
+    """
+    Delete the files of the replaced or deleted image `records`, except those `keep` (the record
+    replacing them) still uses, once the current transaction commits.
+    """
+    names = set(name for record in records for name in stored_files(record)) - set(stored_files(keep))
+    if names:
+        transaction.on_commit(lambda: jobs.enqueue('delete_media_files', {'names': sorted(names)}))
+
+
+def pick(variants, width, image_format='webp'):
+    """The narrowest `image_format` variant at least `width` wide, else the widest there is."""
+    candidates = sorted((variant for variant in variants if variant['format'] == image_format), key=lambda v: v['width'])
+    for variant in candidates:
+        if variant['width'] >= width:
+            return variant
+    return candidates[-1] if candidates else None
+
+
+def representation(record, kind):
+    """The API form of an image record: `variants` become `srcset` strings per MIME type, and `src`."""
+    if not isinstance(record, dict):
+        return record
+    if not record.get('variants'):
+        return {key: value for key, value in record.items() if key != 'files'}
+    data = {key: value for key, value in record.items() if key not in ('variants', 'files')}
+    srcset = {}
+    for variant in sorted(record['variants'], key=lambda v: v['width']):
+        srcset.setdefault(f'image/{variant["format"]}', []).append(f'{variant["url"]} {variant["width"]}w')
+    data['srcset'] = {mime_type: ', '.join(entries) for mime_type, entries in srcset.items()}
+    display = pick(record['variants'], MEDIA_AVATAR_DISPLAY_SIZE if kind == AVATAR else MEDIA_THUMBNAIL_DISPLAY_WIDTH)
+    data['src'] = display['url'] if display else record.get('image')
+    return data
@@ -0,0 +1,113 @@
+"""
+Image decoding and encoding for `api.media`, run in its process pool.
+
+Functions here take and return bytes and plain values, so they can be sent to another process.
+JPEGs are decoded at the smallest of 1/2, 1/4 or 1/8 scale that still covers the target size (libjpeg's
+`draft` mode), which is most of the saving when rendering small variants of a large photo.
+"""
+
+import base64
+import io
+import math
+
+from PIL import Image, ImageFilter, ImageOps, UnidentifiedImageError
+
+from api.constants import (
+    MEDIA_ACCEPTED_FORMATS, MEDIA_AVIF_QUALITY, MEDIA_AVIF_SPEED, MEDIA_FORMATS, MEDIA_MAX_PIXELS,
+    MEDIA_PLACEHOLDER_SIZE, MEDIA_WEBP_QUALITY,
+)
+
+THUMBNAIL = 'thumbnail'
+AVATAR = 'avatar'
+
+ORIENTATION = 0x0112
+_ENCODERS = {
+    'webp': ('WEBP', {'quality': MEDIA_WEBP_QUALITY, 'method': 4}),
+    'avif': ('AVIF', {'quality': MEDIA_AVIF_QUALITY, 'speed': MEDIA_AVIF_SPEED}),
+}
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def _open(data):
+    try:
+        image = Image.open(io.BytesIO(data))
+    except (UnidentifiedImageError, OSError):
+        raise InvalidImage('The file is not an image.')
+    if image.format not in MEDIA_ACCEPTED_FORMATS:
+        raise InvalidImage(f'{image.format} images are not supported.')
+    if image.width * image.height > MEDIA_MAX_PIXELS:
+        raise InvalidImage('The image is too large.')
+    return image
+
+
+def _is_rotated(image):
+    """Whether the EXIF orientation swaps width and height."""
+    return image.getexif().get(ORIENTATION, 1) in (5, 6, 7, 8)
+
+
+def _size(image):
+    """`(width, height)` as displayed, after the EXIF orientation."""
+    return (image.height, image.width) if _is_rotated(image) else image.size
+
+
+def _load(image, kind, size):
+    """Decode `image` at just enough resolution for a `size` variant, upright and in RGB(A)."""
+    width, height = _size(image)
+    scale = size / (min(width, height) if kind == AVATAR else width)
+    if image.format in ('JPEG', 'MPO') and scale < 1:
+        image.draft('RGB', (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+    try:
+        image = ImageOps.exif_transpose(image)
+    except OSError:
+        raise InvalidImage('The image is truncated or corrupt.')
+    if image.mode not in ('RGB', 'RGBA'):
+        transparent = 'A' in image.getbands() or 'transparency' in image.info
+        image = image.convert('RGBA' if transparent else 'RGB')
+    return image
+
+
+def _resize(image, kind, size):
+    if kind == AVATAR:
+        # The centre square.
+        side = min(image.size)
+        left, top = (image.width - side) // 2, (image.height - side) // 2
+        return image.resize((size, size), Image.LANCZOS, box=(left, top, left + side, top + side), reducing_gap=3.0)
+    height = max(1, round(image.height * size / image.width))
+    return image.resize((size, height), Image.LANCZOS, reducing_gap=3.0)
+
+
+def probe(data, kind):
+    """Check an upload. Returns `{'width', 'height', 'format', 'placeholder'}`; raises `InvalidImage`."""
+    image = _open(data)
+    width, height = _size(image)
+    source_format = image.format
+    small = _load(image, kind, MEDIA_PLACEHOLDER_SIZE)
+    if kind == AVATAR:
+        small = _resize(small, kind, MEDIA_PLACEHOLDER_SIZE)
+    else:
+        small.thumbnail((MEDIA_PLACEHOLDER_SIZE, MEDIA_PLACEHOLDER_SIZE), Image.LANCZOS)
+    # Blurred here so clients can stretch it over the frame as is.
+    small = small.filter(ImageFilter.GaussianBlur(1))
+    output = io.BytesIO()
+    small.save(output, 'WEBP', quality=40)
+    return {
+        'width': width,
+        'height': height,
+        'format': source_format,
+        'placeholder': 'data:image/webp;base64,' + base64.b64encode(output.getvalue()).decode(),
+    }
+
+
+def render(data, kind, size):
+    """Encode one size of `data` in every `MEDIA_FORMATS`: `[(format, bytes, width, height)]`."""
+    image = _resize(_load(_open(data), kind, size), kind, size)
+    variants = []
+    for name in MEDIA_FORMATS:
+        encoder, options = _ENCODERS[name]
+        output = io.BytesIO()
+        image.save(output, encoder, **options)
+        variants.append((name, output.getvalue(), image.width, image.height))
+    return variants
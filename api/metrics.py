@@ -0,0 +1,154 @@
+"""
+Prometheus metrics for requests and the paths behind them.
+
+Metrics are `prometheus_client` counters, gauges and histograms; recording one is a dict lookup and
+an add under a lock. `GET /api/metrics/` returns them in the text exposition format, to anyone when
+`DEBUG` is on and otherwise to `Authorization: Bearer <METRICS_TOKEN>`.
+
+With several worker processes (gunicorn workers, several daphnes) set the `PROMETHEUS_MULTIPROC_DIR`
+environment variable to a directory shared by them and emptied before they start. Each process then
+keeps its values in memory-mapped files there and the endpoint, whichever process serves it, sums
+them. The process running a worker should call `mark_process_dead(pid)` when one exits, or its
+WebSocket connections stay in the gauge.
+
+Recorded:
+
+* `MetricsMiddleware`: latency, status and database queries per request, labelled with the route's
+  URL name (`posts-detail`, `current_user`, ...).
+* `count_cache`: hits and misses per application cache (`objects`, `tags`, `graph`, ...).
+* `timed_email`: how long sending each kind of email takes, and whether it failed.
+* `WebSocketMetrics`: open and opened WebSocket connections.
+* Admission control, single-flight, view count and notification flushes and background jobs, at
+  their source.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse, HttpResponseNotFound
+from django.utils.crypto import constant_time_compare
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client import multiprocess
+
+REQUEST_DURATION = Histogram(
+    'api_request_duration_seconds', 'Time to respond, per route.', ['route', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+RESPONSES = Counter('api_responses', 'Responses per route and status code.', ['route', 'method', 'status'])
+REQUEST_QUERIES = Histogram(
+    'api_request_db_queries', 'Database queries run by one request, per route.', ['route'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+CACHE_LOOKUPS = Counter('api_cache_lookups', 'Application cache lookups.', ['cache', 'result'])
+EMAIL_DURATION = Histogram(
+    'api_email_send_duration_seconds', 'Time to hand an email to the mail server.', ['kind', 'outcome'],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+WEBSOCKET_CONNECTIONS = Gauge('api_websocket_connections', 'Open WebSocket connections.', multiprocess_mode='livesum')
+WEBSOCKETS_OPENED = Counter('api_websockets_opened', 'Accepted WebSocket connections.')
+ADMISSION = Counter('api_admission', 'Admission control decisions per cost class.', ['cost', 'outcome'])
+ADMISSION_QUEUE = Histogram(
+    'api_admission_queue_seconds', 'Time admitted requests waited for a slot.', ['cost'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+SINGLE_FLIGHT = Counter('api_single_flight', 'Single-flight reads per route and outcome.', ['route', 'outcome'])
+VIEW_FLUSH_DURATION = Histogram('api_view_flush_duration_seconds', 'Time to write buffered view counts.')
+VIEW_FLUSH_POSTS = Counter('api_view_flush_posts', 'Post rows updated with buffered view counts.')
+NOTIFICATION_EVENTS = Counter('api_notification_events', 'Events buffered for notifications, per verb.', ['verb'])
+NOTIFICATION_FLUSH_DURATION = Histogram('api_notification_flush_duration_seconds', 'Time to write buffered notifications.')
+NOTIFICATION_FLUSH_GROUPS = Counter('api_notification_flush_groups', 'Notification groups upserted from the buffer.')
+JOBS = Counter('api_jobs', 'Background jobs run, per task and outcome.', ['task', 'outcome'])
+JOB_DURATION = Histogram(
+    'api_job_duration_seconds', 'Time to run a background job.', ['task'],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300),
+)
+
+
+def count_cache(cache, hits=0, misses=0):
+    if hits:
+        CACHE_LOOKUPS.labels(cache, 'hit').inc(hits)
+    if misses:
+        CACHE_LOOKUPS.labels(cache, 'miss').inc(misses)
+
+
+@contextmanager
+def timed_email(kind):
+    started = time.perf_counter()
+    outcome = 'failed'
+    try:
+        yield
+        outcome = 'sent'
+    finally:
+        EMAIL_DURATION.labels(kind, outcome).observe(time.perf_counter() - started)
+
+
+def mark_process_dead(pid):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
+
+
+class MetricsMiddleware:
+    """Times every request and counts its queries. Static files are served before it and not counted."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_query):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        route = match.view_name if match else 'unmatched'
+        REQUEST_DURATION.labels(route, request.method).observe(elapsed)
+        RESPONSES.labels(route, request.method, response.status_code).inc()
+        REQUEST_QUERIES.labels(route).observe(queries)
+        return response
+
+
+class WebSocketMetrics:
+    """ASGI middleware counting the WebSocket connections `app` accepts."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        accepted = False
+
+        async def counting_send(message):
+            nonlocal accepted
+            if message['type'] == 'websocket.accept' and not accepted:
+                accepted = True
+                WEBSOCKET_CONNECTIONS.inc()
+                WEBSOCKETS_OPENED.inc()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, counting_send)
+        finally:
+            if accepted:
+                WEBSOCKET_CONNECTIONS.dec()
+
+
+def metrics_view(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if not settings.DEBUG and not (token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')):
+        return HttpResponseNotFound()
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
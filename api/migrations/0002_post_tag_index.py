@@ -0,0 +1,78 @@
+# Generated by Django 5.0.7 on 2026-10-19 11:24
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_tag_index(apps, schema_editor):
+    PostTag = apps.get_model('api', 'PostTag')
+    Post = apps.get_model('api', 'Post')
+    Tag = apps.get_model('api', 'Tag')
+
+    PostTag.objects.update(
+        created_at=models.Subquery(
+            Post.objects.filter(id=models.OuterRef('post_id')).values('created_at')[:1]
+        )
+    )
+    Tag.objects.update(
+        post_count=models.functions.Coalesce(
+            models.Subquery(
+                PostTag.objects.filter(tag_id=models.OuterRef('id'))
+                .values('tag_id').annotate(total=models.Count('id')).values('total')[:1]
+            ),
+            0,
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        # `Post.tags` keeps its table; only the state learns about the explicit through model.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='PostTag',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.post')),
+                        ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.tag')),
+                    ],
+                    options={
+                        'db_table': 'api_post_tags',
+                        'unique_together': {('post', 'tag')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='post',
+                    name='tags',
+                    field=models.ManyToManyField(blank=True, related_name='tags', through='api.PostTag', to='api.tag'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='posttag',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='tag',
+            name='name',
+            field=models.CharField(db_index=True, max_length=100, null=True),
+        ),
+        migrations.RunPython(backfill_tag_index, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='posttag',
+            index=models.Index(fields=['tag', '-created_at'], name='api_posttag_tag_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.0.7 on 2026-10-19 11:40
+
+from django.db import migrations, models
+
+
+PREFIX_INDEXES = (
+    # Matches the `UPPER(col::text) LIKE UPPER('abc%')` that `istartswith` compiles to on PostgreSQL.
+    ('api_tag_name_prefix_idx', 'api_tag', 'name'),
+    ('api_user_username_prefix_idx', 'api_user', 'username'),
+)
+
+
+def create_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in PREFIX_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} (UPPER({column}::text) text_pattern_ops)'
+        )
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in PREFIX_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+def backfill_follower_counts(apps, schema_editor):
+    User = apps.get_model('api', 'User')
+    Follow = User.followers.through
+
+    User.objects.update(
+        follower_count=models.functions.Coalesce(
+            models.Subquery(
+                Follow.objects.filter(from_user_id=models.OuterRef('id'))
+                .values('from_user_id').annotate(total=models.Count('id')).values('total')[:1]
+            ),
+            0,
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_post_tag_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_follower_counts, migrations.RunPython.noop),
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
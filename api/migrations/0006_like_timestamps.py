@@ -0,0 +1,78 @@
+# Generated by Django 5.0.7 on 2026-10-19 12:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models, transaction
+
+from api.operations import AddIndexConcurrently
+
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def backfill_liked_at(apps, schema_editor):
+    """
+    Existing likes have no timestamp; date them to their post's creation, which keeps them out of
+    "recent likes" windows. Runs in committed batches by primary key so the live table is never
+    locked for the whole backfill, and only touches rows that predate this migration.
+    """
+    Like = apps.get_model('api', 'Like')
+    Post = apps.get_model('api', 'Post')
+
+    last_id = Like.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    post_created_at = Post.objects.filter(id=models.OuterRef('post_id')).values('created_at')[:1]
+
+    for start in range(0, last_id, BACKFILL_BATCH_SIZE):
+        with transaction.atomic(using=schema_editor.connection.alias):
+            Like.objects.filter(id__gt=start, id__lte=start + BACKFILL_BATCH_SIZE).update(
+                liked_at=models.Subquery(post_created_at)
+            )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('api', '0005_delta_sync'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # `Post.likes` keeps its table; only the state learns about the explicit through model.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='Like',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.post')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'api_post_likes',
+                        'unique_together': {('post', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='post',
+                    name='likes',
+                    field=models.ManyToManyField(blank=True, related_name='likes', through='api.Like', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='like',
+            name='liked_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_liked_at, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='like',
+            index=models.Index(fields=['user', '-liked_at'], name='api_like_user_recent_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='like',
+            index=models.Index(fields=['post', 'liked_at'], name='api_like_post_time_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.7 on 2026-10-19 16:05
+
+from django.db import migrations
+
+
+def create_email_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # Serves the admin's `^email` search (`istartswith`), like the indexes of 0003_prefix_autocomplete.
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS api_user_email_prefix_idx ON api_user (UPPER(email::text) text_pattern_ops)'
+    )
+
+
+def drop_email_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS api_user_email_prefix_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_like_timestamps'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_email_prefix_index, drop_email_prefix_index),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.7 on 2026-10-19 17:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_soft_delete'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostSimilarity',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='similarity', serialize=False, to='api.post')),
+                ('similar_ids', models.BinaryField(default=bytes)),
+                ('scores', models.BinaryField(default=bytes)),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
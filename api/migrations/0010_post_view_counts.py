@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-19 17:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_post_similarity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='impression_count',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='view_count',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-19 12:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_post_view_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_media',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.7 on 2026-10-19 13:09
+
+import api.json_filters
+from django.db import migrations, models
+
+from api.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('api', '0013_notifications'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='post',
+            index=models.Index(api.json_filters.JSONKey('thumbnail', 'diet'), name='api_post_thumbnail_diet_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='post',
+            index=models.Index(api.json_filters.JSONKey('thumbnail', 'cuisine'), name='api_post_thumbnail_cuisine_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(api.json_filters.JSONKey('metadata', 'diet'), name='api_user_metadata_diet_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(api.json_filters.JSONKey('metadata', 'cuisine'), name='api_user_metadata_cuisine_idx'),
+        ),
+    ]
@@ -3,6 +3,14 @@ API MODELS
 `User`
 `Tag`
 `Post`
+`PostTag`
+`Like`
+`PostSimilarity`
+`Comment`
+`Notification`
+`Job`
+`SyncEvent`
+`AccountDeletion`
 
 ```py AbstractBaseUser
 class User(AbstractUser):
@@ -27,8 +35,14 @@ from django.utils import timezone
 
 from django.utils.translation import gettext_lazy as _
 
+from api.json_filters import key_indexes
+
 
 class UserManager(BaseUserManager):
+    def get_queryset(self):
+        """Soft-deleted accounts are hidden everywhere until `api.moderation` purges them."""
+        return super().get_queryset().filter(deleted_at=None)
+
     @abstractmethod
     def create_user(self, email, password=None, **extra_fields):
         if not email:
@@ -51,6 +65,7 @@ class UserManager(BaseUserManager):
 class User(AbstractBaseUser, PermissionsMixin):
 
     objects = UserManager()
+    all_objects = models.Manager()
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, unique=True)
     email = models.EmailField(unique=True)
@@ -59,12 +74,16 @@ class User(AbstractBaseUser, PermissionsMixin):
     phone = models.CharField(max_length=30, blank=True, null=True)
     username = models.CharField(max_length=40, blank=True, null=True, unique=True)
     avatar = models.CharField(null=True, blank=True, max_length=2000)
+    # An uploaded avatar's size, placeholder and variants (`api.media`); `avatar` is its original.
+    avatar_media = models.JSONField(null=True, blank=True)
     followers = models.ManyToManyField(
         'self', related_name='following', symmetrical=False, blank=True
     )
     followed_tags = models.ManyToManyField('Tag', related_name='followed_by', blank=True)
+    follower_count = models.PositiveIntegerField(default=0)
     metadata = models.JSONField(default=dict, null=True, blank=True)
     joined = models.DateTimeField(auto_now_add=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
 
     is_active = models.BooleanField(default=False)
     is_staff = models.BooleanField(default=False)
@@ -92,6 +111,9 @@ class User(AbstractBaseUser, PermissionsMixin):
                 return True
         return False
 
+    class Meta:
+        indexes = key_indexes('user')
+
     USERNAME_FIELD = 'email'
 
     REQUIRED_FIELDS = ['username']
@@ -102,32 +124,260 @@ class User(AbstractBaseUser, PermissionsMixin):
 
 
 class Tag(models.Model):
-    name = models.CharField(max_length=100, null=True)
+    name = models.CharField(max_length=100, null=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    post_count = models.PositiveIntegerField(default=0)
 
     def __str__(self) -> str:
         return self.name
     
 
+class PostQuerySet(models.QuerySet):
+    def liked_between(self, start, end):
+        """Posts liked within `[start, end]`, annotated with that window's `likes_count`.
+
+        Bounding `liked_at` on both sides lets PostgreSQL prune `api_post_likes` partitions (`api.partitions`).
+        """
+        return self.filter(
+            like__liked_at__range=(start, end)
+        ).annotate(
+            likes_count=models.Count('like')
+        )
+
+    def with_related(self):
+        """Posts with what `PostSerializer` reads prefetched: a fixed number of queries per page."""
+        return self.select_related('author').prefetch_related(
+            'likes', 'tags', 'author__followers', 'author__following'
+        )
+
+
+class PostManager(models.Manager.from_queryset(PostQuerySet)):
+    def get_queryset(self):
+        """Soft-deleted posts are hidden from every feed until `api.moderation` purges them."""
+        return super().get_queryset().filter(deleted_at=None)
+
+
 class Post(models.Model):
-    
+
+    objects = PostManager()
+    all_objects = PostQuerySet.as_manager()
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, null=True, blank=True)
     title = models.CharField(max_length=1000, null=True)
     short_description = models.TextField(null=True, blank=True)
     content = models.TextField()
     thumbnail = models.JSONField(default=dict, null=True, blank=True)
     video = models.CharField(max_length=2000, null=True, blank=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name="posts")
-    likes = models.ManyToManyField(User, blank=True, related_name="likes")
-    tags = models.ManyToManyField(Tag, related_name="tags", blank=True)
+    likes = models.ManyToManyField(User, blank=True, related_name="likes", through='Like')
+    tags = models.ManyToManyField(Tag, related_name="tags", blank=True, through='PostTag')
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    # Buffered and flushed in bulk by `api.impressions`, so they trail live traffic by a few seconds.
+    view_count = models.PositiveBigIntegerField(default=0)
+    impression_count = models.PositiveBigIntegerField(default=0)
+    # Comments and replies, kept by `api.comments`.
+    comment_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at'], name='api_post_deleted_idx', condition=models.Q(deleted_at__isnull=False)),
+            *key_indexes('post'),
+        ]
 
     def __str__(self):
         return self.title if self.title else self.short_description if self.short_description else self.content[:100]
 
 
+class PostTag(models.Model):
+    """Through table of `Post.tags`.
+
+    `created_at` mirrors the post's `created_at` so a tag page is a range read on `(tag_id, created_at)`.
+    """
+    post = models.ForeignKey(Post, on_delete=models.CASCADE)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'api_post_tags'
+        unique_together = ('post', 'tag')
+        indexes = [
+            models.Index(fields=['tag', '-created_at'], name='api_posttag_tag_recent_idx'),
+        ]
+
+
+class Like(models.Model):
+    """Through table of `Post.likes`, timestamped so favorites and trending can be windowed by like time."""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    liked_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'api_post_likes'
+        unique_together = ('post', 'user')
+        indexes = [
+            models.Index(fields=['user', '-liked_at'], name='api_like_user_recent_idx'),
+            models.Index(fields=['post', 'liked_at'], name='api_like_post_time_idx'),
+        ]
+
+
+class PostSimilarity(models.Model):
+    """The posts most like `post`, best first, precomputed by `api.similar.build`.
+
+    `similar_ids` packs their 16-byte UUIDs and `scores` their float32 similarities, one row per post.
+    """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='similarity')
+    similar_ids = models.BinaryField(default=bytes)
+    scores = models.BinaryField(default=bytes)
+    computed_at = models.DateTimeField(default=timezone.now)
+
+
+class Comment(models.Model):
+    """A comment on a post, or a reply to one. See `api.comments`.
+
+    `path` is the IDs of its ancestors and its own, `COMMENT_PATH_SEGMENT` base-36 digits each, so a
+    thread is a range of the `(post_id, path)` index, in reading order. `reply_count` counts direct replies.
+    """
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
+    author = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='comments')
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
+    path = models.CharField(max_length=255)
+    depth = models.PositiveSmallIntegerField(default=0)
+    content = models.TextField()
+    reply_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'path'], name='api_comment_thread_idx'),
+            models.Index(fields=['post', '-id'], name='api_comment_top_level_idx', condition=models.Q(parent=None)),
+        ]
+
+    def __str__(self):
+        return self.content[:100]
+
+
+class Notification(models.Model):
+    """Events of one kind about one thing, grouped for their recipient. See `api.notifications`.
+
+    `target_id` is the liked post for likes and the recipient for follows. `actor_count` counts the
+    actors since the recipient last read the group, and `last_actor_id` is the latest of them.
+    """
+
+    LIKE = 'like'
+    FOLLOW = 'follow'
+    VERB_CHOICES = (
+        (LIKE, _('Like')),
+        (FOLLOW, _('Follow')),
+    )
+
+    # The group constraint's index serves lookups by recipient.
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications', db_index=False)
+    verb = models.CharField(max_length=10, choices=VERB_CHOICES)
+    target_id = models.UUIDField()
+    last_actor_id = models.UUIDField(null=True)
+    actor_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+    read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['recipient', 'verb', 'target_id'], name='api_notification_group_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['recipient', '-updated_at', '-id'], name='api_notification_feed_idx'),
+            models.Index(fields=['recipient'], name='api_notification_unread_idx', condition=models.Q(read_at=None)),
+        ]
+
+
+class Job(models.Model):
+    """A unit of deferred work for `python manage.py run_jobs`. See `api.jobs`."""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    DEAD = 'dead'
+    STATUS_CHOICES = (
+        (QUEUED, _('Queued')),
+        (RUNNING, _('Running')),
+        (DONE, _('Done')),
+        (DEAD, _('Dead')),
+    )
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, null=True, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='api_job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
+
+
+class SyncEvent(models.Model):
+    """Append-only change log behind `/api/sync/`. The auto-increment `id` is the sync cursor.
+
+    `user_id` is whose change it is: the author for posts, the liker for likes and the follower
+    for follows. `delete` events are the tombstones of removed posts, likes and follows.
+    """
+
+    POST = 'post'
+    LIKE = 'like'
+    FOLLOW = 'follow'
+    KIND_CHOICES = (
+        (POST, _('Post')),
+        (LIKE, _('Like')),
+        (FOLLOW, _('Follow')),
+    )
+
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    ACTION_CHOICES = (
+        (UPSERT, _('Upsert')),
+        (DELETE, _('Delete')),
+    )
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    user_id = models.UUIDField(null=True)
+    object_id = models.UUIDField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_id', 'id'], name='api_syncevent_user_idx'),
+        ]
+
+
+class AccountDeletion(models.Model):
+    """Progress of purging a soft-deleted account, stage by stage. See `api.moderation`."""
+
+    user_id = models.UUIDField(unique=True)
+    stage = models.CharField(max_length=20)
+    progress = models.JSONField(default=dict, blank=True)
+    requested_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'Deletion of {self.user_id} ({self.stage})'
+
+
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_auth_token(sender, instance=None, created=False, **kwargs):
     if created:
-        Token.objects.create(user=instance)
+        from api import jobs
+        jobs.enqueue('create_auth_token', {'user_id': str(instance.pk)}, key=f'auth-token:{instance.pk}')
@@ -0,0 +1,228 @@
+"""
+Deleting posts and accounts.
+
+Deleting through the ORM loads every related row and sends signals per object, all in one
+transaction, so deleting a prolific author locks the hot tables for as long as it takes. Deletion
+is split in two instead:
+
+* Soft delete, right away: `deleted_at` is set, and the default managers (`Post.objects`,
+  `User.objects`) hide the posts or account from every feed, search, profile and login. Deleted
+  posts are tombstoned for sync in the same transaction.
+* Purge, in the background: `purge_deleted_posts` and `purge_account` jobs delete related rows in
+  batches of `PURGE_BATCH_SIZE`, with one statement per table and one transaction per batch. Each
+  batch decrements `Tag.post_count`, recounts follower counts, invalidates follow caches and tag
+  pages, and writes sync tombstones. A job stops after `PURGE_BATCHES_PER_JOB` batches and queues
+  its continuation, so no single job holds a worker (or its lock) for long. Account purges record
+  their progress, stage by stage, on `AccountDeletion`.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from api import graph, jobs, media, objects, sync, tags
+from api.constants import PURGE_BATCH_SIZE, PURGE_BATCHES_PER_JOB
+from api.models import AccountDeletion, Comment, Like, Notification, Post, PostSimilarity, PostTag, SyncEvent, Tag, User
+
+Follow = User.followers.through
+TagFollow = User.followed_tags.through
+
+
+def soft_delete_posts(queryset):
+    """Hide the posts in `queryset` now and queue their purge. Returns how many were hidden."""
+    queryset = queryset.filter(deleted_at=None)
+    with transaction.atomic():
+        posts = list(queryset.select_for_update().values_list('id', 'author_id'))
+        post_ids = [post_id for post_id, _ in posts]
+        tag_ids = set(PostTag.objects.filter(post_id__in=post_ids).values_list('tag_id', flat=True))
+        count = Post.objects.filter(id__in=post_ids).update(deleted_at=timezone.now())
+        # Sync clients drop the posts now rather than at the purge.
+        SyncEvent.objects.bulk_create([
+            SyncEvent(kind=SyncEvent.POST, action=SyncEvent.DELETE, user_id=author_id, object_id=post_id)
+            for post_id, author_id in posts
+        ])
+    if count:
+        tags.invalidate_pages(tag_ids)
+        objects.invalidate_posts(post_ids)
+        transaction.on_commit(lambda: jobs.enqueue('purge_deleted_posts'))
+    return count
+
+
+def soft_delete_account(user):
+    """Deactivate and hide `user` and their posts now, and queue the purge of everything they own."""
+    with transaction.atomic():
+        User.objects.filter(id=user.id).update(deleted_at=timezone.now(), is_active=False)
+        soft_delete_posts(Post.objects.filter(author_id=user.id))
+        deletion, _ = AccountDeletion.objects.get_or_create(user_id=user.id, defaults={'stage': STAGES[0][0]})
+    graph.invalidate([user.id])
+    transaction.on_commit(lambda: jobs.enqueue('purge_account', {'deletion_id': deletion.id}))
+    return deletion
+
+
+def purge_deleted_posts(author_id=None, max_batches=PURGE_BATCHES_PER_JOB):
+    """Purge soft-deleted posts (of `author_id`, if given). Returns `(purged, done)`."""
+    purged = 0
+    for _ in range(max_batches):
+        removed = _purge_posts(author_id)
+        purged += removed
+        if removed < PURGE_BATCH_SIZE:
+            return purged, True
+    return purged, False
+
+
+def purge_account(deletion_id, max_batches=PURGE_BATCHES_PER_JOB):
+    """Run up to `max_batches` batches of an account purge. Returns whether it finished."""
+    deletion = AccountDeletion.objects.get(id=deletion_id)
+    stages = [name for name, _ in STAGES]
+
+    for _ in range(max_batches):
+        if deletion.finished_at:
+            return True
+
+        removed = dict(STAGES)[deletion.stage](deletion.user_id)
+        deletion.progress[deletion.stage] = deletion.progress.get(deletion.stage, 0) + removed
+        if removed < PURGE_BATCH_SIZE:
+            position = stages.index(deletion.stage) + 1
+            if position == len(stages):
+                deletion.finished_at = timezone.now()
+            else:
+                deletion.stage = stages[position]
+        deletion.save(update_fields=['stage', 'progress', 'finished_at'])
+
+    return deletion.finished_at is not None
+
+
+@transaction.atomic
+def _purge_posts(author_id=None):
+    queryset = Post.all_objects.filter(deleted_at__isnull=False)
+    if author_id is not None:
+        queryset = queryset.filter(author_id=author_id)
+    # Concurrent purges skip each other's batches rather than double-decrementing tag counts.
+    posts = list(queryset.select_for_update(skip_locked=True).values_list('id', 'author_id', 'thumbnail')[:PURGE_BATCH_SIZE])
+    if not posts:
+        return 0
+
+    post_ids = [post_id for post_id, _, _ in posts]
+    links = PostTag.objects.filter(post_id__in=post_ids)
+
+    tag_ids = list(links.values_list('tag_id', flat=True).distinct())
+    removed = links.filter(tag_id=OuterRef('id')).values('tag_id').annotate(total=Count('id')).values('total')
+    Tag.objects.filter(id__in=tag_ids).update(post_count=Greatest(F('post_count') - Subquery(removed), 0))
+
+    SyncEvent.objects.bulk_create([
+        SyncEvent(kind=SyncEvent.POST, action=SyncEvent.DELETE, user_id=author_id, object_id=post_id)
+        for post_id, author_id, _ in posts
+    ])
+
+    sync.record_unlikes(Like.objects.filter(post_id__in=post_ids).values_list('user_id', 'post_id'))
+
+    # Nothing listens to deletes of the through rows, so these are single DELETEs. Posts have
+    # receivers (their work is done above), which `_raw_delete` skips.
+    Like.objects.filter(post_id__in=post_ids).delete()
+    links.delete()
+    PostSimilarity.objects.filter(post_id__in=post_ids).delete()
+    # Whole threads go, so replies need no cascading through `parent`.
+    post_comments = Comment.objects.filter(post_id__in=post_ids)
+    post_comments._raw_delete(post_comments.db)
+    Notification.objects.filter(
+        recipient_id__in={author_id for _, author_id, _ in posts}, verb=Notification.LIKE, target_id__in=post_ids,
+    ).delete()
+    Post.all_objects.filter(id__in=post_ids)._raw_delete(Post.all_objects.db)
+    media.discard([thumbnail for _, _, thumbnail in posts])
+
+    transaction.on_commit(lambda: tags.invalidate_pages(tag_ids))
+    return len(posts)
+
+
+@transaction.atomic
+def _purge_following(user_id):
+    """Edges where `user_id` is the follower: the followed users lose a follower."""
+    edges = list(Follow.objects.filter(to_user_id=user_id).values_list('id', 'from_user_id')[:PURGE_BATCH_SIZE])
+    followed_ids = [followed_id for _, followed_id in edges]
+    Follow.objects.filter(id__in=[edge_id for edge_id, _ in edges]).delete()
+    graph.refresh_follower_counts(followed_ids)
+    graph.invalidate(followed_ids)
+    return len(edges)
+
+
+@transaction.atomic
+def _purge_followers(user_id):
+    """Edges where `user_id` is followed: their followers' `following` sets shrink."""
+    edges = list(Follow.objects.filter(from_user_id=user_id).values_list('id', 'to_user_id')[:PURGE_BATCH_SIZE])
+    follower_ids = [follower_id for _, follower_id in edges]
+    Follow.objects.filter(id__in=[edge_id for edge_id, _ in edges]).delete()
+    graph.invalidate(follower_ids)
+    # Tell the followers' synced clients the follow is gone.
+    SyncEvent.objects.bulk_create([
+        SyncEvent(kind=SyncEvent.FOLLOW, action=SyncEvent.DELETE, user_id=follower_id, object_id=user_id)
+        for follower_id in follower_ids
+    ])
+    return len(edges)
+
+
+@transaction.atomic
+def _purge_tag_follows(user_id):
+    ids = list(TagFollow.objects.filter(user_id=user_id).values_list('id', flat=True)[:PURGE_BATCH_SIZE])
+    TagFollow.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+@transaction.atomic
+def _purge_likes(user_id):
+    likes = list(Like.objects.filter(user_id=user_id).values_list('id', 'post_id')[:PURGE_BATCH_SIZE])
+    Like.objects.filter(id__in=[like_id for like_id, _ in likes]).delete()
+    objects.invalidate_posts([post_id for _, post_id in likes])
+    return len(likes)
+
+
+@transaction.atomic
+def _purge_comments(user_id):
+    """Comments on other people's posts stay, so their threads do, without an author."""
+    ids = list(Comment.objects.filter(author_id=user_id).values_list('id', flat=True)[:PURGE_BATCH_SIZE])
+    Comment.objects.filter(id__in=ids).update(author=None)
+    return len(ids)
+
+
+@transaction.atomic
+def _purge_notifications(user_id):
+    """Notifications the user received. Those they caused elsewhere keep their counts."""
+    ids = list(Notification.objects.filter(recipient_id=user_id).values_list('id', flat=True)[:PURGE_BATCH_SIZE])
+    Notification.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+@transaction.atomic
+def _purge_tokens(user_id):
+    ids = list(OutstandingToken.objects.filter(user_id=user_id).values_list('id', flat=True)[:PURGE_BATCH_SIZE])
+    # Cascades to the (at most one per token) blacklist rows.
+    OutstandingToken.objects.filter(id__in=ids).delete()
+    if len(ids) < PURGE_BATCH_SIZE:
+        Token.objects.filter(user_id=user_id).delete()
+    return len(ids)
+
+
+@transaction.atomic
+def _purge_user(user_id):
+    avatar = User.all_objects.filter(id=user_id).values_list('avatar_media', flat=True).first()
+    # What is left to cascade (group and permission links) is small.
+    User.all_objects.filter(id=user_id).delete()
+    media.discard([avatar])
+    graph.invalidate([user_id], tag_user_ids=[user_id])
+    return 1
+
+
+# The account purge, in order. Edges go first since they are what other users still see.
+STAGES = (
+    ('following', _purge_following),
+    ('followers', _purge_followers),
+    ('tag_follows', _purge_tag_follows),
+    ('likes', _purge_likes),
+    ('posts', _purge_posts),
+    ('comments', _purge_comments),
+    ('notifications', _purge_notifications),
+    ('tokens', _purge_tokens),
+    ('account', _purge_user),
+)
@@ -0,0 +1,291 @@
+"""
+Notifications: "cook3 and 312 others liked your post", "cook3 started following you".
+
+A row per event would be a write per like, thousands a minute for the author of a viral post, and
+a feed nobody can read. Events are grouped instead: one `Notification` per `(recipient, verb,
+target)`, holding how many actors there were since the recipient last read it and who came last.
+
+* `notify` buffers events in memory, per process, deduplicating actors. A background thread flushes
+  every `NOTIFICATION_FLUSH_INTERVAL` (sooner past `NOTIFICATION_FLUSH_MAX_GROUPS` groups) with one
+  `INSERT ... ON CONFLICT (recipient_id, verb, target_id) DO UPDATE` per `NOTIFICATION_FLUSH_BATCH`
+  groups, on PostgreSQL and SQLite alike: unread groups add to their count, read ones start over.
+  All the likes a post gets in an interval are one row write.
+* `unread_count` counts over the partial `WHERE read_at IS NULL` index, stopping at
+  `NOTIFICATION_UNREAD_CAP` ("99+"), and is cached until a flush or a read changes it.
+* With `NOTIFICATION_WEBSOCKETS`, a flush also sends the changed groups to their recipients' sockets
+  (`ws/notifications/?token=<access token>`, `api.consumers.NotificationConsumer`) over the channel
+  layer.
+
+As with `api.impressions`, a crashed process loses at most one interval of events, a clean exit
+flushes, and a failed flush puts its events back, for up to `NOTIFICATION_FLUSH_MAX_ATTEMPTS` flushes.
+Groups whose recipient was deleted in the meantime are dropped rather than retried. Actors are
+deduplicated within an interval only, so liking, unliking and liking again in different intervals
+counts twice.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, IntegrityError, close_old_connections, connection
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api import metrics, objects
+from api.constants import (
+    NOTIFICATION_FLUSH_BATCH, NOTIFICATION_FLUSH_INTERVAL, NOTIFICATION_FLUSH_MAX_ATTEMPTS, NOTIFICATION_FLUSH_MAX_GROUPS,
+    NOTIFICATION_UNREAD_CACHE_TIMEOUT, NOTIFICATION_UNREAD_CAP,
+)
+from api.models import Notification, User
+
+logger = logging.getLogger(__name__)
+
+LIKE = Notification.LIKE
+FOLLOW = Notification.FOLLOW
+
+COLUMNS = ('id', 'recipient_id', 'verb', 'target_id', 'last_actor_id', 'actor_count', 'updated_at', 'read_at')
+
+_lock = threading.Lock()
+# {(recipient ID, verb, target ID): {actor ID: None}}, actors in the order they came.
+_pending = {}
+# {(recipient ID, verb, target ID): failed flushes}, for the groups put back.
+_attempts = {}
+_wake = threading.Event()
+_flusher_pid = None
+
+
+def notify(verb, recipient_id, target_id, actor_id):
+    """Tell `recipient_id` that `actor_id` did `verb` to `target_id`. Nobody is told about themselves."""
+    if recipient_id is None or recipient_id == actor_id:
+        return
+    key = (str(recipient_id), verb, str(target_id))
+    with _lock:
+        actors = _pending.setdefault(key, {})
+        actors.pop(str(actor_id), None)
+        actors[str(actor_id)] = None
+        pending = len(_pending)
+
+    metrics.NOTIFICATION_EVENTS.labels(verb).inc()
+    _start_flusher()
+    if pending >= NOTIFICATION_FLUSH_MAX_GROUPS:
+        _wake.set()
+
+
+def notify_follows(follower_id, followed_ids):
+    for followed_id in followed_ids:
+        notify(FOLLOW, followed_id, followed_id, follower_id)
+
+
+def _take():
+    global _pending
+    with _lock:
+        pending, _pending = _pending, {}
+    return pending
+
+
+def _put_back(groups):
+    dropped = 0
+    with _lock:
+        for key, actors in groups.items():
+            _attempts[key] = _attempts.get(key, 0) + 1
+            if _attempts[key] >= NOTIFICATION_FLUSH_MAX_ATTEMPTS:
+                del _attempts[key]
+                dropped += 1
+                continue
+            merged = _pending.setdefault(key, {})
+            for actor_id in actors:
+                merged.setdefault(actor_id, None)
+    if dropped:
+        logger.error('Dropped %d notification groups after %d failed flushes.', dropped, NOTIFICATION_FLUSH_MAX_ATTEMPTS)
+
+
+def _written(groups):
+    if _attempts:
+        with _lock:
+            for key, _ in groups:
+                _attempts.pop(key, None)
+
+
+def _upsert(groups, now):
+    """One statement for `groups` (`[(key, actors)]`)."""
+    meta = Notification._meta
+    fields = [meta.get_field(name) for name in ('recipient', 'verb', 'target_id', 'last_actor_id', 'actor_count', 'created_at', 'updated_at')]
+    quote = connection.ops.quote_name
+    table = quote(meta.db_table)
+
+    params = []
+    for (recipient_id, verb, target_id), actors in groups:
+        values = (recipient_id, verb, target_id, next(reversed(actors)), len(actors), now, now)
+        params.extend(field.get_db_prep_save(value, connection) for field, value in zip(fields, values))
+    row = '(' + ', '.join(['%s'] * len(fields)) + ')'
+
+    sql = (
+        f'INSERT INTO {table} ({", ".join(quote(field.column) for field in fields)}) '
+        f'VALUES {", ".join([row] * len(groups))} '
+        f'ON CONFLICT (recipient_id, verb, target_id) DO UPDATE SET '
+        f'actor_count = CASE WHEN {table}.read_at IS NULL '
+        f'THEN {table}.actor_count + excluded.actor_count ELSE excluded.actor_count END, '
+        f'last_actor_id = excluded.last_actor_id, updated_at = excluded.updated_at, read_at = NULL'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _write(batch, now):
+    """Upsert `batch`, less the groups of recipients deleted since their events. Returns the groups written."""
+    try:
+        _upsert(batch, now)
+        return batch
+    except IntegrityError:
+        recipient_ids = {str(user_id) for user_id in User.objects.filter(
+            id__in={recipient_id for (recipient_id, _, _), _ in batch}).values_list('id', flat=True)}
+        kept = [group for group in batch if group[0][0] in recipient_ids]
+        if len(kept) == len(batch):
+            raise
+        logger.warning('Dropped %d notification groups of deleted users.', len(batch) - len(kept))
+        if kept:
+            _upsert(kept, now)
+        return kept
+
+
+def flush():
+    """Write the pending events. Returns `(groups, statements)`."""
+    started = time.perf_counter()
+    pending = _take()
+    # Sorted, so concurrent flushes lock rows in the same order.
+    groups = sorted(pending.items())
+    now = timezone.now()
+
+    statements = 0
+    written = []
+    for start in range(0, len(groups), NOTIFICATION_FLUSH_BATCH):
+        try:
+            written += _write(groups[start:start + NOTIFICATION_FLUSH_BATCH], now)
+        except DatabaseError:
+            logger.exception('Flushing notifications failed, retrying with the next flush.')
+            _put_back(dict(groups[start:]))
+            break
+        statements += 1
+    groups = written
+
+    if groups:
+        _written(groups)
+        recipient_ids = {recipient_id for (recipient_id, _, _), _ in groups}
+        cache.delete_many([_unread_key(recipient_id) for recipient_id in recipient_ids])
+        if settings.NOTIFICATION_WEBSOCKETS:
+            _push([key for key, _ in groups])
+        elapsed = time.perf_counter() - started
+        metrics.NOTIFICATION_FLUSH_DURATION.observe(elapsed)
+        metrics.NOTIFICATION_FLUSH_GROUPS.inc(len(groups))
+        logger.debug('Flushed %d notification groups in %d statements in %.3fs', len(groups), statements, elapsed)
+    return len(groups), statements
+
+
+def _push(keys):
+    """Send the groups at `keys` to their recipients' sockets, if there is a channel layer."""
+    from channels.layers import get_channel_layer
+
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    for start in range(0, len(keys), NOTIFICATION_FLUSH_BATCH):
+        match = Q()
+        for recipient_id, verb, target_id in keys[start:start + NOTIFICATION_FLUSH_BATCH]:
+            match |= Q(recipient_id=recipient_id, verb=verb, target_id=target_id)
+        rows = list(Notification.objects.filter(match).values(*COLUMNS))
+        for row, data in zip(rows, serialize(rows, drop_missing=False)):
+            # Channel layers take plain types only; the cached payloads hold UUIDs.
+            message = {'type': 'notification.push', 'notification': json.loads(JSONRenderer().render(data))}
+            async_to_sync(layer.group_send)(group_name(row['recipient_id']), message)
+
+
+def group_name(user_id):
+    """The channel layer group of `user_id`'s sockets."""
+    return f'notifications.{user_id}'
+
+
+def serialize(rows, drop_missing=True):
+    """
+    Notification rows as the API returns them, with the latest actor and, for likes, the post. Likes
+    of posts that are gone are left out unless `drop_missing` is false.
+    """
+    actors = objects.get_users(list({str(row['last_actor_id']) for row in rows if row['last_actor_id'] is not None}))
+    posts = objects.get_posts(list({str(row['target_id']) for row in rows if row['verb'] == LIKE}))
+
+    results = []
+    for row in rows:
+        post = posts.get(str(row['target_id'])) if row['verb'] == LIKE else None
+        if drop_missing and row['verb'] == LIKE and post is None:
+            continue
+        results.append({
+            'id': row['id'],
+            'verb': row['verb'],
+            'actor': actors.get(str(row['last_actor_id'])),
+            # The others: "cook3 and 312 others liked your post".
+            'others': max(row['actor_count'] - 1, 0),
+            'post': post,
+            'unread': row['read_at'] is None,
+            'updated_at': row['updated_at'].isoformat().replace('+00:00', 'Z'),
+        })
+    return results
+
+
+def _unread_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def unread_count(user_id):
+    """Unread notification groups of `user_id`, up to `NOTIFICATION_UNREAD_CAP`."""
+    key = _unread_key(user_id)
+    count = cache.get(key)
+    if count is not None:
+        metrics.count_cache('notifications', hits=1)
+    else:
+        metrics.count_cache('notifications', misses=1)
+        count = Notification.objects.filter(recipient_id=user_id, read_at=None)[:NOTIFICATION_UNREAD_CAP].count()
+        cache.set(key, count, NOTIFICATION_UNREAD_CACHE_TIMEOUT)
+    return count
+
+
+def mark_read(user_id, ids=None):
+    """Mark `user_id`'s notifications (those in `ids`, if given) read. Returns how many were unread."""
+    unread = Notification.objects.filter(recipient_id=user_id, read_at=None)
+    if ids is not None:
+        unread = unread.filter(id__in=ids)
+    count = unread.update(read_at=timezone.now())
+    if count:
+        cache.delete(_unread_key(user_id))
+    return count
+
+
+def _run_flusher():
+    while True:
+        _wake.wait(NOTIFICATION_FLUSH_INTERVAL)
+        _wake.clear()
+        close_old_connections()
+        try:
+            flush()
+        except Exception:
+            logger.exception('Flushing notifications failed.')
+
+
+def _start_flusher():
+    """Start this process's flush thread, once (again after a fork: threads do not survive it)."""
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_run_flusher, name='notifications', daemon=True).start()
+
+
+atexit.register(flush)
@@ -0,0 +1,111 @@
+"""
+Per-object payload cache, and multi-get of posts and users by ID.
+
+Clients holding ID lists (a post's `likes`, a user's `followers` and `following`) used to resolve them
+with one `retrieve` per ID. `get_posts` and `get_users` resolve a whole list at once:
+
+* Each object's serialized payload is cached under its ID (read-through): one `cache.get_many` for the
+  batch, then one `FastSerializer` pass (a query per table) over the misses.
+* A cached post leaves its author out. Authors are resolved through the user cache on every read, so a
+  changed user never has to find the posts embedding them.
+* Payloads are dropped when the object changes: saves of posts and users, like and tag changes, soft
+  deletes, and follow changes (`graph.invalidate`). `OBJECT_CACHE_TIMEOUT` bounds whatever slips past,
+  such as a `QuerySet.update` from the admin.
+"""
+
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+
+from api import metrics
+from api.constants import OBJECT_CACHE_TIMEOUT
+from api.fast_serializers import FastPostSerializer, FastUserSerializer
+from api.models import Like, Post, PostTag, User
+
+
+class _CachedPostSerializer(FastPostSerializer):
+    """Posts with an empty `author`, which is filled in from the user cache when read."""
+
+    def load_authors(self, rows):
+        return {}
+
+
+def _key(kind, object_id):
+    return f'objects:{kind}:{object_id}'
+
+
+def _read_through(kind, ids, load):
+    """Return `{id: entry}` for those of `ids` that exist, loading cache misses with `load(ids)`."""
+    keys = {object_id: _key(kind, object_id) for object_id in ids}
+    cached = cache.get_many(keys.values())
+    found = {object_id: cached[key] for object_id, key in keys.items() if key in cached}
+
+    missing = [object_id for object_id in ids if object_id not in found]
+    metrics.count_cache('objects', hits=len(found), misses=len(missing))
+    if missing:
+        loaded = load(missing)
+        cache.set_many({keys[object_id]: entry for object_id, entry in loaded.items()}, OBJECT_CACHE_TIMEOUT)
+        found.update(loaded)
+    return found
+
+
+def _load_users(ids):
+    users = FastUserSerializer(User.objects.filter(id__in=ids), many=True).data
+    return {user['id']: user for user in users}
+
+
+def _load_posts(ids):
+    rows = list(Post.objects.filter(id__in=ids).values(*_CachedPostSerializer.columns))
+    posts = _CachedPostSerializer().serialize(rows)
+    return {
+        post['id']: (None if row['author_id'] is None else str(row['author_id']), post)
+        for row, post in zip(rows, posts)
+    }
+
+
+def get_users(ids):
+    """`{user ID: UserSerializer payload}` for those of `ids` (strings) that exist."""
+    return _read_through('user', ids, _load_users)
+
+
+def get_posts(ids):
+    """`{post ID: PostSerializer payload}` for those of `ids` (strings) that exist."""
+    entries = _read_through('post', ids, _load_posts)
+    authors = get_users(list({author_id for author_id, _ in entries.values() if author_id is not None}))
+    # Replacing `author` keeps its position, so the payload renders like `PostSerializer`'s.
+    return {post_id: {**post, 'author': authors.get(author_id)} for post_id, (author_id, post) in entries.items()}
+
+
+def invalidate_posts(post_ids):
+    if post_ids:
+        cache.delete_many([_key('post', post_id) for post_id in post_ids])
+
+
+def invalidate_users(user_ids):
+    if user_ids:
+        cache.delete_many([_key('user', user_id) for user_id in user_ids])
+
+
+@receiver(post_save, sender=Post)
+def invalidate_saved_post(sender, instance, **kwargs):
+    invalidate_posts([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def invalidate_saved_user(sender, instance, **kwargs):
+    invalidate_users([instance.pk])
+
+
+@receiver(m2m_changed, sender=Like)
+@receiver(m2m_changed, sender=PostTag)
+def invalidate_post_links(sender, instance, action, pk_set=None, reverse=False, **kwargs):
+    # Forward: `post.likes.add(*users)`, `post.tags.set(...)`. Reverse: `user.likes.add(*posts)`,
+    # `tag.tags.add(*posts)`, where `pk_set` holds post IDs.
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_posts([instance.pk])
+    elif action == 'pre_clear':
+        field = 'user_id' if sender is Like else 'tag_id'
+        invalidate_posts(list(sender.objects.filter(**{field: instance.pk}).values_list('post_id', flat=True)))
+    elif action in ('post_add', 'post_remove'):
+        invalidate_posts(pk_set)
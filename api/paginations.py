@@ -1,7 +1,13 @@
-from rest_framework.pagination import PageNumberPagination
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from urllib.parse import urlparse, parse_qs
 from rest_framework.response import Response
 
+from api.constants import COMMENT_PAGE_SIZE, ESTIMATED_COUNT_THRESHOLD, NOTIFICATION_PAGE_SIZE
+
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 10
@@ -26,4 +32,78 @@ class NextPageNumberPagination(PageNumberPagination):
             'previous': self.get_page_number(self.request, self.page.paginator),  # Fix here
             'results': data
         })
-    
\ No newline at end of file
+
+
+class KnownCountPaginator(Paginator):
+    """A Django paginator that trusts a precomputed `count` (e.g. a denormalized counter) instead of running `COUNT(*)`."""
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            self.__dict__['count'] = count
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A Django paginator that counts an unfiltered queryset from PostgreSQL's planner estimate
+    (`pg_class.reltuples`, refreshed by autovacuum) once the table is past `ESTIMATED_COUNT_THRESHOLD`
+    rows. Filtered querysets and smaller tables are counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            connection = connections[queryset.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                        [queryset.model._meta.db_table],
+                    )
+                    estimate = cursor.fetchone()[0]
+                if estimate >= ESTIMATED_COUNT_THRESHOLD:
+                    return estimate
+        return super().count
+
+
+class KnownCountPagination(PageNumberPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None, count=None):
+        self.known_count = count
+        return super().paginate_queryset(queryset, request, view=view)
+
+    def django_paginator_class(self, object_list, per_page):
+        return KnownCountPaginator(object_list, per_page, count=self.known_count)
+
+
+class LikedAtCursorPagination(CursorPagination):
+    """Keyset pagination over favorites, newest like first. Expects a `liked_at` annotation."""
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-liked_at'
+
+
+class CommentCursorPagination(CursorPagination):
+    """Keyset pagination over a post's top-level comments, newest first (`api.comments`)."""
+    page_size = COMMENT_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-id'
+
+
+class ReplyCursorPagination(CommentCursorPagination):
+    """Keyset pagination over the comments below one, in thread order (`Comment.path`)."""
+    ordering = 'path'
+
+
+class NotificationCursorPagination(CursorPagination):
+    """Keyset pagination over a user's notifications, most recently updated first (`api.notifications`)."""
+    page_size = NOTIFICATION_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    # `id` breaks ties, so groups updated in the same instant are neither skipped nor repeated across pages.
+    ordering = ('-updated_at', '-id')
@@ -0,0 +1,184 @@
+"""
+Optional PostgreSQL declarative partitioning by month.
+
+Only `api_post_likes` (`Like`) is partitioned, by `liked_at`: it is the fastest growing table, nothing
+references it, and its hot queries (trending's 24h window, favorites by like time) are bounded by
+`liked_at`, so the planner prunes to the recent partitions. `api_post` cannot be partitioned the same
+way: PostgreSQL requires the partition key in every unique constraint, and the UUID primary key is
+referenced by likes, tags and the other relations.
+
+Partitioning is opt-in and driven by `python manage.py partitions`:
+
+* `convert` rebuilds the table as `PARTITION BY RANGE (liked_at)`, one partition per month plus a
+  default partition. The primary key becomes `(id, liked_at)` and the `(post_id, user_id)` unique
+  constraint becomes `(post_id, user_id, liked_at)`: PostgreSQL requires the partition key in every
+  unique constraint of a partitioned table, so the database no longer stops a user liking a post twice.
+  Writers check before inserting instead, under `lock_unique`, so that two concurrent likes of the
+  same post by the same user cannot both pass the check (`LikePostView`).
+* `create --ahead N` creates the next N monthly partitions ahead of time.
+* `archive --older-than N` detaches partitions older than N months into standalone `archive_*` tables
+  (or drops them with `--drop`). Archived likes stop counting towards like totals, and archive tables
+  have no foreign keys, so the posts and users they mention can still be deleted.
+"""
+
+import datetime
+import re
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.constants import PARTITION_MONTHS_AHEAD
+
+PARTITIONED_TABLES = {
+    'api_post_likes': {
+        'column': 'liked_at',
+        'columns': ('id', 'post_id', 'user_id', 'liked_at'),
+        'definition': '''
+            id bigint NOT NULL DEFAULT nextval('{table}_part_id_seq'),
+            post_id uuid NOT NULL REFERENCES api_post (id) DEFERRABLE INITIALLY DEFERRED,
+            user_id uuid NOT NULL REFERENCES api_user (id) DEFERRABLE INITIALLY DEFERRED,
+            liked_at timestamp with time zone NOT NULL,
+            PRIMARY KEY (id, liked_at),
+            UNIQUE (post_id, user_id, liked_at)
+        ''',
+        'indexes': (
+            'CREATE INDEX api_like_user_recent_idx ON {table} (user_id, liked_at DESC)',
+            'CREATE INDEX api_like_post_time_idx ON {table} (post_id, liked_at)',
+        ),
+    },
+}
+
+PARTITION_NAME = re.compile(r'_p(\d{4})_(\d{2})$')
+
+
+def month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(value, months):
+    month = value.month - 1 + months
+    return value.replace(year=value.year + month // 12, month=month % 12 + 1)
+
+
+def partition_name(table, start):
+    return f'{table}_p{start.year}_{start.month:02d}'
+
+
+def _lock_key(table, values):
+    return ':'.join([table, *(str(value) for value in values)])
+
+
+def lock_unique(table, *values):
+    """
+    Hold, until the end of the current transaction, a lock on the row of `table` unique on `values`.
+
+    Writers that check whether the row exists before inserting it take this first, which makes the
+    check and insert atomic without a unique constraint. A transaction-level advisory lock on
+    PostgreSQL; elsewhere tables are not partitioned and their unique constraints hold.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(hashtextextended(%s, 0))', [_lock_key(table, values)])
+
+
+def is_partitioned(table):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [table])
+        return cursor.fetchone() is not None
+
+
+def list_partitions(table):
+    """Names of the partitions attached to `table`."""
+    with connection.cursor() as cursor:
+        cursor.execute('''
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+            JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+            WHERE parent.relname = %s ORDER BY child.relname
+        ''', [table])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def create_partition(table, start):
+    """Create the monthly partition of `table` starting at `start`, if missing."""
+    name = partition_name(table, start)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)',
+            [start, add_months(start, 1)],
+        )
+    return name
+
+
+def ensure_partitions(table, since=None, ahead=PARTITION_MONTHS_AHEAD):
+    """Create monthly partitions from `since` (default: this month) through `ahead` months from now."""
+    current = month_start(timezone.now())
+    start = month_start(since) if since else current
+    created = []
+    while start <= add_months(current, ahead):
+        created.append(create_partition(table, start))
+        start = add_months(start, 1)
+    return created
+
+
+@transaction.atomic
+def convert(table):
+    """Rebuild `table` as a monthly range-partitioned table and copy its rows across."""
+    spec = PARTITIONED_TABLES[table]
+    column = spec['column']
+    columns = ', '.join(spec['columns'])
+    legacy = f'{table}_unpartitioned'
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {table} RENAME TO {legacy}')
+        cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS {table}_part_id_seq')
+        cursor.execute(f"SELECT setval('{table}_part_id_seq', COALESCE((SELECT MAX(id) FROM {legacy}), 0) + 1, false)")
+        # The legacy table keeps the index names until it is dropped.
+        for statement in spec['indexes']:
+            index = statement.split()[2]
+            cursor.execute(f'ALTER INDEX IF EXISTS {index} RENAME TO {index}_unpartitioned')
+        cursor.execute(f'CREATE TABLE {table} ({spec["definition"].format(table=table)}) PARTITION BY RANGE ({column})')
+        for statement in spec['indexes']:
+            cursor.execute(statement.format(table=table))
+        cursor.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+        cursor.execute(f'SELECT MIN({column}) FROM {legacy}')
+        oldest = cursor.fetchone()[0]
+
+    ensure_partitions(table, since=oldest)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {legacy}')
+        cursor.execute(f'DROP TABLE {legacy}')
+        cursor.execute(f'ALTER SEQUENCE {table}_part_id_seq OWNED BY {table}.id')
+
+
+def archive(table, older_than_months, drop=False):
+    """Detach (and rename to `archive_*`, or drop) monthly partitions older than `older_than_months`."""
+    cutoff = add_months(month_start(timezone.now()), -older_than_months)
+    archived = []
+
+    for name in list_partitions(table):
+        match = PARTITION_NAME.search(name)
+        if not match:
+            continue
+        start = datetime.datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=datetime.timezone.utc)
+        if start >= cutoff:
+            continue
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {name}')
+            if drop:
+                cursor.execute(f'DROP TABLE {name}')
+            else:
+                cursor.execute(f'ALTER TABLE {name} RENAME TO archive_{name}')
+                # Detached partitions keep their foreign keys, which would block deleting posts and users.
+                cursor.execute(
+                    "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+                    [f'archive_{name}'],
+                )
+                for (constraint,) in cursor.fetchall():
+                    cursor.execute(f'ALTER TABLE archive_{name} DROP CONSTRAINT {constraint}')
+        archived.append(name)
+
+    return archived
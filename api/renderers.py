@@ -0,0 +1,123 @@
+"""
+Binary renderers and parsers for the mobile clients.
+
+`MessagePackRenderer` is negotiated with `Accept: application/msgpack` (or `?format=msgpack`).
+Clients can ask for the dictionary-encoded variant with `Accept: application/msgpack; dedupe=1`
+(or `?dedupe=1`). In that mode every nested `author` object and every tag string within the
+response is stored once in a lookup table and replaced with its index:
+
+```py
+{
+    "authors": [{"id": "...", "username": "..."}, ...],
+    "tags": ["jollof", "rice", ...],
+    "data": {"count": 42, "results": [{"author": 0, "tags": [0, 1], ...}, ...]},
+}
+```
+"""
+
+import datetime
+import decimal
+import uuid
+
+import msgpack
+
+from django.db.models.query import QuerySet
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.mediatypes import _MediaType
+
+
+def _default(obj):
+    """Convert the few non-msgpack types that DRF leaves in `response.data`."""
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, QuerySet) or hasattr(obj, '__iter__'):
+        return list(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not msgpack serializable')
+
+
+class DictionaryEncoder:
+    """Deduplicate repeated `author` objects and tag strings within a single payload."""
+
+    def __init__(self):
+        self.authors = []
+        self.tags = []
+        self._author_index = {}
+        self._tag_index = {}
+
+    def encode(self, data):
+        return {
+            'authors': self.authors,
+            'tags': self.tags,
+            'data': self._walk(data),
+        }
+
+    def _walk(self, value):
+        if isinstance(value, dict):
+            encoded = {}
+            for key, item in value.items():
+                if key == 'author' and isinstance(item, dict) and 'id' in item:
+                    encoded[key] = self._author(item)
+                elif key == 'tags' and isinstance(item, list):
+                    encoded[key] = [self._tag(tag) if isinstance(tag, str) else self._walk(tag) for tag in item]
+                else:
+                    encoded[key] = self._walk(item)
+            return encoded
+        if isinstance(value, (list, tuple)):
+            return [self._walk(item) for item in value]
+        return value
+
+    def _author(self, author):
+        key = str(author['id'])
+        if key not in self._author_index:
+            self._author_index[key] = len(self.authors)
+            self.authors.append(author)
+        return self._author_index[key]
+
+    def _tag(self, tag):
+        if tag not in self._tag_index:
+            self._tag_index[tag] = len(self.tags)
+            self.tags.append(tag)
+        return self._tag_index[tag]
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        if self.wants_dictionary_encoding(accepted_media_type, renderer_context or {}):
+            data = DictionaryEncoder().encode(data)
+
+        return msgpack.packb(data, use_bin_type=True, default=_default)
+
+    def wants_dictionary_encoding(self, accepted_media_type, renderer_context):
+        if accepted_media_type:
+            params = _MediaType(accepted_media_type).params
+            if params.get('dedupe') in ('1', 'true'):
+                return True
+
+        request = renderer_context.get('request')
+        if request is not None:
+            return request.query_params.get('dedupe') in ('1', 'true')
+        return False
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except Exception as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
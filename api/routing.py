@@ -1,8 +1,21 @@
-from django.urls import re_path
-from . import consumers
+"""
+WebSocket routes. `src.asgi` serves WebSockets only when `websocket_routes` has entries, and only
+then imports the consumers and their dependencies (`djangochannelsrestframework` and the channel
+layer), so HTTP-only workers start without them.
+"""
 
+from django.conf import settings
+from django.urls import re_path
+from django.utils.module_loading import import_string
 
-websocket_urlpatterns = [
-    # re_path(r'ws/post/$', consumers.PostConsumer.as_asgi()),
-    # re_path(r'^ws/users/$', consumers.UserConsumer.as_asgi()),
+# (path regex, dotted path of the consumer)
+websocket_routes = [
+    # (r'ws/post/$', 'api.consumers.PostConsumer'),
+    # (r'^ws/users/$', 'api.consumers.UserConsumer'),
 ]
+if settings.NOTIFICATION_WEBSOCKETS:
+    websocket_routes.append((r'^ws/notifications/$', 'api.consumers.NotificationConsumer'))
+
+
+def websocket_urlpatterns():
+    return [re_path(route, import_string(consumer).as_asgi()) for route, consumer in websocket_routes]
@@ -7,7 +7,28 @@ from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 from rest_framework.permissions import AllowAny
 
-from .models import Post, Tag, User
+from . import media
+from .auth import hashing
+from .constants import COMMENT_MAX_LENGTH
+from .models import Comment, Post, Tag, User
+
+
+class ImageRecordField(serializers.JSONField):
+    """An `api.media` image record, its variants given as `srcset`s."""
+
+    def __init__(self, kind, **kwargs):
+        self.kind = kind
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return media.representation(value, self.kind)
+
+    def to_internal_value(self, data):
+        data = super().to_internal_value(data)
+        # Only uploads (`media.store_upload`) own files; a client-claimed list would be deleted on replacement.
+        if isinstance(data, dict):
+            data.pop('files', None)
+        return data
 
 
 class TokenObtainPairSerializer(DefaultTokenObtainPairSerializer):
@@ -22,7 +43,8 @@ class TokenObtainPairSerializer(DefaultTokenObtainPairSerializer):
 class RegisterSerializer(serializers.ModelSerializer):
     email = serializers.EmailField(
               required=True,
-              validators=[UniqueValidator(queryset=User.objects.all())]
+              # Accounts waiting to be purged (`api.moderation`) still hold their email.
+              validators=[UniqueValidator(queryset=User.all_objects.all())]
             )
 
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
@@ -53,7 +75,7 @@ class RegisterSerializer(serializers.ModelSerializer):
         Returns:
             str: an affirmation that all went well
         """
-        if User.objects.filter(username=username).exists():
+        if User.all_objects.filter(username=username).exists():
             raise serializers.ValidationError("Username is already taken")
         
         # if not username.isalnum():
@@ -61,34 +83,36 @@ class RegisterSerializer(serializers.ModelSerializer):
         return username
 
     def create(self, validated_data):
-        user: User = User.objects.create(
-            **validated_data,
-        )
-        
-        user.set_password(validated_data['password'])
-        user.save()
+        """Callers that already hashed the password off-thread pass it as `save(password_hash=...)`."""
+        password = validated_data.pop('password')
+        password_hash = validated_data.pop('password_hash', None) or hashing.make_password(password)
+
+        user: User = User.objects.create(password=password_hash, **validated_data)
 
         return user
 
 
 class UserSerializer(serializers.ModelSerializer):
 
+    avatar_media = ImageRecordField(media.AVATAR, read_only=True)
     followers = serializers.SerializerMethodField()
     following = serializers.SerializerMethodField()
     
     class Meta:
         model = User
-        fields = ['id', 'email', 'username', 'first_name', 'last_name', 'phone', 'avatar', 'metadata', 'followers', 'following']
+        fields = ['id', 'email', 'username', 'first_name', 'last_name', 'phone', 'avatar', 'avatar_media', 'metadata', 'followers', 'following']
 
     def create(self, validated_data):
         user: User = User.objects.create_user(**validated_data)
         return user
 
+    # Related lists are sorted in Python, so the output is stable (and identical to `api.fast_serializers`)
+    # and still read from `prefetch_related` caches (`PostQuerySet.with_related`).
     def get_followers(self, obj):
-        return obj.followers.values_list('id', flat=True)
+        return sorted(user.id for user in obj.followers.all())
 
     def get_following(self, obj):
-        return obj.following.values_list('id', flat=True)
+        return sorted(user.id for user in obj.following.all())
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -100,6 +124,7 @@ class TagSerializer(serializers.ModelSerializer):
 
 class PostSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
+    thumbnail = ImageRecordField(media.THUMBNAIL, required=False, allow_null=True)
     likes = serializers.SerializerMethodField()
     likes_count = serializers.SerializerMethodField()
     tags = serializers.ListField(child=serializers.CharField(), write_only=True)
@@ -107,9 +132,11 @@ class PostSerializer(serializers.ModelSerializer):
     class Meta:
         model = Post
         fields = '__all__'
+        # Soft deletes go through `moderation.soft_delete_posts`, which also purges and tombstones.
+        read_only_fields = ('view_count', 'impression_count', 'comment_count', 'deleted_at')
 
     def get_likes(self, obj):
-        return [user.id for user in obj.likes.all()]
+        return sorted(user.id for user in obj.likes.all())
 
     def get_likes_count(self, obj):
         return obj.likes.count()
@@ -117,7 +144,7 @@ class PostSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         """Customize output to include tags."""
         representation = super().to_representation(instance)
-        representation['tags'] = [tag.name for tag in instance.tags.all()]
+        representation['tags'] = sorted(tag.name for tag in instance.tags.all())
         return representation
 
     def create(self, validated_data):
@@ -129,21 +156,45 @@ class PostSerializer(serializers.ModelSerializer):
             tag, _ = Tag.objects.get_or_create(name=tag_name)
             tag_objects.append(tag)
 
-        post.tags.set(tag_objects)
-        post.save()
+        post.tags.set(tag_objects, through_defaults={'created_at': post.created_at})
 
         return post
 
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags', [])
-        post = super().update(instance, validated_data)
+        thumbnail = validated_data.get('thumbnail')
+        if (isinstance(thumbnail, dict) and isinstance(instance.thumbnail, dict)
+                and thumbnail.get('image') == instance.thumbnail.get('image')):
+            # The thumbnail sent back as it was read (`srcset`, `src`): keep the stored record, which
+            # holds the variants and the files they own.
+            validated_data['thumbnail'] = instance.thumbnail
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # Only the edited columns: `view_count`, `impression_count` and `comment_count` are bumped with
+        # F() expressions meanwhile, and a full save would write back the values read with the instance.
+        instance.save(update_fields=[*validated_data, 'updated_at'])
 
         tag_objects = []
         for tag_name in tags:
             tag, _ = Tag.objects.get_or_create(name=tag_name)
             tag_objects.append(tag)
 
-        post.tags.set(tag_objects)
-        post.save()
+        instance.tags.set(tag_objects, through_defaults={'created_at': instance.created_at})
 
-        return post
+        return instance
+
+
+class CommentSerializer(serializers.ModelSerializer):
+    """Validates new comments. Listings are serialized by `api.comments.FastCommentSerializer`."""
+    author = UserSerializer(read_only=True)
+    content = serializers.CharField(max_length=COMMENT_MAX_LENGTH)
+
+    class Meta:
+        model = Comment
+        fields = ('id', 'post', 'parent', 'author', 'content', 'depth', 'reply_count', 'created_at')
+        read_only_fields = ('post', 'depth', 'reply_count')
+
+
+class NotificationReadSerializer(serializers.Serializer):
+    """The body of `notifications/read/`: `{"ids": [...]}`, or nothing to mark every notification read."""
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False)
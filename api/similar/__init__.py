@@ -0,0 +1,61 @@
+"""
+"More like this": the posts most similar to a post, by shared tags and shared likers.
+
+Similarity is too expensive to compute per request, so `api.similar.build` (NumPy/SciPy, run by
+`python manage.py build_similar`) precomputes the top `SIMILAR_POSTS_K` posts of every post into
+`PostSimilarity`. This module only reads that table, so the web process never imports the builder's
+dependencies.
+
+Lists are cached under a version bumped by every build. Deleted posts drop out when the posts are
+resolved (`api.objects`), so lists never have to be rewritten for them.
+"""
+
+import uuid
+
+from django.core.cache import cache
+
+from api import metrics
+from api.constants import SIMILAR_CACHE_TIMEOUT
+from api.models import Post, PostSimilarity
+
+
+def pack_ids(post_ids):
+    return b''.join(post_id.bytes for post_id in post_ids)
+
+
+def unpack_ids(data):
+    data = bytes(data)
+    return [uuid.UUID(bytes=data[start:start + 16]) for start in range(0, len(data), 16)]
+
+
+def _key(post_id):
+    version = cache.get('similar:version', 0)
+    return f'similar:{version}:{post_id}'
+
+
+def similar_post_ids(post_id):
+    """IDs (strings) of the posts most like `post_id`, best first, or `None` if there is no such post."""
+    key = _key(post_id)
+    ids = cache.get(key)
+    metrics.count_cache('similar', hits=ids is not None, misses=ids is None)
+    if ids is None:
+        data = PostSimilarity.objects.filter(
+            post_id=post_id, post__deleted_at=None,
+        ).values_list('similar_ids', flat=True).first()
+        if data is None:
+            if not Post.objects.filter(id=post_id).exists():
+                return None
+            # Not built yet: the post is newer than the last build.
+            data = b''
+        ids = [str(similar_id) for similar_id in unpack_ids(data)]
+        cache.set(key, ids, SIMILAR_CACHE_TIMEOUT)
+    return ids
+
+
+def invalidate():
+    """Drop every cached list, after a build."""
+    if not cache.add('similar:version', 1, None):
+        try:
+            cache.incr('similar:version')
+        except ValueError:
+            cache.set('similar:version', 1, None)
@@ -0,0 +1,149 @@
+"""
+Offline build of `PostSimilarity` (`python manage.py build_similar`).
+
+Every live post is a row of a sparse feature matrix whose columns are tags and likers:
+
+* Entries are weighted by inverse document frequency (a tag on half the posts says little) and by
+  `SIMILAR_TAG_WEIGHT` / `SIMILAR_LIKE_WEIGHT`. Features on more than `SIMILAR_MAX_FEATURE_POSTS`
+  posts are dropped: they would barely move a score but would make the product below dense.
+* Rows are L2-normalized, so `X @ X.T` holds cosine similarities. It is computed
+  `SIMILAR_BLOCK_ROWS` rows at a time and only each row's top `SIMILAR_POSTS_K` are kept, so memory
+  is bounded by one block rather than by the square of the post count.
+
+`build()` recomputes every post. `build(incremental=True)` computes only posts without a row yet (new
+posts) and merges them into the lists of the posts they resemble; likes and tags added to older
+posts are picked up by the next full build.
+"""
+
+from array import array
+
+import numpy as np
+from django.utils import timezone
+from scipy import sparse
+
+from api import similar
+from api.constants import (
+    SIMILAR_BLOCK_ROWS, SIMILAR_LIKE_WEIGHT, SIMILAR_MAX_FEATURE_POSTS, SIMILAR_POSTS_K, SIMILAR_TAG_WEIGHT,
+    SIMILAR_WRITE_BATCH,
+)
+from api.models import Like, Post, PostSimilarity, PostTag
+
+
+def _pairs(queryset, index):
+    """`(rows, cols, n_features)` for the `(post ID, feature)` pairs of `queryset`, features numbered from 0."""
+    features = {}
+    rows, cols = array('i'), array('i')
+    for post_id, feature in queryset.iterator(chunk_size=10_000):
+        row = index.get(post_id)
+        if row is not None:
+            rows.append(row)
+            cols.append(features.setdefault(feature, len(features)))
+    return np.frombuffer(rows, dtype=np.intc), np.frombuffer(cols, dtype=np.intc), len(features)
+
+
+def feature_matrix(n_posts, groups, max_feature_posts=SIMILAR_MAX_FEATURE_POSTS):
+    """
+    The CSR matrix of `n_posts` L2-normalized rows built from `groups` of `(rows, cols, n_features,
+    weight)`, one group per kind of feature.
+    """
+    blocks = []
+    for rows, cols, n_features, weight in groups:
+        posts_per_feature = np.bincount(cols, minlength=n_features)
+        idf = (np.log1p(n_posts / np.maximum(posts_per_feature, 1)) * weight).astype(np.float32)
+        idf[posts_per_feature > max_feature_posts] = 0
+        blocks.append(sparse.csr_matrix((idf[cols], (rows, cols)), shape=(n_posts, n_features)))
+
+    matrix = sparse.hstack(blocks, format='csr', dtype=np.float32)
+    matrix.eliminate_zeros()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.csr_matrix(sparse.diags((1 / norms).astype(np.float32)) @ matrix)
+
+
+def top_k(matrix, rows, k=SIMILAR_POSTS_K, block_rows=SIMILAR_BLOCK_ROWS):
+    """Yield `(row, similar rows, scores)` for each of `rows`, best first, leaving out the row itself."""
+    transposed = matrix.T.tocsr()
+    rows = np.asarray(rows, dtype=np.intc)
+    for start in range(0, len(rows), block_rows):
+        block = rows[start:start + block_rows]
+        scores = (matrix[block] @ transposed).tocsr()
+        for i, row in enumerate(block):
+            low, high = scores.indptr[i], scores.indptr[i + 1]
+            cols, values = scores.indices[low:high], scores.data[low:high]
+            keep = cols != row
+            cols, values = cols[keep], values[keep]
+            if len(values) > k:
+                best = np.argpartition(values, -k)[-k:]
+                cols, values = cols[best], values[best]
+            # Highest score first; ties in row order, so rebuilds are stable.
+            order = np.lexsort((cols, -values))
+            yield int(row), cols[order], values[order]
+
+
+def load_features():
+    """`(post IDs, feature matrix)` for every live post, read straight off the through tables."""
+    post_ids = list(Post.objects.values_list('id', flat=True))
+    index = {post_id: row for row, post_id in enumerate(post_ids)}
+    groups = [
+        (*_pairs(PostTag.objects.values_list('post_id', 'tag_id'), index), SIMILAR_TAG_WEIGHT),
+        (*_pairs(Like.objects.values_list('post_id', 'user_id'), index), SIMILAR_LIKE_WEIGHT),
+    ]
+    return post_ids, feature_matrix(len(post_ids), groups)
+
+
+def _save(entries):
+    now = timezone.now()
+    PostSimilarity.objects.bulk_create(
+        [
+            PostSimilarity(
+                post_id=post_id, similar_ids=similar.pack_ids(similar_ids),
+                scores=np.asarray(scores, dtype=np.float32).tobytes(), computed_at=now,
+            )
+            for post_id, similar_ids, scores in entries
+        ],
+        update_conflicts=True, unique_fields=['post'], update_fields=['similar_ids', 'scores', 'computed_at'],
+    )
+
+
+def _merge(candidates, post_ids, k):
+    """Merge `{row: [(new row, score), ...]}` into the stored lists of those rows' posts."""
+    rows = list(candidates)
+    for start in range(0, len(rows), SIMILAR_WRITE_BATCH):
+        batch = {post_ids[row]: row for row in rows[start:start + SIMILAR_WRITE_BATCH]}
+        stored = PostSimilarity.objects.filter(post_id__in=batch).values_list('post_id', 'similar_ids', 'scores')
+        entries = []
+        for post_id, similar_ids, scores in stored:
+            merged = dict(zip(similar.unpack_ids(similar_ids), np.frombuffer(bytes(scores), dtype=np.float32).tolist()))
+            for new_row, score in candidates[batch[post_id]]:
+                merged[post_ids[new_row]] = score
+            best = sorted(merged.items(), key=lambda item: (-item[1], item[0]))[:k]
+            entries.append((post_id, [similar_id for similar_id, _ in best], [score for _, score in best]))
+        _save(entries)
+
+
+def build(incremental=False, k=SIMILAR_POSTS_K):
+    """(Re)build `PostSimilarity`. Returns `{'posts': live posts, 'computed': rows built, 'merged': rows updated}`."""
+    post_ids, matrix = load_features()
+
+    if incremental:
+        new_ids = Post.objects.filter(similarity__isnull=True).values_list('id', flat=True)
+        index = {post_id: row for row, post_id in enumerate(post_ids)}
+        rows = sorted(index[post_id] for post_id in new_ids if post_id in index)
+    else:
+        rows = range(len(post_ids))
+    new_rows = set(rows) if incremental else ()
+
+    entries, candidates = [], {}
+    for row, similar_rows, scores in top_k(matrix, rows, k):
+        entries.append((post_ids[row], [post_ids[similar_row] for similar_row in similar_rows], scores))
+        for similar_row, score in zip(similar_rows.tolist(), scores.tolist()):
+            if incremental and similar_row not in new_rows:
+                candidates.setdefault(similar_row, []).append((row, score))
+        if len(entries) >= SIMILAR_WRITE_BATCH:
+            _save(entries)
+            entries = []
+    _save(entries)
+    _merge(candidates, post_ids, k)
+
+    similar.invalidate()
+    return {'posts': len(post_ids), 'computed': len(rows), 'merged': len(candidates)}
@@ -0,0 +1,160 @@
+"""
+Single-flight: identical concurrent reads are computed once.
+
+When a post goes viral, hundreds of concurrent `retrieve`s of it (or anonymous explore pages) run the
+same queries and serialization at the same moment. `run(key, compute)` lets one caller per key
+compute while the others wait for its result:
+
+* In process, callers arriving while a computation of their key is in flight wait for it (under
+  ASGI every request's sync code runs on its own thread, so they do overlap).
+* Across processes, with `SINGLE_FLIGHT_ACROSS_PROCESSES` (needs a shared cache such as Redis), the
+  computing caller holds a cache lock and publishes its result under the lock's token; callers in
+  other processes poll for that result instead of computing.
+
+Waiting is bounded by `SINGLE_FLIGHT_WAIT`, after which a caller computes for itself (`fell_back`), as
+it does when another process's computation fails. Only outputs
+that do not depend on who is asking may be shared; views opt in per action through
+`SingleFlightMixin.single_flight`. `stats()` counts, per route, how many calls computed and how many
+were served by another's computation.
+"""
+
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import Future, TimeoutError
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from api import metrics
+from api.constants import SINGLE_FLIGHT_POLL_INTERVAL, SINGLE_FLIGHT_RESULT_TIMEOUT, SINGLE_FLIGHT_WAIT
+
+COMPUTED = 'computed'
+COALESCED = 'coalesced'
+COALESCED_ACROSS_PROCESSES = 'coalesced_across_processes'
+FELL_BACK = 'fell_back'
+
+_lock = threading.Lock()
+_flights = {}
+_stats = Counter()
+
+
+def request_key(request):
+    """Requests with the same key get the same response, whoever sends them."""
+    return f'{request.method}:{request.get_host()}:{request.get_full_path()}'
+
+
+def run(key, compute, label=''):
+    """Return `compute()`, or the result of the identical computation already in flight for `key`."""
+    with _lock:
+        future = _flights.get(key)
+        leader = future is None
+        if leader:
+            future = _flights[key] = Future()
+
+    if not leader:
+        try:
+            result = future.result(timeout=SINGLE_FLIGHT_WAIT)
+        except TimeoutError:
+            _record(label, FELL_BACK)
+            return compute()
+        except Exception:
+            # The computation failed; every caller sees the same error.
+            _record(label, COALESCED)
+            raise
+        _record(label, COALESCED)
+        return result
+
+    try:
+        if getattr(settings, 'SINGLE_FLIGHT_ACROSS_PROCESSES', False):
+            result = _run_across_processes(key, compute, label)
+        else:
+            _record(label, COMPUTED)
+            result = compute()
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _lock:
+            del _flights[key]
+
+
+def _run_across_processes(key, compute, label):
+    lock_key = f'single-flight:lock:{key}'
+    token = uuid.uuid4().hex
+    if cache.add(lock_key, token, SINGLE_FLIGHT_WAIT):
+        _record(label, COMPUTED)
+        try:
+            result = compute()
+            # Published before the lock is released, so a caller that saw the lock finds the result.
+            cache.set(f'single-flight:result:{token}', result, SINGLE_FLIGHT_RESULT_TIMEOUT)
+        finally:
+            cache.delete(lock_key)
+        return result
+
+    token = cache.get(lock_key)
+    deadline = time.monotonic() + SINGLE_FLIGHT_WAIT
+    missing = object()
+    while token is not None and time.monotonic() < deadline:
+        result = cache.get(f'single-flight:result:{token}', missing)
+        if result is not missing:
+            _record(label, COALESCED_ACROSS_PROCESSES)
+            return result
+        if cache.get(lock_key) != token:
+            # Released without a result since our last look: the computation failed.
+            if cache.get(f'single-flight:result:{token}', missing) is missing:
+                break
+            continue
+        time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+
+    _record(label, FELL_BACK)
+    return compute()
+
+
+def _record(label, outcome):
+    with _lock:
+        _stats[label, outcome] += 1
+    metrics.SINGLE_FLIGHT.labels(label, outcome).inc()
+
+
+def stats():
+    """`{label: {outcome: calls, ..., 'ratio': share of calls served by another's computation}}`."""
+    with _lock:
+        counts = dict(_stats)
+    by_label = {}
+    for (label, outcome), calls in counts.items():
+        by_label.setdefault(label, Counter())[outcome] += calls
+    for outcomes in by_label.values():
+        total = sum(outcomes.values())
+        outcomes['ratio'] = (outcomes[COALESCED] + outcomes[COALESCED_ACROSS_PROCESSES]) / total if total else 0
+    return {label: dict(outcomes) for label, outcomes in by_label.items()}
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
+
+
+class SingleFlightMixin:
+    """Lets a view's actions share one computation between identical concurrent requests."""
+
+    def single_flight(self, request, compute, shared=True):
+        """
+        `compute()`'s `Response`, computed once for identical concurrent requests. Pass
+        `shared=False` when the output depends on the user.
+        """
+        if not shared or not getattr(settings, 'SINGLE_FLIGHT_ENABLED', True):
+            return compute()
+
+        def parts():
+            response = compute()
+            return response.data, response.status_code
+
+        label = request.resolver_match.view_name if request.resolver_match else ''
+        data, status_code = run(request_key(request), parts, label)
+        return Response(data, status=status_code)
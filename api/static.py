@@ -0,0 +1,106 @@
+"""
+Static files: compressed and content-hashed once at build time, served without Django where possible.
+
+`collectstatic` (with `StaticFilesStorage`) is the build step. It copies the admin's, DRF's and our
+own files (`static/`, `web.html` among them) to `STATIC_ROOT`, names a copy of each after a hash of
+its content, rewrites the references inside stylesheets, scripts and HTML pages to those names, and
+writes gzip and, with `Brotli` installed, brotli versions next to them. WhiteNoise picks the
+smallest encoding a client accepts and serves hashed names with `Cache-Control: immutable` for ten
+years; unhashed names such as `web.html` are cached for `WHITENOISE_MAX_AGE`.
+
+Serving:
+
+* `StaticFilesMiddleware` is WhiteNoise's middleware, as used by `runserver` and under WSGI. Django
+  hands its file responses to the server's `wsgi.file_wrapper`, which gunicorn sends with
+  `sendfile(2)`.
+* `ASGIStaticFiles` (around the app in `src/asgi.py`) answers static requests on the event loop
+  from the files the middleware found, before Django's ASGI handler would take a thread for each.
+  Servers offering the `http.response.zerocopysend` extension get the file descriptor to send
+  themselves.
+"""
+
+import asyncio
+
+from django.core.files.base import ContentFile
+from whitenoise.middleware import WhiteNoiseMiddleware
+from whitenoise.responders import SlicedFile
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+BLOCK_SIZE = 64 * 1024
+
+_middleware = None
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """Also rewrites `src` and `href` attributes in HTML pages to hashed names."""
+
+    patterns = CompressedManifestStaticFilesStorage.patterns + (
+        ('*.html', ((r"""(?P<matched>\b(?P<attribute>src|href)=["'](?P<url>.*?)["'])""", '%(attribute)s="%(url)s"'),)),
+    )
+
+    def post_process_with_compression(self, files):
+        return super().post_process_with_compression(self._rewrite_pages(files))
+
+    def _rewrite_pages(self, files):
+        """Pages are opened by their unhashed names, so those get the hashed references as well."""
+        pages = {}
+        for name, hashed_name, processed in files:
+            if hashed_name and name.endswith('.html') and not isinstance(processed, Exception):
+                pages[name] = hashed_name
+            yield name, hashed_name, processed
+        for name, hashed_name in pages.items():
+            with self.open(hashed_name) as hashed:
+                content = ContentFile(hashed.read())
+            self.delete(name)
+            self._save(name, content)
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise, sharing the files it found with `ASGIStaticFiles` rather than both scanning for them."""
+
+    def __init__(self, *args, **kwargs):
+        global _middleware
+        super().__init__(*args, **kwargs)
+        _middleware = self
+
+
+class ASGIStaticFiles:
+    """Serves the files `StaticFilesMiddleware` knows of straight from the event loop."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        whitenoise = _middleware
+        if scope['type'] != 'http' or whitenoise is None:
+            return await self.app(scope, receive, send)
+        path = scope['path'][len(scope.get('root_path', '')):] or '/'
+        static_file = whitenoise.find_file(path) if whitenoise.autorefresh else whitenoise.files.get(path)
+        if static_file is None:
+            return await self.app(scope, receive, send)
+
+        # WhiteNoise reads request headers in their WSGI form.
+        request_headers = {
+            'HTTP_' + name.decode('latin-1').upper().replace('-', '_'): value.decode('latin-1')
+            for name, value in scope['headers']
+        }
+        response = static_file.get_response(scope['method'], request_headers)
+        await send({
+            'type': 'http.response.start',
+            'status': int(response.status),
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers],
+        })
+        if response.file is None:
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        with response.file as file:
+            if 'http.response.zerocopysend' in scope.get('extensions', {}) and not isinstance(file, SlicedFile):
+                await send({'type': 'http.response.zerocopysend', 'file': file})
+                return
+            loop = asyncio.get_running_loop()
+            while True:
+                chunk = await loop.run_in_executor(None, file.read, BLOCK_SIZE)
+                more_body = len(chunk) == BLOCK_SIZE
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': more_body})
+                if not more_body:
+                    return
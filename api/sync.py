@@ -0,0 +1,143 @@
+"""
+Delta sync for offline mobile caches.
+
+Every change a client may have cached is appended to `SyncEvent`: posts (saved or deleted), likes and
+follows (added or removed). `/api/sync/?since=<cursor>` replays the events relevant to the current user
+after the cursor, collapsed to the latest state per object, and hands back the next cursor.
+
+IDs are assigned at insert but become visible at commit, so under concurrent writers an event can
+appear behind one a client has already read past. Cursors therefore stop before events younger than
+`SYNC_CURSOR_LAG`: those are sent, and sent again on the next call along with anything that
+committed behind them. Replaying is harmless, as every change is a latest state. Transactions open
+longer than the lag can still be missed.
+
+Deleting a post deletes its likes first (a cascade, or the purge in `api.moderation`); their
+tombstones are recorded too, and a liker is sent the post's tombstone along with them.
+"""
+
+from datetime import timedelta
+
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from api.constants import SYNC_BATCH_SIZE, SYNC_CURSOR_LAG
+from api.models import Post, SyncEvent
+
+
+def record(kind, action, user_id, object_ids):
+    """Append one event per ID in `object_ids`."""
+    SyncEvent.objects.bulk_create([
+        SyncEvent(kind=kind, action=action, user_id=user_id, object_id=object_id)
+        for object_id in object_ids
+    ])
+
+
+def record_follows(follower_id, followed_ids, action):
+    record(SyncEvent.FOLLOW, action, follower_id, followed_ids)
+
+
+def record_unlikes(pairs):
+    """Like tombstones for `(user ID, post ID)` pairs."""
+    SyncEvent.objects.bulk_create([
+        SyncEvent(kind=SyncEvent.LIKE, action=SyncEvent.DELETE, user_id=user_id, object_id=post_id)
+        for user_id, post_id in pairs
+    ], batch_size=SYNC_BATCH_SIZE)
+
+
+def settled_before():
+    """Events created before this are past the cursor lag."""
+    return timezone.now() - timedelta(seconds=SYNC_CURSOR_LAG)
+
+
+def latest_cursor():
+    return (
+        SyncEvent.objects.filter(created_at__lte=settled_before()).order_by('-id').values_list('id', flat=True).first()
+        or 0
+    )
+
+
+def changes_since(user, following_ids, cursor, limit):
+    """
+    Collapse the events visible to `user` (who follows `following_ids`) after `cursor` into the latest
+    action per object. Returns `(changes, next_cursor, has_more)` where `changes` maps `(kind, action)`
+    to object IDs.
+    """
+    limit = max(1, limit)
+    unliked = SyncEvent.objects.filter(kind=SyncEvent.LIKE, action=SyncEvent.DELETE, user_id=user.id, id__gt=cursor)
+    relevant = (
+        Q(kind=SyncEvent.POST, user_id__in={user.id, *following_ids}) |
+        Q(kind=SyncEvent.POST, object_id__in=Post.likes.through.objects.filter(user_id=user.id).values('post_id')) |
+        # Deleted posts the user had liked: their likes are gone, their tombstones are not.
+        Q(kind=SyncEvent.POST, action=SyncEvent.DELETE, object_id__in=unliked.values('object_id')) |
+        Q(kind__in=(SyncEvent.LIKE, SyncEvent.FOLLOW), user_id=user.id)
+    )
+    events = list(
+        SyncEvent.objects.filter(relevant, id__gt=cursor)
+        .order_by('id')
+        .values_list('id', 'kind', 'action', 'object_id', 'created_at')[:limit + 1]
+    )
+    has_more = len(events) > limit
+    events = events[:limit]
+
+    latest = {}
+    for _, kind, action, object_id, _ in events:
+        latest[(kind, object_id)] = action
+
+    changes = {}
+    for (kind, object_id), action in latest.items():
+        changes.setdefault((kind, action), []).append(object_id)
+
+    # Up to the first event younger than the lag; past it only when that is the whole of a full
+    # batch, so a client paging through `has_more` always moves on.
+    horizon = settled_before()
+    next_cursor = cursor
+    for event_id, _, _, _, created_at in events:
+        if created_at > horizon:
+            break
+        next_cursor = event_id
+    if has_more and next_cursor == cursor:
+        next_cursor = events[-1][0]
+    return changes, next_cursor, has_more
+
+
+@receiver(post_save, sender=Post)
+def record_post_saved(sender, instance, **kwargs):
+    record(SyncEvent.POST, SyncEvent.UPSERT, instance.author_id, [instance.pk])
+
+
+@receiver(pre_delete, sender=Post)
+def record_post_likes_deleted(sender, instance, **kwargs):
+    # The likes cascade before `post_delete`, without `m2m_changed`.
+    record_unlikes(Post.likes.through.objects.filter(post_id=instance.pk).values_list('user_id', 'post_id'))
+
+
+@receiver(post_delete, sender=Post)
+def record_post_deleted(sender, instance, **kwargs):
+    record(SyncEvent.POST, SyncEvent.DELETE, instance.author_id, [instance.pk])
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+def record_likes(sender, instance, action, pk_set=None, reverse=False, **kwargs):
+    Like = Post.likes.through
+
+    if action == 'pre_clear':
+        if reverse:
+            pairs = [(instance.pk, post_id) for post_id in Like.objects.filter(
+                user_id=instance.pk).values_list('post_id', flat=True)]
+        else:
+            pairs = [(user_id, instance.pk) for user_id in Like.objects.filter(
+                post_id=instance.pk).values_list('user_id', flat=True)]
+        sync_action = SyncEvent.DELETE
+    elif action in ('post_add', 'post_remove') and pk_set:
+        # Forward: `post.likes.add(*users)`; reverse: `user.likes.add(*posts)`.
+        pairs = [(instance.pk, pk) if reverse else (pk, instance.pk) for pk in pk_set]
+        sync_action = SyncEvent.UPSERT if action == 'post_add' else SyncEvent.DELETE
+    else:
+        return
+
+    SyncEvent.objects.bulk_create([
+        SyncEvent(kind=SyncEvent.LIKE, action=sync_action, user_id=user_id, object_id=post_id)
+        for user_id, post_id in pairs
+    ])
@@ -0,0 +1,121 @@
+"""
+Per-tag post index.
+
+`Tag.post_count` is a denormalized counter kept in step with `Post.tags` by the receivers below,
+and `PostTag(tag, -created_at)` lets a tag page be read straight off the index.
+Rendered tag pages are cached under a per-tag version that is bumped whenever the tag gains or loses posts.
+"""
+
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, pre_delete
+from django.dispatch import receiver
+
+from api import metrics
+from api.constants import TAG_LOOKUP_CACHE_TIMEOUT, TAG_PAGE_CACHE_TIMEOUT
+from api.models import Post, PostTag, Tag
+
+
+def _name_key(name):
+    # Hashed: names are user input, and memcached keys cannot hold spaces or exceed 250 bytes.
+    return f'tags:name:{hashlib.md5(name.encode()).hexdigest()}'
+
+
+def tag_id_for_name(name):
+    """Resolve a tag name to its ID (the most used tag wins if names collide), cached."""
+    key = _name_key(name)
+    tag_id = cache.get(key)
+    metrics.count_cache('tag_names', hits=tag_id is not None, misses=tag_id is None)
+    if tag_id is None:
+        tag_id = Tag.objects.filter(name=name).order_by('-post_count').values_list('id', flat=True).first()
+        if tag_id is None:
+            return None
+        cache.set(key, tag_id, TAG_LOOKUP_CACHE_TIMEOUT)
+    return tag_id
+
+
+def forget_name(name):
+    cache.delete(_name_key(name))
+
+
+def posts_for_tag(tag_id):
+    """Posts carrying `tag_id`, newest first, served by the `(tag_id, created_at)` index."""
+    return Post.objects.filter(posttag__tag_id=tag_id).order_by('-posttag__created_at')
+
+
+def page_cache_key(tag_id, page, page_size):
+    version = cache.get(f'tags:version:{tag_id}', 0)
+    return f'tags:page:{tag_id}:{version}:{page}:{page_size}'
+
+
+def get_cached_page(tag_id, page, page_size):
+    data = cache.get(page_cache_key(tag_id, page, page_size))
+    metrics.count_cache('tag_pages', hits=data is not None, misses=data is None)
+    return data
+
+
+def set_cached_page(tag_id, page, page_size, data):
+    cache.set(page_cache_key(tag_id, page, page_size), data, TAG_PAGE_CACHE_TIMEOUT)
+
+
+def invalidate_pages(tag_ids):
+    for tag_id in tag_ids:
+        key = f'tags:version:{tag_id}'
+        if not cache.add(key, 1, None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, None)
+
+
+def adjust_post_counts(tag_ids, delta):
+    """Apply `delta` to `Tag.post_count` for `tag_ids` in one UPDATE."""
+    tag_ids = list(tag_ids)
+    if not tag_ids:
+        return
+    if delta < 0:
+        Tag.objects.filter(id__in=tag_ids, post_count__gte=-delta).update(post_count=F('post_count') + delta)
+    else:
+        Tag.objects.filter(id__in=tag_ids).update(post_count=F('post_count') + delta)
+    invalidate_pages(tag_ids)
+
+
+@receiver(m2m_changed, sender=PostTag)
+def update_tag_counts(sender, instance, action, pk_set=None, reverse=False, **kwargs):
+    # `pk_set` of an add holds only the new links, but that of a remove holds whatever was passed, linked
+    # or not: removals are counted before the delete, off the rows that will go.
+    if reverse:
+        # `tag.tags.add(*posts)`: `instance` is the tag and `pk_set` holds post IDs.
+        if action == 'pre_clear':
+            adjust_post_counts([instance.pk], -PostTag.objects.filter(tag_id=instance.pk).count())
+        elif action == 'pre_remove' and pk_set:
+            removed = PostTag.objects.filter(tag_id=instance.pk, post_id__in=pk_set).count()
+            if removed:
+                adjust_post_counts([instance.pk], -removed)
+        elif action == 'post_add' and pk_set:
+            adjust_post_counts([instance.pk], len(pk_set))
+        return
+
+    if action == 'pre_clear':
+        adjust_post_counts(PostTag.objects.filter(post_id=instance.pk).values_list('tag_id', flat=True), -1)
+    elif action == 'pre_remove' and pk_set:
+        adjust_post_counts(
+            PostTag.objects.filter(post_id=instance.pk, tag_id__in=pk_set).values_list('tag_id', flat=True), -1
+        )
+    elif action == 'post_add' and pk_set:
+        adjust_post_counts(pk_set, 1)
+
+
+@receiver(pre_delete, sender=Post)
+def release_tag_counts(sender, instance, **kwargs):
+    # The cascade removes the `PostTag` rows without sending `m2m_changed`.
+    adjust_post_counts(PostTag.objects.filter(post_id=instance.pk).values_list('tag_id', flat=True), -1)
+
+
+@receiver(post_delete, sender=Tag)
+def forget_tag(sender, instance, **kwargs):
+    # Another tag of the same name, if any, is resolved afresh.
+    forget_name(instance.name)
+    invalidate_pages([instance.pk])
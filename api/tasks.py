@@ -0,0 +1,101 @@
+"""
+Deferred side effects run by `api.jobs` workers.
+Handlers take JSON payloads, so model instances are passed around by ID.
+"""
+
+from django.conf import settings
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.core.mail import EmailMultiAlternatives, send_mail
+from django.template.loader import render_to_string
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from rest_framework.authtoken.models import Token
+
+from api import graph, jobs, media, metrics, moderation
+from api.jobs import task
+from api.models import User
+
+
+@task('create_auth_token')
+def create_auth_token(user_id):
+    Token.objects.get_or_create(user_id=user_id)
+
+
+@task('send_otp_email')
+def send_otp_email(user_id, resend=False):
+    user = User.objects.filter(id=user_id).first()
+    if user is None or not user.otp:
+        return
+
+    if resend:
+        mail_subject = 'Your OTP for account verification for Culinara'
+        message = f"Hello {user.username},\n\nYour new OTP for account verification is: {user.otp}\n\nThis OTP is valid for 15 minutes.\n\nThanks for choosing Culinara."
+    else:
+        mail_subject = 'Culinara - Your OTP for account verification'
+        message = f"Hello {user.username},\n\nYour OTP for account verification is: {user.otp}\n\nThis OTP is valid for 15 minutes.\n\nThanks for choosing Culinara."
+
+    with metrics.timed_email('otp'):
+        send_mail(
+            mail_subject,
+            message,
+            settings.DEFAULT_FROM_EMAIL,
+            [user.email],
+            fail_silently=False,
+        )
+
+
+@task('send_password_reset_email')
+def send_password_reset_email(user_id, resend=False):
+    user = User.objects.filter(id=user_id).first()
+    if user is None:
+        return
+
+    token = PasswordResetTokenGenerator().make_token(user)
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+    reset_url = f"{settings.FRONTEND_URL}/reset-password/{uid}/{token}/"
+
+    context = {
+        'user': user,
+        'reset_url': reset_url
+    }
+    subject = "Password Reset Request (Resend)" if resend else "Password Reset Request"
+    text_content = f"Hello {user.username},\n\nYou requested a password reset. Click the link below to reset your password:\n{reset_url}"
+    html_content = render_to_string('password_reset_email.html', context)
+
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body=text_content,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[user.email],
+    )
+    email.attach_alternative(html_content, "text/html")
+    with metrics.timed_email('password_reset'):
+        email.send()
+
+
+@task('refresh_follower_counts')
+def refresh_follower_counts(user_ids):
+    graph.refresh_follower_counts(user_ids)
+
+
+@task('purge_deleted_posts')
+def purge_deleted_posts():
+    _, done = moderation.purge_deleted_posts()
+    if not done:
+        jobs.enqueue('purge_deleted_posts')
+
+
+@task('purge_account')
+def purge_account(deletion_id):
+    if not moderation.purge_account(deletion_id):
+        jobs.enqueue('purge_account', {'deletion_id': deletion_id})
+
+
+@task('generate_media_variants')
+def generate_media_variants(kind, object_id, name):
+    media.generate_variants(kind, object_id, name)
+
+
+@task('delete_media_files')
+def delete_media_files(names):
+    media.delete_files(names)
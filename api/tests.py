@@ -1,3 +1,874 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+import threading
+import time
+import uuid
+import warnings
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import msgpack
+from django.conf import settings
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import F
+from django.http import QueryDict
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth import hashers
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api import admission, autocomplete, comments, graph, impressions, jobs, json_filters, moderation, notifications, partitions, single_flight, tags
+from api.fast_serializers import FastPostSerializer, FastUserSerializer
+from api.constants import JSON_FILTER_MAX_VALUES, NOTIFICATION_FLUSH_MAX_ATTEMPTS
+from api.models import Comment, Job, Like, Notification, Post, SyncEvent, Tag, User
+from api.serializers import PostSerializer, RegisterSerializer, UserSerializer
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Table partitioning is PostgreSQL only.')
+class LikePartitionPruningTests(TestCase):
+    def setUp(self):
+        partitions.convert('api_post_likes')
+        partitions.ensure_partitions('api_post_likes', since=timezone.now() - timedelta(days=120))
+
+    def test_trending_window_scans_only_the_current_partition(self):
+        now = timezone.now()
+        plan = Post.objects.liked_between(now - timedelta(days=1), now).explain()
+
+        current = partitions.partition_name('api_post_likes', partitions.month_start(now))
+        older = partitions.partition_name('api_post_likes', partitions.add_months(partitions.month_start(now), -2))
+        newer = partitions.partition_name('api_post_likes', partitions.add_months(partitions.month_start(now), 1))
+
+        self.assertIn(current, plan)
+        self.assertNotIn(older, plan)
+        self.assertNotIn(newer, plan)
+        self.assertNotIn('api_post_likes_default', plan)
+
+
+class LikeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='cook@example.com', username='cook')
+        self.post = Post.objects.create(content='Jollof')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_liking_twice_unlikes(self):
+        path = f'/api/posts/{self.post.id}/like/'
+        self.assertEqual(self.client.post(path).status_code, 201)
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 1)
+        self.assertEqual(self.client.post(path).status_code, 200)
+        self.assertFalse(Like.objects.filter(post=self.post).exists())
+
+    def test_edits_keep_counters_bumped_meanwhile(self):
+        post = Post.objects.get()
+        Post.objects.filter(id=post.id).update(view_count=F('view_count') + 5, impression_count=F('impression_count') + 7)
+
+        serializer = PostSerializer(post, data={'title': 'Party jollof', 'tags': ['rice']}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        post.refresh_from_db()
+        self.assertEqual((post.title, post.view_count, post.impression_count), ('Party jollof', 5, 7))
+
+    @skipUnless(connection.vendor == 'postgresql', 'Advisory locks are PostgreSQL only.')
+    def test_concurrent_likes_of_a_pair_are_serialized(self):
+        partitions.convert('api_post_likes')
+        key = partitions._lock_key('api_post_likes', [self.post.id, self.user.id])
+        acquired = []
+
+        def other_writer():
+            with connections['default'].cursor() as cursor:
+                cursor.execute('SELECT pg_try_advisory_xact_lock(hashtextextended(%s, 0))', [key])
+                acquired.append(cursor.fetchone()[0])
+            connections.close_all()
+
+        with transaction.atomic():
+            partitions.lock_unique('api_post_likes', self.post.id, self.user.id)
+            thread = threading.Thread(target=other_writer)
+            thread.start()
+            thread.join()
+        self.assertEqual(acquired, [False])
+
+        path = f'/api/posts/{self.post.id}/like/'
+        self.assertEqual(self.client.post(path).status_code, 201)
+        self.assertEqual(self.client.post(path).status_code, 200)
+        self.assertFalse(Like.objects.filter(post=self.post).exists())
+
+
+class FastSerializerTests(TestCase):
+    def setUp(self):
+        users = [User.objects.create(email=f'cook{i}@example.com', username=f'cook{i}') for i in range(4)]
+        users[0].followers.add(users[1], users[2])
+        users[3].followers.add(users[0])
+        users[1].metadata = {'bio': 'Suya every day'}
+        users[1].save()
+
+        jollof, suya = Tag.objects.create(name='jollof'), Tag.objects.create(name='suya')
+        first = Post.objects.create(author=users[0], title='Jollof', content='Rice', thumbnail={'url': 'x.png'})
+        first.tags.add(suya, jollof)
+        first.likes.add(users[2], users[1])
+        second = Post.objects.create(author=users[1], short_description='Skewers', content='Beef')
+        second.tags.add(suya)
+        Post.objects.create(content='No author')
+
+    def render(self, data):
+        return JSONRenderer().render(data)
+
+    def test_posts_match_drf(self):
+        posts = Post.objects.order_by('created_at')
+        expected = self.render(PostSerializer(list(posts), many=True).data)
+
+        self.assertEqual(self.render(FastPostSerializer(posts, many=True).data), expected)
+        self.assertEqual(self.render(FastPostSerializer(list(posts), many=True).data), expected)
+        self.assertEqual(self.render(FastPostSerializer(posts.first()).data), self.render(PostSerializer(posts.first()).data))
+
+    def test_users_match_drf(self):
+        users = User.objects.order_by('username')
+        self.assertEqual(
+            self.render(FastUserSerializer(users, many=True).data),
+            self.render(UserSerializer(list(users), many=True).data),
+        )
+
+    def test_drf_serializer_reads_prefetched_relations(self):
+        posts = list(Post.objects.order_by('created_at'))
+        expected = self.render(PostSerializer(posts, many=True).data)
+
+        posts = list(Post.objects.order_by('created_at').with_related())
+        with self.assertNumQueries(0):
+            self.assertEqual(self.render(PostSerializer(posts, many=True).data), expected)
+
+    def test_explore_uses_a_fixed_number_of_queries(self):
+        # Count, page, likes, tags, authors, followers, following.
+        with self.assertNumQueries(7):
+            response = self.client.get('/api/posts/explore/', {'tab': 'popular'})
+        self.assertEqual(len(response.json()['results']), 3)
+
+
+class MessagePackTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email='cook@example.com', username='cook')
+        for content in ('Jollof', 'Suya'):
+            post = Post.objects.create(author=self.user, content=content)
+            post.tags.add(Tag.objects.get_or_create(name='party')[0])
+        self.client = APIClient()
+
+    def test_msgpack_is_negotiated_and_holds_the_json_data(self):
+        expected = self.client.get('/api/posts/').json()
+        for response in (
+            self.client.get('/api/posts/', HTTP_ACCEPT='application/msgpack'),
+            self.client.get('/api/posts/?format=msgpack'),
+        ):
+            self.assertEqual(response['Content-Type'], 'application/msgpack')
+            self.assertEqual(msgpack.unpackb(response.content), expected)
+
+    def test_dedupe_stores_authors_and_tags_once(self):
+        expected = self.client.get('/api/posts/').json()
+        response = self.client.get('/api/posts/', HTTP_ACCEPT='application/msgpack; dedupe=1')
+        payload = msgpack.unpackb(response.content)
+
+        self.assertEqual(payload['authors'], [expected['results'][0]['author']])
+        self.assertEqual(payload['tags'], ['party'])
+        self.assertEqual([(post['author'], post['tags']) for post in payload['data']['results']], [(0, [0]), (0, [0])])
+
+    def test_msgpack_bodies_are_parsed(self):
+        self.client.force_authenticate(self.user)
+        body = msgpack.packb({'content': 'Egusi', 'tags': ['soup']})
+        response = self.client.post('/api/posts/', body, content_type='application/msgpack')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['tags'], ['soup'])
+
+        response = self.client.post('/api/posts/', b'\xc1', content_type='application/msgpack')
+        self.assertEqual(response.status_code, 400)
+
+
+class ImpressionTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(impressions, '_start_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Other tests' views and impressions.
+        impressions._take()
+        impressions._seen.clear()
+        self.addCleanup(impressions._take)
+        self.addCleanup(impressions._seen.clear)
+        self.jollof, self.suya = Post.objects.create(content='Jollof'), Post.objects.create(content='Suya')
+
+    def counts(self):
+        return list(Post.objects.order_by('content').values_list('view_count', 'impression_count'))
+
+    def test_flush_adds_deduplicated_deltas(self):
+        impressions.record_views([self.jollof.id, self.jollof.id], 'cook')
+        impressions.record_views([self.jollof.id], 'cook')
+        impressions.record_views([self.jollof.id], 'guest')
+        impressions.record_impressions([self.jollof.id, self.suya.id], 'cook')
+
+        with mock.patch.object(impressions, 'VIEW_FLUSH_BATCH', 1):
+            self.assertEqual(impressions.flush(), (2, 2))
+        self.assertEqual(self.counts(), [(2, 1), (0, 1)])
+        self.assertEqual(impressions.flush(), (0, 0))
+
+    def test_failed_flush_puts_the_deltas_back(self):
+        impressions.record_views([self.jollof.id, self.suya.id], 'cook')
+        with mock.patch.object(impressions, '_deltas', side_effect=OperationalError), self.assertLogs('api.impressions'):
+            self.assertEqual(impressions.flush(), (0, 0))
+        self.assertEqual(self.counts(), [(0, 0), (0, 0)])
+
+        impressions.record_views([self.jollof.id], 'guest')
+        self.assertEqual(impressions.flush(), (2, 1))
+        self.assertEqual(self.counts(), [(2, 0), (1, 0)])
+
+
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        single_flight.reset_stats()
+        self.waiting = threading.Event()
+        waiting = self.waiting
+
+        class Future(single_flight.Future):
+            def result(self, timeout=None):
+                waiting.set()
+                return super().result(timeout)
+
+        patcher = mock.patch.object(single_flight, 'Future', Future)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def lead(self, compute):
+        """Run `compute` as the leader for 'key' in another thread; it starts once a follower waits."""
+        outcome = []
+        started = threading.Event()
+
+        def leader():
+            def wait_then_compute():
+                started.set()
+                self.waiting.wait(5)
+                return compute()
+            try:
+                outcome.append(single_flight.run('key', wait_then_compute, 'test'))
+            except Exception as exc:
+                outcome.append(exc)
+
+        thread = threading.Thread(target=leader)
+        thread.start()
+        self.addCleanup(thread.join)
+        started.wait(5)
+        return thread, outcome
+
+    def test_followers_share_the_leaders_result(self):
+        result = {'posts': []}
+        thread, outcome = self.lead(lambda: result)
+        self.assertIs(single_flight.run('key', self.fail, 'test'), result)
+        thread.join()
+        self.assertEqual(outcome, [result])
+        self.assertEqual(single_flight.stats()['test'], {'computed': 1, 'coalesced': 1, 'ratio': 0.5})
+
+    def test_followers_see_the_leaders_error(self):
+        error = ValueError('boom')
+
+        def fail():
+            raise error
+        thread, outcome = self.lead(fail)
+        with self.assertRaises(ValueError) as raised:
+            single_flight.run('key', self.fail, 'test')
+        self.assertIs(raised.exception, error)
+        thread.join()
+        self.assertEqual(outcome, [error])
+
+    def test_followers_compute_for_themselves_after_waiting(self):
+        release = threading.Event()
+        self.lead(lambda: release.wait(5))
+        with mock.patch.object(single_flight, 'SINGLE_FLIGHT_WAIT', 0.01):
+            self.assertEqual(single_flight.run('key', lambda: 'own', 'test'), 'own')
+        release.set()
+        self.assertEqual(single_flight.stats()['test']['fell_back'], 1)
+
+    def test_results_are_shared_across_processes_through_the_cache(self):
+        cache.set('single-flight:lock:key', 'token')
+        cache.set('single-flight:result:token', 'published')
+        self.assertEqual(single_flight._run_across_processes('key', self.fail, 'test'), 'published')
+
+        # The other process's computation ended without a result: its lock is gone.
+        with mock.patch.object(cache, 'add', return_value=False):
+            self.assertEqual(single_flight._run_across_processes('other', lambda: 'own', 'test'), 'own')
+        self.assertEqual(single_flight.stats()['test']['coalesced_across_processes'], 1)
+        self.assertEqual(single_flight.stats()['test']['fell_back'], 1)
+
+
+class HomeTests(TestCase):
+    def test_limit_is_clamped(self):
+        for i in range(3):
+            Post.objects.create(content=f'Post {i}')
+        for limit, expected in (('-1', 1), ('0', 1), ('2', 2), ('x', 3)):
+            response = self.client.get('/api/posts/home/', {'sections': 'recent', 'limit': limit})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['sections']['recent']), expected)
+
+
+class TagTests(TestCase):
+    def setUp(self):
+        self.jollof, self.suya = Tag.objects.create(name='jollof'), Tag.objects.create(name='suya')
+        self.post = Post.objects.create(content='Jollof')
+        self.post.tags.add(self.jollof)
+
+    def test_name_keys_are_safe_for_memcached(self):
+        for name in ('jollof rice', 'ñ' * 300):
+            key = tags._name_key(name)
+            self.assertLessEqual(len(key), 250)
+            self.assertNotIn(' ', key)
+
+    def test_removing_unlinked_tags_leaves_counts_alone(self):
+        self.post.tags.remove(self.jollof, self.suya)
+        self.jollof.tags.remove(self.post)
+        self.assertEqual(list(Tag.objects.order_by('name').values_list('post_count', flat=True)), [0, 0])
+
+        self.suya.post_count = 1
+        self.suya.save()
+        self.post.tags.remove(self.suya)
+        self.suya.tags.remove(self.post)
+        self.suya.refresh_from_db()
+        self.assertEqual(self.suya.post_count, 1)
+
+    def test_deleted_tags_are_not_found(self):
+        self.assertEqual(self.client.get('/api/posts/tags/', {'tag': 'jollof'}).status_code, 200)
+        self.jollof.delete()
+        self.assertEqual(self.client.get('/api/posts/tags/', {'tag': 'jollof'}).status_code, 404)
+
+        # A tag missing behind a stale cached name is a 404 too.
+        tag_id = tags.tag_id_for_name('suya')
+        Tag.objects.filter(id=tag_id)._raw_delete('default')
+        self.assertEqual(self.client.get('/api/posts/tags/', {'tag': 'suya'}).status_code, 404)
+        self.assertIsNone(tags.tag_id_for_name('suya'))
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Tag.objects.bulk_create([Tag(name='jollof rice', post_count=2), Tag(name='jollof', post_count=1)])
+
+    def test_limit_is_at_least_one(self):
+        response = APIClient().get('/api/autocomplete/', {'q': 'jol', 'type': 'tags', 'limit': 0})
+        self.assertEqual([tag['name'] for tag in response.json()['tags']], ['jollof rice'])
+
+    def test_prefixes_with_spaces_are_cached(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            self.assertEqual(len(autocomplete.complete_tags('jollof r')), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(autocomplete.complete_tags('jollof r')), 1)
+
+
+class JSONKeyFilterTests(TestCase):
+    def setUp(self):
+        diets = ['vegan', 'vegetarian', 'pescatarian', None]
+        self.users = User.objects.bulk_create([
+            User(email=f'cook{i}@example.com', username=f'cook{i}', metadata={'diet': diets[i % 4]} if diets[i % 4] else {})
+            for i in range(40)
+        ])
+        Post.objects.create(author=self.users[0], content='Efo riro', thumbnail={'url': 'x.png', 'cuisine': 'yoruba'})
+        Post.objects.create(author=self.users[0], content='Ofe onugbu', thumbnail={'cuisine': 'igbo'})
+        Post.objects.create(author=self.users[0], content='Toast')
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+        if connection.vendor == 'postgresql':
+            # A handful of rows fit a page, so the planner would scan them whatever the indexes.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def filtered(self, queryset, query):
+        return json_filters.filter_queryset(queryset, QueryDict(query))
+
+    def test_filters_users_and_posts(self):
+        response = self.client.get('/api/users/', {'metadata__diet': 'vegan'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 10)
+
+        response = self.client.get('/api/posts/', {'thumbnail__cuisine__in': 'yoruba,igbo'})
+        self.assertEqual(sorted(post['content'] for post in response.json()['results']), ['Efo riro', 'Ofe onugbu'])
+
+    def test_undeclared_keys_are_rejected(self):
+        for query in ({'metadata__bio': 'x'}, {'metadata__diet__icontains': 'v'}, {'avatar_media__url': 'x'}):
+            self.assertEqual(self.client.get('/api/users/', query).status_code, 400)
+        too_many = ','.join(str(i) for i in range(JSON_FILTER_MAX_VALUES + 1))
+        self.assertEqual(self.client.get('/api/users/', {'metadata__diet__in': too_many}).status_code, 400)
+
+    def test_lookups_use_the_key_indexes(self):
+        plans = {
+            'api_user_metadata_diet_idx': self.filtered(User.objects.all(), 'metadata__diet=vegan').explain(),
+            'api_user_metadata_cuisine_idx': self.filtered(User.objects.all(), 'metadata__cuisine__in=yoruba,igbo').explain(),
+            'api_post_thumbnail_cuisine_idx': self.filtered(Post.objects.all(), 'thumbnail__cuisine=igbo').explain(),
+        }
+        for index, plan in plans.items():
+            self.assertIn(index, plan)
+
+
+class SoftDeleteTests(TestCase):
+    def test_anonymous_users_cannot_delete_or_edit_posts(self):
+        post = Post.objects.create(content='No author')
+        client = APIClient()
+
+        self.assertEqual(client.delete(f'/api/posts/{post.id}/').status_code, 401)
+        self.assertEqual(client.patch(f'/api/posts/{post.id}/', {'content': 'Mine'}).status_code, 401)
+        post.refresh_from_db()
+        self.assertIsNone(post.deleted_at)
+        self.assertEqual(post.content, 'No author')
+
+    def test_deleted_at_is_read_only(self):
+        author = User.objects.create(email='cook@example.com', username='cook')
+        post = Post.objects.create(author=author, content='Jollof')
+        client = APIClient()
+        client.force_authenticate(author)
+
+        response = client.patch(f'/api/posts/{post.id}/', {'deleted_at': timezone.now().isoformat()}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Post.objects.filter(id=post.id).exists())
+
+    def test_email_of_an_account_waiting_for_purge_is_taken(self):
+        user = User.objects.create(email='gone@example.com', username='gone')
+        moderation.soft_delete_account(user)
+
+        serializer = RegisterSerializer(data={'email': 'gone@example.com', 'username': 'back', 'password': 'A-long-pass-123'})
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('email', serializer.errors)
+
+
+class MediaUploadTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(MEDIA_ROOT=media_root.name, MEDIA_WORKERS=0, JOBS_ALWAYS_EAGER=True)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.media_root = media_root.name
+        self.user = User.objects.create(email='cook@example.com', username='cook', is_active=True)
+
+    def image(self, name='photo.png'):
+        output = io.BytesIO()
+        Image.new('RGB', (400, 300), 'orange').save(output, 'PNG')
+        return SimpleUploadedFile(name, output.getvalue(), content_type='image/png')
+
+    def stored(self):
+        return sorted(os.path.relpath(os.path.join(root, name), self.media_root) for root, _, names in os.walk(self.media_root) for name in names)
+
+    def test_uploads_are_stored_only_for_valid_posts_of_signed_in_users(self):
+        client = APIClient()
+        self.assertEqual(client.post('/api/posts/', {'content': 'Jollof', 'tags': ['rice'], 'thumbnail': self.image()}).status_code, 401)
+        client.force_authenticate(self.user)
+        self.assertEqual(client.post('/api/posts/', {'title': 'No content', 'tags': ['rice'], 'thumbnail': self.image()}).status_code, 400)
+        self.assertEqual(self.stored(), [])
+
+        response = client.post('/api/posts/', {'content': 'Jollof', 'tags': ['rice'], 'thumbnail': self.image()})
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('files', response.json()['thumbnail'])
+        self.assertEqual(len(self.stored()), 1 + len(Post.objects.get().thumbnail['variants']))
+
+    def test_thumbnail_sent_back_as_read_keeps_its_files(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        created = client.post('/api/posts/', {'content': 'Jollof', 'tags': ['rice'], 'thumbnail': self.image()}).json()
+        stored = self.stored()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.put(f"/api/posts/{created['id']}/", {**created, 'title': 'Party jollof', 'tags': ['rice']}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stored(), stored)
+        thumbnail = Post.objects.get().thumbnail
+        self.assertIn('variants', thumbnail)
+        self.assertEqual(sorted(thumbnail['files']), stored)
+
+    def test_only_the_author_can_edit_a_post(self):
+        post = Post.objects.create(author=self.user, content='Jollof')
+        other = User.objects.create(email='other@example.com', username='other', is_active=True)
+        client = APIClient()
+        client.force_authenticate(other)
+        self.assertEqual(client.patch(f'/api/posts/{post.id}/', {'content': 'Fried rice'}, format='json').status_code, 403)
+        self.assertEqual(client.put(f'/api/posts/{post.id}/', {'content': 'Fried rice', 'tags': ['rice']}, format='json').status_code, 403)
+        post.refresh_from_db()
+        self.assertEqual(post.content, 'Jollof')
+
+    def test_replaced_avatars_are_deleted(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        client.put('/api/auth/update-user/', {'avatar': self.image()})
+        first = self.stored()
+        with self.captureOnCommitCallbacks(execute=True):
+            client.put('/api/auth/update-user/', {'avatar': self.image()})
+
+        remaining = self.stored()
+        self.assertTrue(first)
+        self.assertFalse(set(first) & set(remaining))
+        self.user.refresh_from_db()
+        self.assertEqual(remaining, sorted(self.user.avatar_media['files']))
+
+
+class SyncTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(email='author@example.com', username='author')
+        self.liker = User.objects.create(email='liker@example.com', username='liker')
+        self.post = Post.objects.create(author=self.author, content='Jollof')
+        self.post.likes.add(self.liker)
+        self.client = APIClient()
+        self.client.force_authenticate(self.liker)
+
+    def settle(self):
+        SyncEvent.objects.update(created_at=timezone.now() - timedelta(minutes=1))
+
+    def test_limits_below_one_still_advance(self):
+        self.settle()
+        for limit in (0, -1, -5):
+            response = self.client.get('/api/sync/', {'since': 0, 'limit': limit})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response.json()['cursor'], '0')
+
+    def test_cursor_stays_behind_recent_events(self):
+        response = self.client.get('/api/sync/', {'since': 0}).json()
+        self.assertEqual(response['liked'], [str(self.post.id)])
+        self.assertEqual(response['cursor'], '0')
+
+        self.settle()
+        self.assertNotEqual(self.client.get('/api/sync/', {'since': 0}).json()['cursor'], '0')
+
+    def test_likers_of_a_deleted_post_get_its_tombstones(self):
+        self.settle()
+        cursor = self.client.get('/api/sync/', {'since': 0}).json()['cursor']
+        Post.all_objects.filter(id=self.post.id).delete()
+
+        response = self.client.get('/api/sync/', {'since': cursor}).json()
+        self.assertEqual(response['deleted_posts'], [str(self.post.id)])
+        self.assertEqual(response['unliked'], [str(self.post.id)])
+
+    def test_soft_deleted_posts_are_tombstoned_at_once(self):
+        self.client.force_authenticate(self.author)
+        self.settle()
+        cursor = self.client.get('/api/sync/', {'since': 0}).json()['cursor']
+        moderation.soft_delete_posts(Post.objects.filter(id=self.post.id))
+        self.settle()
+
+        response = self.client.get('/api/sync/', {'since': cursor}).json()
+        self.assertEqual(response['deleted_posts'], [str(self.post.id)])
+
+
+# Logins check passwords in a worker thread, outside the test case's transaction.
+@override_settings(PASSWORD_HASHING_ITERATIONS=1000)
+class AuthTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='cook@example.com', username='cook', is_active=True)
+        # An older work factor, as left by a change of `PASSWORD_HASHING_ITERATIONS`.
+        self.user.password = hashers.make_password('A-long-pass-123', hasher=hashers.PBKDF2PasswordHasher())
+        self.user.save()
+
+    def login(self, **data):
+        return self.client.post('/api/auth/login/', data, content_type='application/json')
+
+    def test_login_returns_a_token_pair_and_reencodes_old_hashes(self):
+        response = self.login(email='cook@example.com', password='A-long-pass-123')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {'refresh', 'access'})
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+        self.assertEqual(self.login(email='cook@example.com', password='A-long-pass-123').status_code, 200)
+
+    def test_login_errors_match_simplejwt(self):
+        self.assertEqual(self.login(email='cook@example.com').json(), {'password': ['This field is required.']})
+
+        for data in ({'email': 'cook@example.com', 'password': 'wrong'}, {'email': 'nobody@example.com', 'password': 'x'}):
+            response = self.login(**data)
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(response.json(), {'detail': 'No active account found with the given credentials'})
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.login(email='cook@example.com', password='A-long-pass-123').status_code, 401)
+
+    def test_register_stores_a_hashed_password(self):
+        data = {'email': 'new@example.com', 'username': 'new', 'password': 'Another-pass-456'}
+        response = self.client.post('/api/auth/register/', data, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['data']['user']['email'], 'new@example.com')
+        self.assertTrue(User.objects.get(email='new@example.com').check_password('Another-pass-456'))
+
+        response = self.client.post('/api/auth/register/', data, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.json()['errors'])
+
+
+class CommentTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='cook@example.com', username='cook')
+        self.post = Post.objects.create(author=self.user, content='Jollof')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def comment(self, parent=None):
+        body = {'content': 'Needs more pepper'}
+        if parent is not None:
+            body['parent'] = parent
+        response = self.client.post(f'/api/posts/{self.post.id}/comments/', body, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def test_replies_are_listed_in_thread_order_with_their_depth(self):
+        top = self.comment()
+        first = self.comment(top)
+        nested = self.comment(first)
+        second = self.comment(top)
+
+        self.assertEqual(
+            Comment.objects.get(id=nested).path,
+            ''.join(comments.encode_segment(comment_id) for comment_id in (top, first, nested)),
+        )
+        replies = self.client.get(f'/api/comments/{top}/replies/').json()['results']
+        self.assertEqual([(reply['id'], reply['depth']) for reply in replies], [(first, 1), (nested, 2), (second, 1)])
+
+    def test_replies_past_the_maximum_depth_go_to_the_parent(self):
+        with mock.patch.object(comments, 'COMMENT_MAX_DEPTH', 1):
+            top = self.comment()
+            reply = self.comment(top)
+            capped = self.comment(reply)
+
+        capped = Comment.objects.get(id=capped)
+        self.assertEqual((capped.parent_id, capped.depth), (top, 1))
+        self.assertEqual(Comment.objects.get(id=top).reply_count, 2)
+
+    def test_deleting_a_subtree_updates_the_counts(self):
+        top = self.comment()
+        reply = self.comment(top)
+        self.comment(reply)
+        self.comment(reply)
+
+        self.assertEqual(self.client.delete(f'/api/comments/{reply}/').status_code, 204)
+        self.assertEqual(list(Comment.objects.values_list('id', flat=True)), [top])
+        self.assertEqual(Comment.objects.get(id=top).reply_count, 0)
+        self.assertEqual(Post.objects.get().comment_count, 1)
+
+    def test_cursor_pages_do_not_skip_or_repeat(self):
+        top = self.comment()
+        replies = [self.comment(top) for _ in range(5)]
+        others = [self.comment() for _ in range(4)]
+
+        for url, expected in (
+            (f'/api/comments/{top}/replies/?page_size=2', replies),
+            (f'/api/posts/{self.post.id}/comments/?page_size=2', [*reversed(others), top]),
+        ):
+            seen = []
+            while url:
+                page = self.client.get(url).json()
+                seen += [comment['id'] for comment in page['results']]
+                url = page['next']
+            self.assertEqual(seen, expected)
+
+    def test_threads_of_soft_deleted_posts_are_hidden(self):
+        top = self.comment()
+        self.comment(top)
+        moderation.soft_delete_posts(Post.objects.all())
+
+        self.assertEqual(self.client.get(f'/api/comments/{top}/replies/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/posts/{self.post.id}/comments/').status_code, 404)
+
+
+class NotificationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='cook@example.com', username='cook')
+        same_instant = timezone.now()
+        self.notifications = Notification.objects.bulk_create([
+            # Follow groups are keyed on the recipient; distinct targets stand in for five groups.
+            Notification(recipient=self.user, verb=Notification.FOLLOW, target_id=uuid.uuid4(), updated_at=same_instant)
+            for _ in range(5)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_pages_do_not_skip_or_repeat_ties(self):
+        seen = []
+        url = '/api/notifications/?page_size=2'
+        while url:
+            page = self.client.get(url).json()
+            seen += [notification['id'] for notification in page['results']]
+            url = page['next']
+        self.assertEqual(sorted(seen), sorted(notification.id for notification in self.notifications))
+
+    def test_read_validates_ids(self):
+        for body in ([1, 2], {'ids': '12'}, {'ids': ['x']}):
+            self.assertEqual(self.client.post('/api/notifications/read/', body, format='json').status_code, 400)
+
+        first = self.notifications[0].id
+        response = self.client.post('/api/notifications/read/', {'ids': [first]}, format='json')
+        self.assertEqual(response.json(), {'unread_count': 4})
+        self.assertEqual(self.client.post('/api/notifications/read/').json(), {'unread_count': 0})
+
+
+class NotificationFlushTests(TransactionTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(notifications, '_start_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Other tests' events.
+        notifications._take()
+        self.addCleanup(notifications._take)
+        self.addCleanup(notifications._attempts.clear)
+        self.recipient, self.actor = [User.objects.create(email=f'cook{i}@example.com', username=f'cook{i}') for i in range(2)]
+
+    def test_groups_of_deleted_recipients_are_dropped(self):
+        gone = uuid.uuid4()
+        notifications.notify(notifications.FOLLOW, self.recipient.id, self.recipient.id, self.actor.id)
+        notifications.notify(notifications.FOLLOW, gone, gone, self.actor.id)
+
+        with self.assertLogs('api.notifications', 'WARNING'):
+            self.assertEqual(notifications.flush(), (1, 1))
+        self.assertEqual(list(Notification.objects.values_list('recipient_id', flat=True)), [self.recipient.id])
+        self.assertEqual(notifications._take(), {})
+
+    def test_failing_groups_are_put_back_a_bounded_number_of_times(self):
+        notifications.notify(notifications.FOLLOW, self.recipient.id, self.recipient.id, self.actor.id)
+        with mock.patch.object(notifications, '_upsert', side_effect=OperationalError), self.assertLogs('api.notifications'):
+            for _ in range(NOTIFICATION_FLUSH_MAX_ATTEMPTS - 1):
+                self.assertEqual(notifications.flush(), (0, 0))
+                self.assertEqual(len(notifications._pending), 1)
+            notifications.flush()
+        self.assertEqual(notifications._pending, {})
+
+
+class AdmissionTests(TestCase):
+    def queue(self, gate, priority, woken, name):
+        return gate._enqueue(priority, lambda: woken.append(name))
+
+    def settle(self, gate, priority, queued):
+        waiter, _, since = queued
+        return gate._settle(priority, waiter, since)
+
+    def test_gate_admits_up_to_its_limit_then_queues_then_sheds(self):
+        gate = admission.Gate('test', 1, max_queue=1)
+        self.assertTrue(gate.try_acquire())
+        self.assertFalse(gate.try_acquire())
+
+        woken = []
+        waiter, timeout, _ = self.queue(gate, admission.ANONYMOUS, woken, 'queued')
+        self.assertEqual(timeout, gate.interval)
+        self.assertIsNone(self.queue(gate, admission.AUTHENTICATED, woken, 'shed'))
+        self.assertEqual(
+            {outcome: gate.counts[outcome] for outcome in (admission.ADMITTED, admission.QUEUED, admission.SHED_QUEUE_FULL)},
+            {admission.ADMITTED: 1, admission.QUEUED: 1, admission.SHED_QUEUE_FULL: 1},
+        )
+
+    def test_release_hands_the_slot_to_a_waiter(self):
+        gate = admission.Gate('test', 1)
+        gate.try_acquire()
+        woken = []
+        anonymous = self.queue(gate, admission.ANONYMOUS, woken, 'anonymous')
+        write = self.queue(gate, admission.AUTHENTICATED_WRITE, woken, 'write')
+
+        gate.release()
+        self.assertEqual((woken, gate.active), (['write'], 1))
+        self.assertIsNotNone(self.settle(gate, admission.AUTHENTICATED_WRITE, write))
+        gate.release()
+        self.assertEqual((woken, gate.active), (['write', 'anonymous'], 1))
+        self.assertIsNotNone(self.settle(gate, admission.ANONYMOUS, anonymous))
+        gate.release()
+        self.assertEqual((gate.active, gate.stats()['waiting']), (0, 0))
+
+    def test_standing_queues_serve_the_newest_first_and_time_out(self):
+        gate = admission.Gate('test', 1)
+        gate.try_acquire()
+        woken = []
+        oldest = self.queue(gate, admission.ANONYMOUS, woken, 'oldest')
+        self.queue(gate, admission.ANONYMOUS, woken, 'newest')
+        gate._last_empty -= gate.interval * 2
+
+        self.assertEqual(self.queue(gate, admission.ANONYMOUS, woken, 'latest')[1], gate.target)
+        gate.release()
+        self.assertEqual(woken, ['latest'])
+        self.assertIsNone(self.settle(gate, admission.ANONYMOUS, oldest))
+        self.assertEqual(gate.counts[admission.SHED_TIMEOUT], 1)
+
+    def test_acquire_waits_for_a_release(self):
+        gate = admission.Gate('test', 1, interval=5)
+        gate.try_acquire()
+        waited = []
+        thread = threading.Thread(target=lambda: waited.append(gate.acquire(admission.AUTHENTICATED)))
+        thread.start()
+        while not gate.stats()['waiting']:
+            time.sleep(0.001)
+        gate.release()
+        thread.join()
+        self.assertGreater(waited[0], 0)
+        self.assertEqual(gate.active, 1)
+
+    def test_logins_get_a_slot_per_hashing_worker(self):
+        self.assertEqual(admission.cost_class('/api/auth/login/'), admission.HASHING)
+        self.assertEqual(admission.gate_for('/api/auth/login/', '').limit, max(settings.PASSWORD_HASHING_WORKERS, 2))
+
+
+class GraphTests(TestCase):
+    def test_following_again_notifies_and_syncs_only_new_followees(self):
+        me, old, new = [User.objects.create(email=f'cook{i}@example.com', username=f'cook{i}') for i in range(3)]
+        with mock.patch.object(notifications, 'notify_follows') as notify_follows:
+            graph.follow_users(me, [old.id])
+            self.assertEqual(graph.follow_users(me, [old.id, new.id]), {old.id, new.id})
+
+        self.assertEqual(notify_follows.call_args_list, [mock.call(me.id, {old.id}), mock.call(me.id, {new.id})])
+        self.assertEqual(
+            sorted(SyncEvent.objects.filter(kind=SyncEvent.FOLLOW).values_list('object_id', flat=True)),
+            sorted([old.id, new.id]),
+        )
+
+    def test_suggestions_load_followees_in_one_query(self):
+        me, *followees, popular, other = [
+            User.objects.create(email=f'cook{i}@example.com', username=f'cook{i}') for i in range(6)
+        ]
+        me.following.add(*followees)
+        for followee in followees:
+            followee.following.add(popular)
+        followees[0].following.add(other)
+        cache.clear()
+
+        # Who `me` follows, who each followee follows (all at once), who follows `me`.
+        with self.assertNumQueries(3):
+            suggestions = graph.suggested_follow_ids(me.id)
+        self.assertEqual(suggestions, [popular.id, other.id])
+        with self.assertNumQueries(0):
+            graph.suggested_follow_ids(me.id)
+
+
+class JobTests(TestCase):
+    def test_stale_jobs_out_of_attempts_are_dead(self):
+        long_ago = timezone.now() - timedelta(days=1)
+        retried, last_try = Job.objects.bulk_create([
+            Job(name='noop', status=Job.RUNNING, locked_by='gone', locked_at=long_ago, attempts=1, max_attempts=3),
+            Job(name='noop', status=Job.RUNNING, locked_by='gone', locked_at=long_ago, attempts=3, max_attempts=3),
+        ])
+
+        with self.assertLogs('api.jobs', 'ERROR'):
+            self.assertEqual(jobs.requeue_stale(), 1)
+        retried.refresh_from_db()
+        last_try.refresh_from_db()
+        self.assertEqual((retried.status, retried.locked_by), (Job.QUEUED, None))
+        self.assertEqual((last_try.status, last_try.locked_by), (Job.DEAD, None))
+
+    def test_jobs_of_a_batch_are_locked_when_they_start(self):
+        Job.objects.bulk_create([Job(name='noop', run_at=timezone.now()) for _ in range(2)])
+        first, second = jobs.claim('worker', limit=2)
+        # `second` waited behind a slow `first`, and was requeued and claimed by another worker meanwhile.
+        Job.objects.filter(id=second.id).update(locked_by='other')
+
+        self.assertTrue(jobs.execute(first))
+        self.assertFalse(jobs.execute(second))
+        self.assertEqual(Job.objects.get(id=first.id).status, Job.DONE)
+        self.assertEqual(Job.objects.get(id=second.id).status, Job.RUNNING)
+
+    def test_prune_deletes_only_old_done_jobs(self):
+        long_ago = timezone.now() - timedelta(days=30)
+        old_done, recent_done, old_dead, queued = Job.objects.bulk_create([
+            Job(name='noop', status=Job.DONE, finished_at=long_ago),
+            Job(name='noop', status=Job.DONE, finished_at=timezone.now()),
+            Job(name='noop', status=Job.DEAD, finished_at=long_ago),
+            Job(name='noop'),
+        ])
+
+        self.assertEqual(jobs.prune_finished(batch_size=1), 1)
+        self.assertEqual(set(Job.objects.values_list('id', flat=True)), {recent_done.id, old_dead.id, queued.id})
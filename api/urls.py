@@ -3,21 +3,27 @@
 
 from django.urls import path
 
+from api.auth.login import LoginView
 from api.auth.otp import ResendOTPView, VerifyOTPView, RegisterView
 from api.auth.reset_password import PasswordResetRequestView, PasswordResetTokenValidateView, PasswordResetView, ResendPasswordResetView
 from api.email_views import EmailVerify
+from api.metrics import metrics_view
 
 from api.views import (
+    AutocompleteView,
+    CommentViewSet,
     CurrentUserView,
     LogoutView,
-    ObtainTokenPairView, 
     PostViewSet, 
     LikePostView,
     TrendingPostListView,
     UpdateUserView,
     UserViewSet,
     LikedPostsViewSet,
+    NotificationViewSet,
     ProfileViewSet,
+    SyncView,
+    TagViewSet,
 )
 
 from rest_framework_simplejwt.views import TokenRefreshView
@@ -29,15 +35,21 @@ router.register("posts", PostViewSet, basename="posts")
 router.register('recipes/favorites', LikedPostsViewSet, basename='favorites')
 router.register("users", UserViewSet, basename="users")
 router.register("profile", ProfileViewSet, basename="profile")
+router.register("tags", TagViewSet, basename="tags")
+router.register("comments", CommentViewSet, basename="comments")
+router.register("notifications", NotificationViewSet, basename="notifications")
 
 urlpatterns = [
-    path('auth/login/', ObtainTokenPairView.as_view(), name='token_obtain_pair'),
+    path('auth/login/', LoginView.as_view(), name='token_obtain_pair'),
     path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('auth/register/', RegisterView.as_view(), name='register'),
     path('auth/logout/', LogoutView.as_view(), name='logout'),
 
     path('posts/<uuid:id>/like/', LikePostView.as_view(), name='like_post'),
     path('posts/trending/', TrendingPostListView.as_view(), name='trending_posts'),
+    path('autocomplete/', AutocompleteView.as_view(), name='autocomplete'),
+    path('sync/', SyncView.as_view(), name='sync'),
+    path('metrics/', metrics_view, name='metrics'),
 
     path('auth/user/', CurrentUserView.as_view(), name='current_user'),
     path('auth/update-user/', UpdateUserView.as_view(), name='update_user'),
@@ -12,35 +12,49 @@ that makes it possible for clients to communicate with the Culinara application.
 +++++++++++++++++++++
 """
 
-from datetime import timedelta
 import json
+import logging
 import re
+import uuid
 
 from rest_framework.generics import CreateAPIView, DestroyAPIView, ListAPIView
 from rest_framework.views import APIView
-from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
+from rest_framework.mixins import DestroyModelMixin
+from rest_framework.viewsets import GenericViewSet, ModelViewSet, ReadOnlyModelViewSet
 from rest_framework import status
 from rest_framework.response import Response
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotAuthenticated, PermissionDenied, ValidationError
 from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.pagination import PageNumberPagination
 
 from django.shortcuts import get_object_or_404
-from django.db.models import Count, Q
-from django.utils import timezone
+from django.db import transaction
+from django.db.models import Count, F, Q
 
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenRefreshView
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from api.constants import STOPWORDS
-from api.models import Post, Tag, User
-from api.paginations import NextPageNumberPagination, StandardResultsSetPagination
-from api.serializers import PostSerializer, RegisterSerializer, TokenObtainPairSerializer, UserSerializer
-
-class ObtainTokenPairView(TokenObtainPairView):
-    permission_classes = (AllowAny,)
-    serializer_class = TokenObtainPairSerializer
+from api import (
+    autocomplete, comments, graph, home, impressions, media, moderation, notifications, objects, partitions, similar,
+    sync, tags,
+)
+from api.single_flight import SingleFlightMixin
+from api.constants import (
+    AUTOCOMPLETE_LIMIT, BATCH_GET_LIMIT, BULK_FOLLOW_LIMIT, HOME_SECTION_LIMIT, HOME_SECTION_MAX_LIMIT, STOPWORDS, SYNC_BATCH_SIZE,
+)
+from api.fast_serializers import FastPostSerializer, FastSerializerMixin
+from api.json_filters import JSONKeyFilter
+from api.models import Comment, Like, Notification, Post, PostQuerySet, SyncEvent, Tag, User
+from api.paginations import (
+    CommentCursorPagination, KnownCountPagination, LikedAtCursorPagination, NextPageNumberPagination,
+    NotificationCursorPagination, ReplyCursorPagination, StandardResultsSetPagination,
+)
+from api.serializers import (
+    CommentSerializer, NotificationReadSerializer, PostSerializer, RegisterSerializer, TagSerializer, UserSerializer,
+)
+
+logger = logging.getLogger(__name__)
 
 
 class RefreshTokenView(TokenRefreshView):
@@ -78,7 +92,7 @@ class RegisterView(CreateAPIView):
             return Response(response, status=status.HTTP_201_CREATED, headers=headers)
         
         except ValidationError as e:
-            print(e)
+            logger.info('Registration failed: %s', e.detail)
             response = dict(
                 status="Bad request",
                 message='Registration failed',
@@ -93,16 +107,47 @@ class RegisterView(CreateAPIView):
         return user
 
 
-class PostViewSet(ModelViewSet):
+def batch_response(request, load):
+    """
+    Resolve `?ids=<id>,<id>,...` with `load` (`objects.get_posts` or `objects.get_users`).
+
+    Returns `{"results": [...], "missing": [<id>, ...]}`, both in the order the IDs were given.
+    """
+    ids = [object_id for value in request.query_params.getlist('ids') for object_id in value.split(',') if object_id]
+    if not ids:
+        return Response({'detail': "`ids` is required."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(ids) > BATCH_GET_LIMIT:
+        return Response({'detail': f"You can fetch at most {BATCH_GET_LIMIT} IDs at once."}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        ids = list(dict.fromkeys(str(uuid.UUID(object_id)) for object_id in ids))
+    except ValueError:
+        return Response({'detail': "Invalid ID."}, status=status.HTTP_400_BAD_REQUEST)
+
+    found = load(ids)
+    return Response({
+        'results': [found[object_id] for object_id in ids if object_id in found],
+        'missing': [object_id for object_id in ids if object_id not in found],
+    }, status=status.HTTP_200_OK)
+
+
+class PostViewSet(SingleFlightMixin, FastSerializerMixin, ModelViewSet):
     queryset = Post.objects.all().order_by('-created_at')
     serializer_class = PostSerializer
+    fast_serializer_class = FastPostSerializer
     permission_classes = (AllowAny,)
+    filter_backends = [JSONKeyFilter]
     lookup_field = 'id'
 
+    def get_permissions(self):
+        if self.action in ('create', 'update', 'partial_update', 'destroy'):
+            return [IsAuthenticated()]
+        return super().get_permissions()
+
     def get(self, request, *args, **kwargs):
         user = request.user
         posts = Post.objects.filter(
-                    Q(likes=user) | Q(author__in=user.following.all())
+                    Q(likes=user) | Q(author__in=graph.following_ids(user.id))
                 ).distinct().annotate(
                     likes_count=Count('likes')
                 ).order_by('-likes_count', '-created_at')
@@ -110,10 +155,16 @@ class PostViewSet(ModelViewSet):
     
 
     def create(self, request, *args, **kwargs):
-        data = request.data.copy()
+        # An uploaded thumbnail (multipart) gets variants made (`api.media`); uploaded files do not
+        # survive `QueryDict.copy()`, so it is taken from `FILES`. It is stored only once the rest
+        # of the post is valid.
+        upload = request.FILES.get('thumbnail')
+        data = (request.POST if upload is not None else request.data).copy()
 
         thumbnail_str = data.get('thumbnail')
-        if isinstance(thumbnail_str, str):
+        if upload is not None:
+            data.pop('thumbnail', None)
+        elif isinstance(thumbnail_str, str):
             try:
                 data['thumbnail'] = json.loads(thumbnail_str)
             except json.JSONDecodeError:
@@ -121,33 +172,76 @@ class PostViewSet(ModelViewSet):
 
         serializer = self.get_serializer(data=data)
         serializer.is_valid(raise_exception=True)
-        post = serializer.save(author=request.user)
+        if upload is None:
+            serializer.save(author=request.user)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+        try:
+            thumbnail, stored_name = media.store_upload(upload, media.THUMBNAIL)
+        except media.InvalidImage as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            post = serializer.save(author=request.user, thumbnail=thumbnail)
+        except Exception:
+            media.delete_files([stored_name])
+            raise
+        media.schedule_variants(media.THUMBNAIL, post.id, stored_name)
+        # The variants are there already when jobs run eagerly.
+        post.refresh_from_db(fields=['thumbnail'])
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    def retrieve(self, request, *args, **kwargs):
+        # A post looks the same to everyone, so a viral post is read and serialized once at a time.
+        response = self.single_flight(request, lambda: super(PostViewSet, self).retrieve(request, *args, **kwargs))
+        impressions.record_views([response.data['id']], impressions.viewer(request))
+        return response
+
+    def perform_update(self, serializer):
+        user = self.request.user
+        if serializer.instance.author_id != user.id and not user.is_staff:
+            raise PermissionDenied("You can only edit your own posts.")
+        previous = serializer.instance.thumbnail
+        post = serializer.save()
+        # The same image sent back (as it was read, with other fields changed) is not a replacement.
+        image = post.thumbnail.get('image') if isinstance(post.thumbnail, dict) else None
+        if isinstance(previous, dict) and image != previous.get('image'):
+            media.discard([previous], keep=post.thumbnail)
+
+    def perform_destroy(self, instance):
+        """Hide the post right away; its likes and tags are purged in the background."""
+        user = self.request.user
+        if instance.author_id != user.id and not user.is_staff:
+            raise PermissionDenied("You can only delete your own posts.")
+        moderation.soft_delete_posts(Post.objects.filter(id=instance.id))
+
     @action(detail=False, methods=['get'], url_path='tags')
     def posts_by_tag(self, request):
+        """Newest posts for a tag, read off the `(tag_id, created_at)` index and cached per page."""
         tag_name = request.query_params.get('tag', None)
         
         if tag_name is None:
             return Response({"detail": "Tag query parameter is required."}, status=400)
         
-        try:
-            tag = Tag.objects.get(name=tag_name)
-        except Tag.DoesNotExist:
+        tag_id = tags.tag_id_for_name(tag_name)
+        if tag_id is None:
             return Response({"detail": f"Tag '{tag_name}' not found."}, status=404)
-        
-        queryset = Post.objects.filter(tags=tag) \
-            .annotate(like_count=Count('likes')) \
-            .order_by('-like_count', '-created_at')
 
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+        paginator = KnownCountPagination()
+        page_number = request.query_params.get(paginator.page_query_param, 1)
+        page_size = paginator.get_page_size(request)
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        data = tags.get_cached_page(tag_id, page_number, page_size)
+        if data is None:
+            post_count = Tag.objects.filter(id=tag_id).values_list('post_count', flat=True).first()
+            if post_count is None:
+                # Deleted after its name was cached where `forget_tag` could not reach, e.g. another process's cache.
+                tags.forget_name(tag_name)
+                return Response({"detail": f"Tag '{tag_name}' not found."}, status=404)
+            page = paginator.paginate_queryset(tags.posts_for_tag(tag_id), request, view=self, count=post_count)
+            data = paginator.get_paginated_response(self.get_serializer(page, many=True).data).data
+            tags.set_cached_page(tag_id, page_number, page_size, data)
+
+        return Response(data)
 
     @action(detail=False, methods=['get'], url_path='search')
     def search(self, request):
@@ -196,44 +290,97 @@ class PostViewSet(ModelViewSet):
         
         tab = request.query_params.get('tab', 'all').lower()
 
-        one_day_ago = timezone.now() - timedelta(days=1)
+        if tab == 'for-me' and not request.user.is_authenticated:
+            return Response({'detail': 'Authentication required for personalized posts.'}, status=status.HTTP_401_UNAUTHORIZED)
 
-        if tab == 'trending':
-            posts = Post.objects.filter(
-                created_at__lte=one_day_ago
-            ).annotate(
-                likes_count=Count('likes')
-            ).order_by('-likes_count', '-created_at')
+        # Every tab but `for-me` is the same for everyone.
+        response = self.single_flight(request, lambda: self._explore(request, tab), shared=tab != 'for-me')
+        posts = response.data['results'] if isinstance(response.data, dict) else response.data
+        impressions.record_impressions([post['id'] for post in posts], impressions.viewer(request))
+        return response
 
-        elif tab == 'recent':
-            posts = Post.objects.all().order_by('-created_at')
+    def _explore(self, request, tab):
+        posts = home.explore_queryset(tab, request.user)
 
-        elif tab == 'popular':
-            posts = Post.objects.annotate(
-                likes_count=Count('likes')
-            ).order_by('-likes_count', '-created_at')
+        page = self.paginate_queryset(posts)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(posts, many=True).data, status=status.HTTP_200_OK)
 
-        elif tab == 'for-me':
-            if request.user.is_authenticated:
-                user = request.user
-                posts = Post.objects.filter(
-                    Q(likes=user) | Q(author__in=user.following.all()) | Q(tags__in=user.followed_tags.all())
-                ).distinct().annotate(
-                    likes_count=Count('likes')
-                ).order_by('-likes_count', '-created_at')
-            else:
-                return Response({'detail': 'Authentication required for personalized posts.'}, status=status.HTTP_401_UNAUTHORIZED)
+    @action(detail=False, methods=['get'], url_path='home')
+    def home(self, request):
+        """The home screen in one request: several explore tabs, each post serialized once.
 
-        else:
-            posts = Post.objects.all().annotate(
-                likes_count=Count('likes')
-            ).order_by('-created_at')
+        `GET /api/posts/home/?sections=trending,recent,for-me&limit=8` returns
+        `{"sections": {"trending": [<post id>, ...], ...}, "posts": {<post id>: <post>, ...}}`.
+        Omitting `sections` returns every section available to the user.
+        """
+        available = [
+            section for section in home.HOME_SECTIONS
+            if section != 'for-me' or request.user.is_authenticated
+        ]
+        requested = request.query_params.get('sections')
+        sections = [section for section in requested.split(',') if section] if requested else available
 
-        page = self.paginate_queryset(posts)
-        if page is not None:
-            return self.get_paginated_response(PostSerializer(page, many=True).data)
+        unknown = [section for section in sections if section not in available]
+        if unknown:
+            return Response({'detail': f"Unknown or unavailable sections: {', '.join(unknown)}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', HOME_SECTION_LIMIT)), HOME_SECTION_MAX_LIMIT))
+        except ValueError:
+            limit = HOME_SECTION_LIMIT
+
+        data = home.home_sections(list(dict.fromkeys(sections)), request.user, limit)
+        impressions.record_impressions(data['posts'], impressions.viewer(request))
+        return Response(data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'], url_path='similar')
+    def similar_posts(self, request, id=None):
+        """The "more like this" rail: posts sharing tags and likers with this one, best first."""
+        try:
+            similar_ids = similar.similar_post_ids(uuid.UUID(id))
+        except ValueError:
+            similar_ids = None
+        if similar_ids is None:
+            return Response({'detail': "Post not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        posts = objects.get_posts(similar_ids)
+        return Response([posts[post_id] for post_id in similar_ids if post_id in posts], status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='batch')
+    def batch(self, request):
+        """Up to `BATCH_GET_LIMIT` posts by ID, e.g. `GET /api/posts/batch/?ids=<id>,<id>`. See `batch_response`."""
+        return batch_response(request, objects.get_posts)
+
+    @action(detail=True, methods=['get', 'post'], url_path='comments')
+    def comments(self, request, id=None):
+        """
+        Top-level comments, newest first, each with the start of its thread under `replies`. See `api.comments`.
 
-        return Response(PostSerializer(posts, many=True).data, status=status.HTTP_200_OK)
+        `POST` adds a comment, or a reply: `{"content": "...", "parent": <comment id>}`.
+        """
+        post = get_object_or_404(Post.objects.only('id'), id=id)
+
+        if request.method == 'POST':
+            if not request.user.is_authenticated:
+                raise NotAuthenticated()
+            serializer = CommentSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            parent = serializer.validated_data.get('parent')
+            if parent is not None and parent.post_id != post.id:
+                raise ValidationError({'parent': "The comment replied to is on another post."})
+            try:
+                comment = comments.add_comment(post.id, request.user, serializer.validated_data['content'], parent)
+            except Comment.DoesNotExist:
+                raise ValidationError({'parent': "The comment replied to was deleted."})
+            return Response(comments.FastCommentSerializer(comment).data, status=status.HTTP_201_CREATED)
+
+        paginator = CommentCursorPagination()
+        page = paginator.paginate_queryset(
+            comments.top_level(post.id).values(*comments.FastCommentSerializer.columns), request, view=self,
+        )
+        return paginator.get_paginated_response(comments.serialize_threads(page))
     
 class LikePostView(CreateAPIView, DestroyAPIView):
     """
@@ -255,10 +402,15 @@ class LikePostView(CreateAPIView, DestroyAPIView):
         """Like and Unlike a post
         """
         post: Post = self.get_object()
-        if request.user in post.likes.all():
-            return self.destroy(request, *args, **kwargs)
-        post.likes.add(request.user)
-        post.save()
+        with transaction.atomic():
+            # `api_post_likes` may be partitioned, and then has no `(post_id, user_id)` unique constraint.
+            partitions.lock_unique(Like._meta.db_table, post.id, request.user.id)
+            if Like.objects.filter(post=post, user=request.user).exists():
+                return self.destroy(request, *args, **kwargs)
+            post.likes.add(request.user)
+            # Not a full save: it would write back the F()-bumped counters read with `post`.
+            post.save(update_fields=['updated_at'])
+        notifications.notify(notifications.LIKE, post.author_id, post.id, request.user.id)
         serializer: PostSerializer = self.get_serializer(post)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
@@ -266,11 +418,70 @@ class LikePostView(CreateAPIView, DestroyAPIView):
         """Remove like from a post if user has already liked it."""
         post: Post = self.get_object()
         post.likes.remove(request.user)
-        post.save()
+        post.save(update_fields=['updated_at'])
         serializer: PostSerializer = self.get_serializer(post)
         return Response(serializer.data, status=status.HTTP_200_OK)
     
 
+class CommentViewSet(DestroyModelMixin, GenericViewSet):
+    """Replies to a comment, and deleting comments. Comments are listed and added under their post."""
+    # Threads of soft-deleted posts are hidden along with the post.
+    queryset = Comment.objects.filter(post__deleted_at=None)
+    serializer_class = CommentSerializer
+    permission_classes = (AllowAny,)
+
+    def get_permissions(self):
+        if self.action == 'destroy':
+            return [IsAuthenticated()]
+        return super().get_permissions()
+
+    @action(detail=True, methods=['get'], url_path='replies')
+    def replies(self, request, pk=None):
+        """Everything below the comment in thread order, with `depth` to indent by."""
+        comment = get_object_or_404(self.get_queryset().only('post_id', 'path'), pk=pk)
+        paginator = ReplyCursorPagination()
+        page = paginator.paginate_queryset(
+            comments.descendants(comment.post_id, comment.path).values(*comments.FastCommentSerializer.columns),
+            request, view=self,
+        )
+        return paginator.get_paginated_response(comments.FastCommentSerializer().serialize(page))
+
+    def perform_destroy(self, instance):
+        """Deletes the replies below the comment too."""
+        user = self.request.user
+        if instance.author_id != user.id and not user.is_staff:
+            raise PermissionDenied("You can only delete your own comments.")
+        comments.delete_comment(instance)
+
+
+class NotificationViewSet(GenericViewSet):
+    """The user's notifications, grouped per post or kind of event. See `api.notifications`."""
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        """Most recently updated first; `?unread=true` for unread ones only."""
+        queryset = Notification.objects.filter(recipient_id=request.user.id)
+        if request.query_params.get('unread') == 'true':
+            queryset = queryset.filter(read_at=None)
+
+        paginator = NotificationCursorPagination()
+        page = paginator.paginate_queryset(queryset.values(*notifications.COLUMNS), request, view=self)
+        return paginator.get_paginated_response(notifications.serialize(page))
+
+    @action(detail=False, methods=['get'], url_path='unread-count')
+    def unread_count(self, request):
+        """`{"unread_count": n}`, at most `NOTIFICATION_UNREAD_CAP` (show it as "99+")."""
+        return Response({'unread_count': notifications.unread_count(request.user.id)})
+
+    @action(detail=False, methods=['post'], url_path='read')
+    def read(self, request):
+        """Mark notifications read: those in `{"ids": [...]}`, or all of them without a body."""
+        serializer = NotificationReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        notifications.mark_read(request.user.id, serializer.validated_data.get('ids'))
+        return Response({'unread_count': notifications.unread_count(request.user.id)})
+
+
 class UpdateUserView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -280,8 +491,30 @@ class UpdateUserView(APIView):
 
         user.first_name = data.get("first_name", user.first_name)
         user.last_name = data.get("last_name", user.last_name)
-        user.avatar = data.get("avatar", user.avatar)
-        user.save()
+
+        previous = user.avatar_media
+        upload = request.FILES.get("avatar")
+        if upload is not None:
+            try:
+                user.avatar_media, stored_name = media.store_upload(upload, media.AVATAR)
+            except media.InvalidImage as e:
+                return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            user.avatar = user.avatar_media['image']
+        elif data.get("avatar", user.avatar) != user.avatar:
+            user.avatar = data["avatar"]
+            user.avatar_media = None
+        try:
+            user.save()
+        except Exception:
+            if upload is not None:
+                media.delete_files([stored_name])
+            raise
+        if user.avatar_media is not previous:
+            media.discard([previous], keep=user.avatar_media)
+        if upload is not None:
+            media.schedule_variants(media.AVATAR, user.id, stored_name)
+            # The variants are there already when jobs run eagerly.
+            user.refresh_from_db(fields=["avatar_media"])
 
         serializer = UserSerializer(user)
         return Response(serializer.data)
@@ -292,6 +525,7 @@ class UserViewSet(ModelViewSet):
     serializer_class = UserSerializer
     lookup_field = "id"
     permission_classes = [IsAuthenticated]
+    filter_backends = [JSONKeyFilter]
 
     @action(detail=True, methods=['post'], url_path='follow')
     def follow(self, request, id=None):
@@ -301,13 +535,192 @@ class UserViewSet(ModelViewSet):
         if user == target_user:
             return Response({'detail': "You cannot follow/unfollow yourself."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if user.following.filter(id=target_user.id).exists():
-            user.following.remove(target_user)
+        if target_user.id in graph.following_ids(user.id):
+            graph.unfollow_users(user, [target_user.id])
             return Response({'detail': f"You have unfollowed {target_user.username}."}, status=status.HTTP_200_OK)
         else:
-            user.following.add(target_user)
+            graph.follow_users(user, [target_user.id])
             return Response({'detail': f"You are now following {target_user.username}."}, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['post'], url_path='follow/bulk')
+    def bulk_follow(self, request):
+        """Follow many users and tags at once, e.g. during onboarding.
+
+        Body: `{"users": [<user id>, ...], "tags": [<tag id>, ...]}`
+        """
+        user_ids, tag_ids = self._bulk_follow_targets(request)
+        followed_users = graph.follow_users(request.user, user_ids)
+        followed_tags = graph.follow_tags(request.user, tag_ids)
+        return Response({
+            'users': sorted(str(user_id) for user_id in followed_users),
+            'tags': sorted(followed_tags),
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='unfollow/bulk')
+    def bulk_unfollow(self, request):
+        """Unfollow many users and tags at once. Takes the same body as `follow/bulk`."""
+        user_ids, tag_ids = self._bulk_follow_targets(request)
+        graph.unfollow_users(request.user, user_ids)
+        graph.unfollow_tags(request.user, tag_ids)
+        return Response({
+            'users': sorted(str(user_id) for user_id in user_ids),
+            'tags': sorted(tag_ids),
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='batch')
+    def batch(self, request):
+        """Up to `BATCH_GET_LIMIT` users by ID, e.g. a post's `likes`. See `batch_response`."""
+        return batch_response(request, objects.get_users)
+
+    @action(detail=False, methods=['get'], url_path='mutual')
+    def mutual(self, request):
+        """Users the current user follows who also follow them back."""
+        users = User.objects.filter(id__in=graph.mutual_follow_ids(request.user.id)).order_by('username')
+        page = self.paginate_queryset(users)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(users, many=True).data)
+
+    @action(detail=False, methods=['get'], url_path='suggested')
+    def suggested(self, request):
+        """Suggested cooks to follow, ranked by how many of the user's followees follow them."""
+        suggested_ids = graph.suggested_follow_ids(request.user.id)
+        users = {user.id: user for user in User.objects.filter(id__in=suggested_ids)}
+        ordered = [users[user_id] for user_id in suggested_ids if user_id in users]
+        return Response(self.get_serializer(ordered, many=True).data)
+
+    def perform_destroy(self, instance):
+        delete_account(self.request.user, instance)
+
+    def _bulk_follow_targets(self, request):
+        user_ids = request.data.get('users') or []
+        tag_ids = request.data.get('tags') or []
+
+        if not isinstance(user_ids, list) or not isinstance(tag_ids, list):
+            raise ValidationError({'detail': "`users` and `tags` must be lists of IDs."})
+        if len(user_ids) + len(tag_ids) > BULK_FOLLOW_LIMIT:
+            raise ValidationError({'detail': f"You can follow at most {BULK_FOLLOW_LIMIT} users and tags at once."})
+
+        try:
+            user_ids = {uuid.UUID(str(user_id)) for user_id in user_ids}
+            tag_ids = {int(tag_id) for tag_id in tag_ids}
+        except (TypeError, ValueError):
+            raise ValidationError({'detail': "Invalid user or tag ID."})
+
+        return user_ids, tag_ids
+
+class TagViewSet(ReadOnlyModelViewSet):
+    """Popular tags (by denormalized post count), tag autocomplete and tag follows."""
+    queryset = Tag.objects.all().order_by('-post_count', 'name')
+    serializer_class = TagSerializer
+    permission_classes = (AllowAny,)
+
+    def get_permissions(self):
+        if self.action in ('follow', 'followed'):
+            return [IsAuthenticated()]
+        return super().get_permissions()
+
+    @action(detail=True, methods=['post'], url_path='follow')
+    def follow(self, request, pk=None):
+        """Follow and unfollow a tag."""
+        tag = self.get_object()
+
+        if tag.id in graph.followed_tag_ids(request.user.id):
+            graph.unfollow_tags(request.user, [tag.id])
+            return Response({'detail': f"You have unfollowed #{tag.name}."}, status=status.HTTP_200_OK)
+        else:
+            graph.follow_tags(request.user, [tag.id])
+            return Response({'detail': f"You are now following #{tag.name}."}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='followed')
+    def followed(self, request):
+        """Tags the current user follows."""
+        queryset = self.get_queryset().filter(id__in=graph.followed_tag_ids(request.user.id))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(queryset, many=True).data)
+
+    @action(detail=False, methods=['get'], url_path='autocomplete')
+    def autocomplete(self, request):
+        """Tags starting with `q`, most used first."""
+        return Response(autocomplete.complete_tags(request.query_params.get('q', '')))
+
+
+class AutocompleteView(APIView):
+    """Type-ahead for tags and usernames.
+
+    `GET /api/autocomplete/?q=jol&type=tags|users&limit=5`. Omitting `type` returns both.
+    """
+    permission_classes = (AllowAny,)
+
+    def get(self, request):
+        prefix = request.query_params.get('q', '')
+        kind = request.query_params.get('type')
+
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', AUTOCOMPLETE_LIMIT)), AUTOCOMPLETE_LIMIT))
+        except ValueError:
+            limit = AUTOCOMPLETE_LIMIT
+
+        response = {}
+        if kind in (None, 'tags'):
+            response['tags'] = autocomplete.complete_tags(prefix, limit)
+        if kind in (None, 'users'):
+            response['users'] = autocomplete.complete_users(prefix, limit)
+
+        return Response(response, status=status.HTTP_200_OK)
+
+
+class SyncView(APIView):
+    """Incremental sync for offline caches.
+
+    `GET /api/sync/` returns the current cursor; `GET /api/sync/?since=<cursor>` returns what changed
+    for the user since then. Empty sections are left out, so a no-op refresh is just the cursor.
+    Keep calling with the returned cursor while `has_more` is true.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        since = request.query_params.get('since')
+        if since is None:
+            return Response({'cursor': str(sync.latest_cursor()), 'has_more': False})
+
+        try:
+            since = int(since)
+            limit = max(1, min(int(request.query_params.get('limit', SYNC_BATCH_SIZE)), SYNC_BATCH_SIZE))
+        except ValueError:
+            return Response({'detail': 'Invalid cursor.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user
+        changes, cursor, has_more = sync.changes_since(user, graph.following_ids(user.id), since, limit)
+        response = {'cursor': str(cursor), 'has_more': has_more}
+
+        upserted = changes.get((SyncEvent.POST, SyncEvent.UPSERT))
+        if upserted:
+            response['posts'] = FastPostSerializer(Post.objects.filter(id__in=upserted), many=True).data
+
+        sections = (
+            ('deleted_posts', SyncEvent.POST, SyncEvent.DELETE),
+            ('liked', SyncEvent.LIKE, SyncEvent.UPSERT),
+            ('unliked', SyncEvent.LIKE, SyncEvent.DELETE),
+            ('followed', SyncEvent.FOLLOW, SyncEvent.UPSERT),
+            ('unfollowed', SyncEvent.FOLLOW, SyncEvent.DELETE),
+        )
+        for key, kind, action in sections:
+            if changes.get((kind, action)):
+                response[key] = changes[(kind, action)]
+
+        return Response(response, status=status.HTTP_200_OK)
+
+
+def delete_account(user, account):
+    """Soft-delete `account` on behalf of `user` (the owner or staff) and queue its purge."""
+    if account.id != user.id and not user.is_staff:
+        raise PermissionDenied("You can only delete your own account.")
+    return moderation.soft_delete_account(account)
+
+
 class CurrentUserView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -315,6 +728,11 @@ class CurrentUserView(APIView):
         user = request.user
         serializer = UserSerializer(user)
         return Response(serializer.data)
+
+    def delete(self, request):
+        """Delete the current account. It disappears at once and is purged in the background."""
+        deletion = delete_account(request.user, request.user)
+        return Response({'detail': 'Account deleted.', 'deletion': deletion.id}, status=status.HTTP_202_ACCEPTED)
     
 
 class LogoutView(APIView):
@@ -352,7 +770,8 @@ class TrendingPostListView(ListAPIView):
 
         combined_trending = (most_recent_most_liked | oldest_most_liked).distinct()[:count]
 
-        return combined_trending
+        # `|` of sliced querysets builds a plain `QuerySet` (off the base manager).
+        return PostQuerySet.with_related(combined_trending)
 
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
@@ -363,14 +782,16 @@ class TrendingPostListView(ListAPIView):
         ), status=status.HTTP_200_OK)
 
 
-class LikedPostsViewSet(ReadOnlyModelViewSet):
+class LikedPostsViewSet(FastSerializerMixin, ReadOnlyModelViewSet):
     serializer_class = PostSerializer
+    fast_serializer_class = FastPostSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = LikedAtCursorPagination
 
     def get_queryset(self):
+        """Posts the user liked, ordered by when they liked them (the `(user_id, liked_at)` index)."""
         user = self.request.user
-        return Post.objects.filter(likes=user).order_by('-created_at')
+        return Post.objects.filter(like__user=user).annotate(liked_at=F('like__liked_at')).order_by('-liked_at')
 
     @action(detail=False, methods=['get'], url_path='favorites')
     def liked_posts(self, request):
@@ -391,13 +812,16 @@ class ProfileViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
     lookup_field = 'username'
 
+    def perform_destroy(self, instance):
+        delete_account(self.request.user, instance)
+
     @action(detail=True, methods=['get'], url_path='posts')
     def user_posts(self, request, username=None):
         """
         Retrieves the user's posts, ordered by the latest, with pagination.
         """
         user = get_object_or_404(User, username=username)
-        posts = Post.objects.filter(author=user).order_by('-created_at')
+        posts = Post.objects.filter(author=user).order_by('-created_at').with_related()
 
         paginator = PageNumberPagination()
         paginator.page_size = 10
@@ -0,0 +1,41 @@
+"""
+gunicorn settings for serving `src.wsgi` (HTTP only; WebSockets need `daphne src.asgi:application`).
+
+```sh
+gunicorn
+GUNICORN_PRELOAD=False WEB_CONCURRENCY=4 gunicorn
+```
+
+With `preload_app` (the default here) the master imports and warms the application once
+(`api.startup.warm_up`) and forks the workers from it. They boot in milliseconds rather than a
+second each, and share the master's memory pages until they write to them. `gc.freeze()` before the
+first fork keeps the collector from touching, and so copying, those objects in every worker. Turn
+preloading off to pick up code changes with a `HUP` instead of a restart.
+
+Background jobs are not run by these workers: deploy `python manage.py run_jobs` alongside (README).
+"""
+
+import gc
+import multiprocessing
+import os
+
+wsgi_app = 'src.wsgi:application'
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY') or multiprocessing.cpu_count() * 2 + 1)
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS') or 4)
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+# Static files leave through `wsgi.file_wrapper`; the kernel copies them to the socket (`api.static`).
+sendfile = True
+
+
+def when_ready(server):
+    # Runs in the master after the application is preloaded and before any worker is forked.
+    if preload_app:
+        gc.freeze()
+
+
+def child_exit(server, worker):
+    from api.metrics import mark_process_dead
+
+    mark_process_dead(worker.pid)
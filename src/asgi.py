@@ -18,10 +18,16 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'src.settings')
 application = get_asgi_application()
 
 from channels.routing import ProtocolTypeRouter, URLRouter
-from api.routing import websocket_urlpatterns
+from api import routing
+from api.admission import ASGIAdmissionControl
+from api.metrics import WebSocketMetrics
+from api.static import ASGIStaticFiles
+from api.startup import warm_up
 
+warm_up()
 
-application = ProtocolTypeRouter({
-  'http': application,
-  'websocket': URLRouter(websocket_urlpatterns),
-})
+protocols = {'http': ASGIStaticFiles(ASGIAdmissionControl(application))}
+if routing.websocket_routes:
+    protocols['websocket'] = WebSocketMetrics(URLRouter(routing.websocket_urlpatterns()))
+
+application = ProtocolTypeRouter(protocols)
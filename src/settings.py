@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 from datetime import timedelta
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -36,8 +37,6 @@ ALLOWED_HOSTS = ['*']
 # Application definition
 
 INSTALLED_APPS = [
-    'daphne',
-    
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -54,9 +53,15 @@ INSTALLED_APPS = [
     'api',
 ]
 
+# daphne's app only replaces `runserver` with its ASGI server; loading it imports Twisted and
+# autobahn, about half a second of every worker's startup. Production runs `daphne` or gunicorn.
+if 'runserver' in sys.argv:
+    INSTALLED_APPS.insert(0, 'daphne')
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'api.static.StaticFilesMiddleware',
+    'api.metrics.MetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -132,12 +137,37 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Hashing runs in a process pool and its work factor is tunable, see `api/auth/hashing.py`.
+# Hashes with a different iteration count are re-encoded at the next login.
+AUTHENTICATION_BACKENDS = ['api.auth.backends.ModelBackend']
+PASSWORD_HASHERS = [
+    'api.auth.hashing.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASHING_ITERATIONS = int(os.getenv('PASSWORD_HASHING_ITERATIONS') or 0) or None
+# 0 hashes inline, which suits development and tests; production sets the pool size (see README).
+PASSWORD_HASHING_WORKERS = int(os.getenv('PASSWORD_HASHING_WORKERS') or 0)
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 8,
+    'DEFAULT_RENDERER_CLASSES': (
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'api.renderers.MessagePackRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        'api.renderers.MessagePackParser',
+    ),
 }
 
 SIMPLE_JWT = {
@@ -157,6 +187,32 @@ SIMPLE_JWT = {
 #     }
 # }
 
+# Push notifications to `ws/notifications/`, see `api/notifications.py`. Processes share the channel
+# layer through Redis when `redis_uri` is set (needs `channels_redis`); the in-memory layer only
+# reaches sockets of the process that flushed.
+NOTIFICATION_WEBSOCKETS = os.getenv('NOTIFICATION_WEBSOCKETS') == 'True'
+if NOTIFICATION_WEBSOCKETS:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [os.getenv('redis_uri')]},
+        } if os.getenv('redis_uri') else {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
+
+# The default cache is per process: what one worker invalidates (follows in `api/graph.py`, payloads
+# in `api/objects.py`, tag pages, unread counts) stays cached in the others until it times out.
+# Deployments with several processes point every worker at one shared cache, e.g. memcached (with
+# `pymemcache` installed) and
+# `CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache CACHE_LOCATION=127.0.0.1:11211`.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    },
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
 
@@ -173,8 +229,20 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.0/howto/static-files/
 
 STATIC_URL = 'static/'
-STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 STATIC_ROOT = 'staticfiles'
+STATICFILES_DIRS = [BASE_DIR / 'static']
+# `collectstatic` is the build step: content hashes and gzip/brotli copies (`api.static`).
+STORAGES = {
+    'default': {'BACKEND': os.getenv('MEDIA_STORAGE_BACKEND', 'django.core.files.storage.FileSystemStorage')},
+    'staticfiles': {'BACKEND': 'api.static.StaticFilesStorage'},
+}
+
+# Uploaded images (`api.media`), in `STORAGES['default']`. With the default file system storage set
+# `MEDIA_URL` to wherever `MEDIA_ROOT` is served from; Django serves it itself only with DEBUG on.
+MEDIA_URL = os.getenv('MEDIA_URL', 'media/')
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', BASE_DIR / 'media')
+# Processes rendering image variants; 0 renders on the calling thread.
+MEDIA_WORKERS = int(os.getenv('MEDIA_WORKERS') or 2)
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -191,3 +259,29 @@ EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = f'Culinara Inc. <{EMAIL_HOST_USER}>'
 
 FRONTEND_URL = os.getenv('FRONTEND_URL') if DEBUG else os.getenv('FRONTEND_URL_PROD')
+
+# Identical concurrent reads share one computation, see `api/single_flight.py`. Coalescing across
+# processes needs a cache shared by them (e.g. Redis).
+SINGLE_FLIGHT_ENABLED = os.getenv('SINGLE_FLIGHT_ENABLED', 'True') == 'True'
+SINGLE_FLIGHT_ACROSS_PROCESSES = os.getenv('SINGLE_FLIGHT_ACROSS_PROCESSES') == 'True'
+
+# Per-route concurrency limits and load shedding, see `api/admission.py`.
+ADMISSION_CONTROL_ENABLED = os.getenv('ADMISSION_CONTROL_ENABLED', 'True') == 'True'
+
+# Prometheus metrics at `/api/metrics/`, see `api/metrics.py`. Outside DEBUG the endpoint needs
+# `Authorization: Bearer <METRICS_TOKEN>`. Set PROMETHEUS_MULTIPROC_DIR when running several workers.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api': {'handlers': ['console'], 'level': os.getenv('API_LOG_LEVEL', 'INFO')},
+    },
+}
+
+# Background jobs, see `api/jobs.py`. Eager mode runs jobs inline instead of queueing them.
+JOBS_ALWAYS_EAGER = os.getenv('JOBS_ALWAYS_EAGER') == 'True'
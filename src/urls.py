@@ -2,15 +2,20 @@ from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
-from api.views import ObtainTokenPairView
+from api.auth.login import LoginView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api-auth/', include('rest_framework.urls')),
-    path('auth/token/', ObtainTokenPairView.as_view(), name='token_obtain_pair'),
+    path('auth/token/', LoginView.as_view(), name='token_obtain_pair'),
     path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/', include('api.urls'))
 ]
+
+# Uploaded media (`api.media`); in production the storage backend or a web server serves it.
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
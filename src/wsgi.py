@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'src.settings')
 
 application = get_wsgi_application()
+
+from api.admission import WSGIAdmissionControl
+from api.startup import warm_up
+
+warm_up()
+
+application = WSGIAdmissionControl(application)
@@ -0,0 +1,25 @@
+const ws = new WebSocket('ws://127.0.0.1:8000/ws/post/');
+
+ws.onopen = function open() {
+  console.log('WebSockets connection created.');
+};
+
+if (ws.readyState == WebSocket.OPEN) {
+  ws.onopen();
+}
+
+ws.onmessage = e => {
+  const display = document.getElementById('display');
+  display.innerHTML = JSON.parse(e.data);
+}
+
+ws.onopen = () => {
+  ws.send(JSON.stringify({
+    action: 'list',
+    data: {page: 1, limit: 10}
+  }));
+}
+
+ws.onclose = () => {
+  console.log('Connection Closed');
+}